@@ -1,18 +1,30 @@
 # administrator/routes.py
-from flask import Blueprint, render_template, request, redirect, url_for, flash, Response
+from flask import Blueprint, render_template, request, redirect, url_for, flash, Response, stream_with_context, abort, current_app
 from flask_login import login_user, logout_user, login_required, current_user # Corrected import order
 from common.decorators import role_required
 # --- Merged Imports ---
 from models import User, Role, AuditLog, db, Sponsor, Driver, Admin # Added Driver, Admin, Sponsor
 from extensions import db # Keep this for SQLAlchemy instance access
-from sqlalchemy import or_
+from sqlalchemy import or_, and_, func, select
 # Combine logging constants and function import
 from common.logging import (LOGIN_EVENT, SALES_BY_SPONSOR, SALES_BY_DRIVER,
-                            INVOICE_EVENT, DRIVER_POINTS, log_audit_event)
+                            INVOICE_EVENT, DRIVER_POINTS, log_audit_event, request_ip)
 from datetime import datetime, timedelta
 import csv
+import json
+import zlib
 from io import StringIO
+from itertools import islice
 from impersonation.routes import allowed_to_impersonate
+from common.audit_archive import archive_reaches, archived_through, iter_archived_rows, archived_day_counts
+from common.audit_search import search_audit_log
+from common.sales_rollup import sales_by_sponsor, sales_by_driver, rollups_current_through
+from common.bulk_import import handle_import_upload
+from common.id_allocator import next_user_code
+from common.account_search import matching_accounts, fetch_account_page, parse_cursor
+from common.login_throttle import login_throttle
+from common.lockouts import active_lockouts, unlock_all as unlock_all_lockouts
+from common.analytics_export import DATASETS as ANALYTICS_DATASETS, stream_dataset, resolve_format as resolve_export_format
 
 # Blueprint definition
 administrator_bp = Blueprint('administrator_bp', __name__, template_folder="../templates")
@@ -28,61 +40,266 @@ def parse_date(date_str):
     except (ValueError, TypeError):
         return None
 
-def next_user_code():
-    """Generates the next available USER_CODE."""
-    last_user = User.query.order_by(User.USER_CODE.desc()).first()
-    return (last_user.USER_CODE + 1) if last_user else 1
+# Export formats: format -> (file extension, mimetype)
+EXPORT_FORMATS = {
+    "csv": ("csv", "text/csv"),
+    "jsonl": ("jsonl", "application/x-ndjson"),
+}
+EXPORT_BATCH_SIZE = 1000  # Rows fetched per round trip from the server-side cursor
+EXPORT_CHUNK_ROWS = 500   # Rows buffered before a chunk is sent to the client
+EXPORT_COLUMNS = ["Timestamp", "Event Type", "Details", "Event ID",
+                  "Actor ID", "Subject ID", "Sponsor ID", "IP"]
+
+def audit_filter_conditions(event_type, start_dt, end_dt):
+    """Builds the WHERE conditions shared by the audit viewer and exports."""
+    conditions = []
+    if event_type:
+        conditions.append(AuditLog.EVENT_TYPE == event_type)
+    if start_dt:
+        conditions.append(AuditLog.CREATED_AT >= start_dt)
+    if end_dt:
+        # Include events up to the end of the selected day
+        conditions.append(AuditLog.CREATED_AT < end_dt + timedelta(days=1))
+    return conditions
+
+def stream_audit_rows(event_type, start_dt, end_dt):
+    """
+    Yields matching audit rows newest first, fetched in yield_per batches from a server-side cursor.
+    Archived rows are always older than the table's, so they follow once the table is exhausted.
+    """
+    stmt = (
+        select(AuditLog.EVENT_ID, AuditLog.EVENT_TYPE, AuditLog.DETAILS, AuditLog.CREATED_AT,
+               AuditLog.ACTOR_USER_ID, AuditLog.SUBJECT_USER_ID, AuditLog.SPONSOR_ID,
+               AuditLog.IP, AuditLog.PAYLOAD)
+        .where(*audit_filter_conditions(event_type, start_dt, end_dt))
+        .order_by(AuditLog.CREATED_AT.desc(), AuditLog.EVENT_ID.desc())
+        .execution_options(yield_per=EXPORT_BATCH_SIZE) # Implies stream_results (SSCursor on MySQL)
+    )
+    yield from db.session.execute(stmt)
+    if archive_reaches(start_dt):
+        yield from iter_archived_rows(event_type, start_dt, end_dt)
+
+def audit_csv_chunks(rows):
+    """Turns audit rows into CSV text chunks of EXPORT_CHUNK_ROWS rows each."""
+    buf = StringIO()
+    cw = csv.writer(buf)
+    cw.writerow(EXPORT_COLUMNS)
+    for count, row in enumerate(rows, start=1):
+        cw.writerow([
+            row.CREATED_AT.strftime("%Y-%m-%d %H:%M:%S UTC") if row.CREATED_AT else "",
+            row.EVENT_TYPE or "",
+            row.DETAILS or "",
+            row.EVENT_ID or "",
+            row.ACTOR_USER_ID or "",
+            row.SUBJECT_USER_ID or "",
+            row.SPONSOR_ID or "",
+            row.IP or "",
+        ])
+        if count % EXPORT_CHUNK_ROWS == 0:
+            yield buf.getvalue()
+            buf.seek(0)
+            buf.truncate(0)
+    yield buf.getvalue()
+
+def audit_jsonl_chunks(rows):
+    """Turns audit rows into JSON Lines text chunks (one object per line)."""
+    lines = []
+    for row in rows:
+        lines.append(json.dumps({
+            "event_id": row.EVENT_ID,
+            "event_type": row.EVENT_TYPE,
+            "created_at": row.CREATED_AT.isoformat() if row.CREATED_AT else None,
+            "details": row.DETAILS,
+            "actor_user_id": row.ACTOR_USER_ID,
+            "subject_user_id": row.SUBJECT_USER_ID,
+            "sponsor_id": row.SPONSOR_ID,
+            "ip": row.IP,
+            "payload": row.PAYLOAD,
+        }))
+        if len(lines) >= EXPORT_CHUNK_ROWS:
+            yield "\n".join(lines) + "\n"
+            lines = []
+    if lines:
+        yield "\n".join(lines) + "\n"
+
+def gzip_chunks(chunks):
+    """Gzips a stream of text chunks on the fly."""
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 31) # wbits=31 -> gzip container
+    for chunk in chunks:
+        data = compressor.compress(chunk.encode('utf-8'))
+        if data:
+            yield data
+    yield compressor.flush()
+
+# Audit viewer paging
+AUDIT_PAGE_SIZE = 100
+AUDIT_MAX_PAGE_SIZE = 500
+AUDIT_HISTOGRAM_DAYS = 60
+ACCOUNTS_PAGE_SIZE = 50
+ACCOUNTS_MAX_PAGE_SIZE = 200
+AUDIT_CURSOR_FORMAT = "%Y%m%d%H%M%S%f"
+
+def make_audit_cursor_at(created_at, event_id):
+    """Encodes a (CREATED_AT, EVENT_ID) keyset position as an opaque URL-safe string."""
+    return f"{created_at.strftime(AUDIT_CURSOR_FORMAT)}-{event_id}"
+
+def make_audit_cursor(event):
+    return make_audit_cursor_at(event.CREATED_AT, event.EVENT_ID)
+
+def parse_audit_cursor(cursor):
+    """Decodes a cursor from make_audit_cursor, or returns None if it is missing/invalid."""
+    if not cursor:
+        return None
+    try:
+        stamp, event_id = cursor.split("-", 1)
+        return datetime.strptime(stamp, AUDIT_CURSOR_FORMAT), int(event_id)
+    except (ValueError, TypeError):
+        return None
+
+def audit_day_counts(event_type, start_dt, end_dt):
+    """
+    Returns [(day, count), ...] newest day first: a single GROUP BY over the table,
+    plus the archive manifest's per-day counts when the range reaches cold storage.
+    """
+    day = func.date(AuditLog.CREATED_AT)
+    counts = {
+        str(d): count for d, count in db.session.execute(
+            select(day, func.count()).where(*audit_filter_conditions(event_type, start_dt, end_dt)).group_by(day)
+        ).all()
+    }
+    if archive_reaches(start_dt):
+        for d, count in archived_day_counts(event_type, start_dt, end_dt):
+            counts[d] = counts.get(d, 0) + count
+    return sorted(counts.items(), reverse=True)
+
+def audit_rows_exist_before(event_type, start_dt, end_dt, key, use_archive):
+    """One-row EXISTS probe: is there a matching row strictly older than the (CREATED_AT, EVENT_ID) key?"""
+    probe = select(AuditLog.EVENT_ID).where(
+        *audit_filter_conditions(event_type, start_dt, end_dt),
+        or_(AuditLog.CREATED_AT < key[0], and_(AuditLog.CREATED_AT == key[0], AuditLog.EVENT_ID < key[1])),
+    )
+    if db.session.execute(select(probe.exists())).scalar():
+        return True
+    return use_archive and next(iter_archived_rows(event_type, start_dt, end_dt, before=key), None) is not None
+
+def fetch_audit_page(event_type, start_dt, end_dt, before, after, per_page):
+    """
+    Returns (events, has_older, has_newer) for one keyset page over (CREATED_AT, EVENT_ID),
+    newest first. No OFFSET and no total COUNT, so every page is an index range scan of
+    per_page + 1 rows. Table rows are always newer than archived ones, so a page is filled
+    from the table first and continues into the archive when the range reaches back that far.
+    """
+    q = AuditLog.query.filter(*audit_filter_conditions(event_type, start_dt, end_dt))
+    use_archive = archive_reaches(start_dt)
+
+    if after:
+        # "Newer" page: walk forward from the cursor, then flip back to newest-first
+        events = []
+        if use_archive and after[0] < archived_through():
+            events = list(islice(iter_archived_rows(event_type, start_dt, end_dt, after=after, newest_first=False), per_page + 1))
+        if len(events) <= per_page:
+            q = q.filter(or_(AuditLog.CREATED_AT > after[0],
+                             and_(AuditLog.CREATED_AT == after[0], AuditLog.EVENT_ID > after[1])))
+            events += q.order_by(AuditLog.CREATED_AT.asc(), AuditLog.EVENT_ID.asc()).limit(per_page + 1 - len(events)).all()
+        page = events[:per_page]
+        # Anything older sits below this page's oldest key (or at/below the cursor when the page is empty)
+        oldest = (page[0].CREATED_AT, page[0].EVENT_ID) if page else (after[0], after[1] + 1)
+        has_older = audit_rows_exist_before(event_type, start_dt, end_dt, oldest, use_archive)
+        return list(reversed(page)), has_older, len(events) > per_page
+
+    if before:
+        q = q.filter(or_(AuditLog.CREATED_AT < before[0],
+                         and_(AuditLog.CREATED_AT == before[0], AuditLog.EVENT_ID < before[1])))
+    events = q.order_by(AuditLog.CREATED_AT.desc(), AuditLog.EVENT_ID.desc()).limit(per_page + 1).all()
+    if len(events) <= per_page and use_archive:
+        events += list(islice(iter_archived_rows(event_type, start_dt, end_dt, before=before), per_page + 1 - len(events)))
+    return events[:per_page], len(events) > per_page, before is not None
+
+def account_list_page(query, key_column):
+    """
+    Shared by the account list pages: applies ?search= (with ?match=prefix|word) through the
+    account search index and returns one keyset page ordered by key_column, plus the
+    search state and next/previous page URLs for the template.
+    """
+    search_term = (request.args.get("search") or "").strip()
+    match_mode = request.args.get("match", "prefix")
+    per_page = min(max(request.args.get("per_page", ACCOUNTS_PAGE_SIZE, type=int), 1), ACCOUNTS_MAX_PAGE_SIZE)
+    condition = matching_accounts(search_term, match_mode)
+    if condition is not None:
+        query = query.filter(condition)
+    rows, next_cursor, prev_cursor = fetch_account_page(
+        query, key_column,
+        after=parse_cursor(key_column, request.args.get("after")),
+        before=parse_cursor(key_column, request.args.get("before")),
+        per_page=per_page,
+    )
+    page_args = dict(search=search_term or None, match=match_mode if search_term else None, per_page=per_page)
+    return {
+        "rows": rows,
+        "search_term": search_term,
+        "match_mode": match_mode,
+        "next_url": url_for(request.endpoint, after=next_cursor, **page_args) if next_cursor is not None else None,
+        "prev_url": url_for(request.endpoint, before=prev_cursor, **page_args) if prev_cursor is not None else None,
+    }
 
 # --- Audit Log Routes ---
 
 @administrator_bp.get("/audit_logs/export")
 @role_required(Role.ADMINISTRATOR) # Simplified decorator
 def export_audit_csv():
-    """Exports audit logs to CSV, with optional type and date filtering."""
+    """
+    Streams audit logs as CSV (default) or JSON Lines, with optional type and date filtering.
+    Rows are read through a server-side cursor and written out in chunks, so memory stays
+    flat no matter how many rows match. Pass compress=gzip to gzip the stream on the fly.
+    """
     # Use filtering logic from 078d...
     event_type = request.args.get("event_type") or request.args.get("type") # Allow both param names
     start_str = request.args.get("start")
     end_str = request.args.get("end")
+    export_format = (request.args.get("format") or "csv").lower()
+    compress = (request.args.get("compress") or "").lower() in ("gzip", "gz", "1", "true")
 
-    start_dt = parse_date(start_str)
-    end_dt = parse_date(end_str)
-
-    q = AuditLog.query # Start with base query
-
-    if event_type:
-        q = q.filter(AuditLog.EVENT_TYPE == event_type)
-    if start_dt:
-        q = q.filter(AuditLog.CREATED_AT >= start_dt)
-    if end_dt:
-        # Include events up to the end of the selected day
-        q = q.filter(AuditLog.CREATED_AT < end_dt + timedelta(days=1))
-
-    # Always order by date descending for consistency
-    rows = q.order_by(AuditLog.CREATED_AT.desc()).all()
+    if export_format not in EXPORT_FORMATS:
+        flash("Invalid export format selected.", "warning")
+        return redirect(url_for(".view_audit_logs", event_type=event_type, start=start_str, end=end_str))
 
-    si = StringIO()
-    cw = csv.writer(si)
-    # Corrected header row to match written data
-    cw.writerow(["Timestamp", "Event Type", "Details", "Event ID"])
-    for row in rows:
-        cw.writerow([
-            row.CREATED_AT.strftime("%Y-%m-%d %H:%M:%S UTC") if row.CREATED_AT else "",
-            row.EVENT_TYPE or "",
-            row.DETAILS or "",
-            row.EVENT_ID or ""
-        ])
+    rows = stream_audit_rows(event_type, parse_date(start_str), parse_date(end_str))
+    chunks = audit_csv_chunks(rows) if export_format == "csv" else audit_jsonl_chunks(rows)
+    body = gzip_chunks(chunks) if compress else (chunk.encode('utf-8') for chunk in chunks)
 
-    csv_bytes = si.getvalue().encode('utf-8')
     # Generate filename including date range if present
     date_range_str = ""
     if start_str or end_str:
         date_range_str = f"_from_{start_str or 'start'}_to_{end_str or 'end'}"
-    filename = f"audit_logs_{event_type or 'all'}{date_range_str}_{datetime.now().strftime('%Y%m%d_%HM%S')}.csv"
+    extension = EXPORT_FORMATS[export_format][0] + (".gz" if compress else "")
+    filename = f"audit_logs_{event_type or 'all'}{date_range_str}_{datetime.now().strftime('%Y%m%d_%H%M%S')}.{extension}"
 
+    headers = {"Content-Disposition": f"attachment;filename=\"{filename}\""} # Quote filename
     return Response(
-        csv_bytes,
-        mimetype="text/csv",
-        headers={"Content-Disposition": f"attachment;filename=\"{filename}\""} # Quote filename
+        stream_with_context(body), # Keep the app context alive while the generator runs
+        mimetype="application/gzip" if compress else EXPORT_FORMATS[export_format][1],
+        headers=headers
+    )
+
+@administrator_bp.route("/exports/analytics/<dataset>")
+@role_required(Role.ADMINISTRATOR)
+def export_analytics(dataset):
+    """
+    Streams one analytics dataset as a single file: an Arrow IPC stream (or gzipped CSV with
+    ?format=csv, or when pyarrow isn't installed). ?since=<id> returns only rows above that key.
+    """
+    if dataset not in ANALYTICS_DATASETS:
+        abort(404)
+    fmt = resolve_export_format("csv" if request.args.get("format") == "csv" else "arrow")
+    since = request.args.get("since", 0, type=int)
+    if fmt == "csv":
+        filename, mimetype = f"{dataset}.csv.gz", "application/gzip"
+    else:
+        filename, mimetype = f"{dataset}.arrows", "application/vnd.apache.arrow.stream"
+    return Response(
+        stream_with_context(stream_dataset(dataset, since, fmt)),
+        mimetype=mimetype,
+        headers={"Content-Disposition": f"attachment; filename={filename}"},
     )
 
 @administrator_bp.route("/audit_logs")
@@ -91,21 +308,75 @@ def audit_menu():
     """Displays the main audit log menu."""
     # Pass event types for filtering options in the template
     event_types = [LOGIN_EVENT, SALES_BY_SPONSOR, SALES_BY_DRIVER, INVOICE_EVENT, DRIVER_POINTS] # Add others as needed
-    return render_template("administrator/audit_menu.html", event_types=event_types)
+    return render_template("administrator/audit_menu.html", event_types=event_types,
+                           analytics_datasets=list(ANALYTICS_DATASETS))
 
 
 # Specific Audit Log Views (simplified, use view_audit_logs with filter)
 # These routes can be kept if direct links are desired, or removed in favor of filtering on view_audit_logs
 
+def sales_csv_response(filename, header, rows):
+    """Small CSV download for the (already aggregated) sales reports."""
+    si = StringIO()
+    writer = csv.writer(si)
+    writer.writerow(header)
+    writer.writerows(rows)
+    return Response(si.getvalue(), mimetype="text/csv",
+                    headers={"Content-Disposition": f"attachment; filename={filename}"})
+
 @administrator_bp.route("/audit_logs/sales/sponsor")
 @role_required(Role.ADMINISTRATOR)
 def audit_sales_by_sponsor():
-    return redirect(url_for(".view_audit_logs", event_type=SALES_BY_SPONSOR))
+    """Sales per sponsor, read from the daily rollups (never the raw purchases)."""
+    start_dt = parse_date(request.args.get("start"))
+    end_dt = parse_date(request.args.get("end"))
+    rows = sales_by_sponsor(start_dt, end_dt)
+
+    if request.args.get("format") == "csv":
+        return sales_csv_response(
+            "sales_by_sponsor.csv",
+            ["sponsor_id", "organization", "points", "items", "orders"],
+            ([r.sponsor_id, r.org_name or "", r.points, r.items, r.orders] for r in rows),
+        )
+
+    _, updated_at = rollups_current_through()
+    return render_template(
+        "administrator/sales_report.html",
+        title="Sales by Sponsor",
+        rows=rows,
+        by_driver=False,
+        start=request.args.get("start", ""),
+        end=request.args.get("end", ""),
+        updated_at=updated_at,
+    )
 
 @administrator_bp.route("/audit_logs/sales/driver")
 @role_required(Role.ADMINISTRATOR)
 def audit_sales_by_driver():
-     return redirect(url_for(".view_audit_logs", event_type=SALES_BY_DRIVER))
+    """Sales per driver and sponsor, read from the daily rollups. Optional ?sponsor_id= filter."""
+    start_dt = parse_date(request.args.get("start"))
+    end_dt = parse_date(request.args.get("end"))
+    sponsor_id = request.args.get("sponsor_id", type=int)
+    rows = sales_by_driver(start_dt, end_dt, sponsor_id)
+
+    if request.args.get("format") == "csv":
+        return sales_csv_response(
+            "sales_by_driver.csv",
+            ["driver_id", "username", "sponsor_id", "organization", "points", "items", "orders"],
+            ([r.driver_id, r.username or "", r.sponsor_id, r.org_name or "", r.points, r.items, r.orders] for r in rows),
+        )
+
+    _, updated_at = rollups_current_through()
+    return render_template(
+        "administrator/sales_report.html",
+        title="Sales by Driver",
+        rows=rows,
+        by_driver=True,
+        sponsor_id=sponsor_id,
+        start=request.args.get("start", ""),
+        end=request.args.get("end", ""),
+        updated_at=updated_at,
+    )
 
 @administrator_bp.route("/audit_logs/invoices")
 @role_required(Role.ADMINISTRATOR)
@@ -132,21 +403,36 @@ def view_audit_logs():
         flash("Invalid audit log type selected.", "warning")
         event_type = None # Clear invalid type
 
-    q = AuditLog.query # Base query
-
-    if event_type:
-        q = q.filter(AuditLog.EVENT_TYPE == event_type)
-
     start_dt = parse_date(start_str)
     end_dt = parse_date(end_str)
+    search_term = (request.args.get("q") or "").strip()
+    per_page = min(max(request.args.get("per_page", AUDIT_PAGE_SIZE, type=int), 1), AUDIT_MAX_PAGE_SIZE)
+    before = parse_audit_cursor(request.args.get("before"))
+    after = parse_audit_cursor(request.args.get("after"))
 
-    if start_dt:
-        q = q.filter(AuditLog.CREATED_AT >= start_dt)
-    if end_dt:
-        q = q.filter(AuditLog.CREATED_AT < end_dt + timedelta(days=1))
-
-    # Apply ordering and limit
-    events = q.order_by(AuditLog.CREATED_AT.desc()).limit(500).all() # Use 'events' consistently
+    if search_term:
+        # Ranked full-text hits (table only, not the archive); no keyset paging for relevance order
+        events = search_audit_log(search_term, audit_filter_conditions(event_type, start_dt, end_dt), limit=per_page)
+        has_older = has_newer = False
+    else:
+        events, has_older, has_newer = fetch_audit_page(event_type, start_dt, end_dt, before, after, per_page)
+
+    page_args = dict(event_type=event_type, start=start_str, end=end_str, per_page=per_page)
+    older_url = url_for(".view_audit_logs", before=make_audit_cursor(events[-1]), **page_args) if events and has_older else None
+    newer_url = url_for(".view_audit_logs", after=make_audit_cursor(events[0]), **page_args) if events and has_newer else None
+
+    # Per-day histogram for jumping to a date: one GROUP BY, bounded to the filter range
+    # (or the last AUDIT_HISTOGRAM_DAYS days when no start date is given).
+    histogram_start = start_dt or (datetime.utcnow() - timedelta(days=AUDIT_HISTOGRAM_DAYS)).replace(hour=0, minute=0, second=0, microsecond=0)
+    day_counts = []
+    for day, count in ([] if search_term else audit_day_counts(event_type, histogram_start, end_dt)):
+        # Jump = a cursor just past the end of that day, so the page starts at its newest event
+        day_end = datetime.strptime(day, "%Y-%m-%d") + timedelta(days=1)
+        day_counts.append({
+            "day": day,
+            "count": count,
+            "url": url_for(".view_audit_logs", before=make_audit_cursor_at(day_end, 0), **page_args),
+        })
 
     # Titles mapping
     titles = {
@@ -165,7 +451,12 @@ def view_audit_logs():
         event_type=event_type, # Pass current filter type
         start=start_str, # Pass date filters back for display
         end=end_str,
-        allowed_event_types=allowed # Pass allowed types for filter dropdown
+        q=search_term,
+        mode="text" if search_term else None,
+        allowed_event_types=allowed, # Pass allowed types for filter dropdown
+        older_url=older_url,
+        newer_url=newer_url,
+        day_counts=day_counts
     )
 
 
@@ -177,15 +468,21 @@ def login():
     if request.method == 'POST':
         username = request.form['username']
         password = request.form['password']
+        ip = request_ip()
+        login_throttle.check(username, ip)
         user = User.query.filter_by(USERNAME=username).first()
 
         # Ensure user is an admin
         if user and user.USER_TYPE == Role.ADMINISTRATOR and user.check_password(password):
+            db.session.commit() # Keeps a re-hashed password
+            login_throttle.succeeded(username, ip)
             login_user(user)
             flash("Admin login successful!", "success")
             return redirect(url_for('administrator_bp.dashboard'))
         else:
             flash("Invalid admin username or password", "danger")
+            login_throttle.failed(username, ip, "invalid_credentials" if user else "unknown_user",
+                                  subject_id=user.USER_CODE if user else None)
 
     return render_template('administrator/login.html') # Assumes admin-specific login template
 
@@ -278,7 +575,7 @@ def add_user():
             db.session.commit()
 
             # Log event
-            log_audit_event("ADMIN_CREATE_USER", f"Admin {current_user.USERNAME} created user {username} (ID: {new_user_code}) with role {role}.")
+            log_audit_event("ADMIN_CREATE_USER", f"Admin {current_user.USERNAME} created user {username} (ID: {new_user_code}) with role {role}.", subject_id=new_user_code, sync=True)
 
 
             flash_message = (
@@ -301,35 +598,40 @@ def add_user():
 
 # --- Account Listing Routes ---
 
+# Bulk driver import (CSV/JSON upload -> credentials report download)
+@administrator_bp.route('/import_users', methods=['GET', 'POST'])
+@role_required(Role.ADMINISTRATOR)
+def import_users():
+    sponsor_id = request.form.get('sponsor_id', type=int)
+    def render(errors=(), total=0):
+        sponsors = Sponsor.query.filter_by(STATUS="Approved").order_by(Sponsor.ORG_NAME).all()
+        return render_template('common/import_drivers.html', back_url=url_for('administrator_bp.accounts'),
+                               sponsors=sponsors, selected_sponsor=sponsor_id, errors=errors, total=total,
+                               max_rows=current_app.config.get("BULK_IMPORT_MAX_ROWS", 20000))
+    if request.method == 'POST':
+        if sponsor_id is not None and db.session.get(Sponsor, sponsor_id) is None:
+            flash("Unknown sponsor.", "danger")
+            return render()
+        return handle_import_upload(sponsor_id, render)
+    return render()
+
 @administrator_bp.route('/accounts', methods=['GET'])
 @role_required(Role.ADMINISTRATOR)
 def accounts():
-    """Lists all active user accounts."""
-    search_term = request.args.get('search', '')
-    query = User.query.filter_by(IS_ACTIVE=1)
-    if search_term:
-        search_like = f"%{search_term}%"
-        query = query.filter(
-            or_(
-                User.USERNAME.like(search_like),
-                User.FNAME.like(search_like),
-                User.LNAME.like(search_like),
-                User.EMAIL.like(search_like)
-            )
-        )
-    users = query.order_by(User.USER_CODE.asc()).all()
-    # Pass the function to the template context VVVVVV
+    """Lists active user accounts, one keyset page at a time, optionally filtered by the account search."""
+    page = account_list_page(User.query.filter_by(IS_ACTIVE=1), User.USER_CODE)
     return render_template('administrator/accounts.html',
-                           accounts=users,
-                           search_term=search_term,
-                           allowed_to_impersonate=allowed_to_impersonate) # Add this line
+                           accounts=page["rows"],
+                           page=page,
+                           search_term=page["search_term"],
+                           allowed_to_impersonate=allowed_to_impersonate)
 
 @administrator_bp.route('/disabled_accounts', methods=['GET'])
 @role_required(Role.ADMINISTRATOR)
 def disabled_accounts():
-    """Lists all inactive/disabled user accounts."""
-    users = User.query.filter_by(IS_ACTIVE=0).order_by(User.USER_CODE.asc()).all()
-    return render_template('administrator/disabled_accounts.html', accounts=users)
+    """Lists inactive/disabled user accounts, one keyset page at a time."""
+    page = account_list_page(User.query.filter_by(IS_ACTIVE=0), User.USER_CODE)
+    return render_template('administrator/disabled_accounts.html', accounts=page["rows"], page=page)
 
 
 # --- Account Locking/Unlocking ---
@@ -337,9 +639,9 @@ def disabled_accounts():
 @administrator_bp.route('/locked_users', methods=['GET'])
 @role_required(Role.ADMINISTRATOR)
 def locked_users():
-    """Lists users currently locked out (excluding admin timeouts)."""
-    # Filter by lock status but exclude those locked by admin timeout if LOCKED_REASON is used
-    locked_users = User.query.filter(User.IS_LOCKED_OUT == 1, User.LOCKED_REASON != 'admin').all()
+    """Lists users currently locked out by failed attempts (admin timeouts have their own page)."""
+    # Expired lockouts are left out; the clear_expired_lockouts job resets them in storage
+    locked_users = active_lockouts().all()
     return render_template('administrator/locked_users.html', locked_users=locked_users)
 
 
@@ -351,7 +653,7 @@ def unlock(user_id):
     user.clear_failed_attempts() # Resets attempts, lockout time, and flags
     # IS_LOCKED_OUT is cleared by clear_failed_attempts
     db.session.commit()
-    log_audit_event("ADMIN_UNLOCK_USER", f"Admin {current_user.USERNAME} unlocked user {user.USERNAME} (ID: {user_id}).")
+    log_audit_event("ADMIN_UNLOCK_USER", f"Admin {current_user.USERNAME} unlocked user {user.USERNAME} (ID: {user_id}).", subject_id=user_id)
     flash(f'Account for {user.USERNAME} has been unlocked.', 'success')
     return redirect(request.referrer or url_for('administrator_bp.locked_users')) # Redirect back
 
@@ -360,13 +662,8 @@ def unlock(user_id):
 @role_required(Role.ADMINISTRATOR)
 def unlock_all():
     """Unlocks all users locked due to failed attempts."""
-    locked_users = User.query.filter(User.IS_LOCKED_OUT == 1, User.LOCKED_REASON != 'admin').all()
-    count = 0
-    for user in locked_users:
-        user.clear_failed_attempts()
-        count += 1
+    count = unlock_all_lockouts()
     if count > 0:
-        db.session.commit()
         log_audit_event("ADMIN_UNLOCK_ALL", f"Admin {current_user.USERNAME} unlocked {count} accounts.")
         flash(f'{count} locked accounts have been unlocked.', 'success')
     else:
@@ -434,7 +731,7 @@ def edit_user(user_id):
 
             db.session.commit()
             if changes:
-                 log_audit_event("ADMIN_EDIT_USER", f"Admin {current_user.USERNAME} edited user {user.USERNAME} (ID: {user_id}). Changes: {'; '.join(changes)}.")
+                 log_audit_event("ADMIN_EDIT_USER", f"Admin {current_user.USERNAME} edited user {user.USERNAME} (ID: {user_id}). Changes: {'; '.join(changes)}.", subject_id=user_id)
             flash(f'User {user.USERNAME} updated successfully!', 'success')
             return redirect(url_for('administrator_bp.accounts'))
 
@@ -463,7 +760,7 @@ def disable_user(user_id):
         user.IS_ACTIVE = 0
         user.clear_failed_attempts() # Also clear locks when disabling
         db.session.commit()
-        log_audit_event("ADMIN_DISABLE_USER", f"Admin {current_user.USERNAME} disabled user {user.USERNAME} (ID: {user_id}).")
+        log_audit_event("ADMIN_DISABLE_USER", f"Admin {current_user.USERNAME} disabled user {user.USERNAME} (ID: {user_id}).", subject_id=user_id)
         flash(f'User {user.USERNAME} has been disabled.', 'info')
 
     # Redirect back to the page the admin came from (active or disabled list)
@@ -486,7 +783,7 @@ def enable_user(user_id):
         user.IS_ACTIVE = 1
         user.clear_failed_attempts() # Clear any residual locks
         db.session.commit()
-        log_audit_event("ADMIN_ENABLE_USER", f"Admin {current_user.USERNAME} enabled user {user.USERNAME} (ID: {user_id}).")
+        log_audit_event("ADMIN_ENABLE_USER", f"Admin {current_user.USERNAME} enabled user {user.USERNAME} (ID: {user_id}).", subject_id=user_id)
         flash(f'User {user.USERNAME} has been enabled.', 'success')
 
     return redirect(request.referrer or url_for('administrator_bp.disabled_accounts'))
@@ -509,7 +806,7 @@ def reset_user_password(user_id):
         user.clear_failed_attempts() # Unlock account on password reset
         db.session.commit()
 
-        log_audit_event("ADMIN_RESET_PASSWORD", f"Admin {current_user.USERNAME} reset password for user {user.USERNAME} (ID: {user_id}).")
+        log_audit_event("ADMIN_RESET_PASSWORD", f"Admin {current_user.USERNAME} reset password for user {user.USERNAME} (ID: {user_id}).", subject_id=user_id, sync=True)
 
         # Flash temporary password (use secure delivery in production)
         flash_message = (
@@ -564,7 +861,7 @@ def sponsor_decision(sponsor_id, decision):
 
     try:
         db.session.commit()
-        log_audit_event("ADMIN_SPONSOR_REVIEW", f"Admin {current_user.USERNAME} {action_past} sponsor {username} (ID: {sponsor_id}).")
+        log_audit_event("ADMIN_SPONSOR_REVIEW", f"Admin {current_user.USERNAME} {action_past} sponsor {username} (ID: {sponsor_id}).", subject_id=sponsor_id, sponsor_id=sponsor_id)
         flash(f"Sponsor {username} {action_past}!", "info")
     except Exception as e:
         db.session.rollback()
@@ -580,8 +877,8 @@ def sponsor_decision(sponsor_id, decision):
 def timeout_users():
     """Displays interface for manually timing out users."""
     # Filter out the current admin to prevent self-timeout via this UI
-    users = User.query.filter(User.USER_CODE != current_user.USER_CODE).order_by(User.USERNAME.asc()).all()
-    return render_template("administrator/timeout_users.html", users=users) # Needs this template
+    page = account_list_page(User.query.filter(User.USER_CODE != current_user.USER_CODE), User.USERNAME)
+    return render_template("administrator/timeout_users.html", users=page["rows"], page=page)
 
 @administrator_bp.post("/set_timeout/<int:user_id>")
 @role_required(Role.ADMINISTRATOR)
@@ -609,7 +906,7 @@ def set_timeout(user_id):
     user.LOCKED_REASON = "admin" # Mark as admin-initiated timeout
     db.session.commit()
 
-    log_audit_event("ADMIN_TIMEOUT", f"Admin {current_user.USERNAME} timed out user {user.USERNAME} (ID: {user_id}) for {minutes} minutes.")
+    log_audit_event("ADMIN_TIMEOUT", f"Admin {current_user.USERNAME} timed out user {user.USERNAME} (ID: {user_id}) for {minutes} minutes.", subject_id=user_id)
     flash(f"User {user.USERNAME} has been timed out until {user.LOCKOUT_TIME.strftime('%Y-%m-%d %H:%M:%S UTC')}.", "info")
     return redirect(url_for("administrator_bp.timeout_users"))
 
@@ -623,9 +920,33 @@ def clear_timeout(user_id):
     if user.IS_LOCKED_OUT == 1 and user.LOCKED_REASON == "admin":
         user.clear_failed_attempts() # This also clears IS_LOCKED_OUT, LOCKOUT_TIME, LOCKED_REASON
         db.session.commit()
-        log_audit_event("ADMIN_CLEAR_TIMEOUT", f"Admin {current_user.USERNAME} cleared timeout for user {user.USERNAME} (ID: {user_id}).")
+        log_audit_event("ADMIN_CLEAR_TIMEOUT", f"Admin {current_user.USERNAME} cleared timeout for user {user.USERNAME} (ID: {user_id}).", subject_id=user_id)
         flash(f"Admin timeout cleared for user {user.USERNAME}.", "success")
     else:
         flash(f"User {user.USERNAME} was not under an admin timeout.", "warning")
 
-    return redirect(url_for("administrator_bp.timeout_users"))
\ No newline at end of file
+    return redirect(url_for("administrator_bp.timeout_users"))
+@administrator_bp.route("/sql_metrics")
+@role_required(Role.ADMINISTRATOR)
+def sql_metrics_dashboard():
+    """Per-endpoint request/DB time and query count percentiles, recent N+1 warnings and password hashing queue times (this worker only)."""
+    metrics = current_app.extensions.get("sql_metrics")
+    hasher = current_app.extensions.get("password_hasher")
+    enabled = metrics is not None and metrics.enabled
+    return render_template(
+        "administrator/sql_metrics.html",
+        enabled=enabled,
+        endpoints=metrics.endpoint_summary() if enabled else [],
+        warnings=metrics.recent_warnings() if enabled else [],
+        threshold=metrics.threshold if enabled else None,
+        hashing=hasher.stats() if hasher is not None else None,
+    )
+
+@administrator_bp.route("/sql_metrics/reset", methods=["POST"])
+@role_required(Role.ADMINISTRATOR)
+def reset_sql_metrics():
+    metrics = current_app.extensions.get("sql_metrics")
+    if metrics is not None:
+        metrics.reset()
+    flash("SQL metrics cleared.", "info")
+    return redirect(url_for("administrator_bp.sql_metrics_dashboard"))
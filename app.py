@@ -8,11 +8,24 @@ from dotenv import load_dotenv
 from flask_apscheduler import APScheduler
 from flask_login import current_user, logout_user
 from extensions import db, migrate, login_manager, csrf, bcrypt
+from common.audit_writer import audit_writer
+from common.sql_metrics import sql_metrics
+from common.identity_cache import identity_cache
+from common.password_hashing import password_hasher
+from common.login_throttle import login_throttle
+from common.template_cache import template_cache
+from common.static_assets import static_assets
 from config import Config
 from models import User
 from flask_wtf.csrf import CSRFProtect
+from werkzeug.middleware.proxy_fix import ProxyFix
 # Removed redundant imports of extensions
 
+try:
+    import fcntl # Not available on Windows; the scheduler then starts in every process that asks
+except ImportError:
+    fcntl = None
+
 # Initialize scheduler and CSRF protection
 scheduler = APScheduler()
 # csrf object is imported from extensions, no need to redefine here
@@ -27,6 +40,10 @@ def create_app():
     # Kept SECRET_KEY and WTF_CSRF_TIME_LIMIT from upstream for completeness
     app.config["SECRET_KEY"] = os.getenv("SECRET_KEY", "dev-secret-change-me")
     app.config["WTF_CSRF_TIME_LIMIT"] = None  # Disable time limit on CSRF tokens
+    if app.config["TRUSTED_PROXY_COUNT"]:
+        # remote_addr/scheme from the X-Forwarded-* entries our own proxies added, never the client's
+        proxies = app.config["TRUSTED_PROXY_COUNT"]
+        app.wsgi_app = ProxyFix(app.wsgi_app, x_for=proxies, x_proto=proxies)
 
     # Initialize extensions with the app
     db.init_app(app)
@@ -36,6 +53,13 @@ def create_app():
     login_manager.login_message_category = 'info'
     csrf.init_app(app)
     bcrypt.init_app(app)
+    audit_writer.init_app(app)
+    sql_metrics.init_app(app)
+    identity_cache.init_app(app)
+    password_hasher.init_app(app)
+    login_throttle.init_app(app)
+    template_cache.init_app(app)
+    static_assets.init_app(app)
 
     # Custom error handler
     @app.errorhandler(403)
@@ -68,20 +92,23 @@ def create_app():
     # Register the new impersonation blueprint
     app.register_blueprint(impersonation_bp, url_prefix='/impersonation')
 
-    # Schedule the version update job
-    with app.app_context():
+    app.before_request(before_request_handler)
+
+    # Weekly version bump: run by `flask update-version` (build.sh) and the daily job (register_jobs),
+    # never at startup, so workers and scripts don't query and commit while booting
+    @app.cli.command("update-version")
+    def update_version_command():
+        """Bumps the About page version if a week has passed since the last release."""
         update_version()
+        print("✅ Version checked.")
 
-    # Configure scheduler to check periodically
-    scheduler.add_job(
-        id='check_version',
-        func=lambda: update_version(app=app), # Pass app context to scheduled job
-        trigger='interval',
-        hours=24  # Check once per day
-    )
-    # Uncomment to start the scheduler if needed
-    # if not scheduler.running:
-    #    scheduler.start()
+    # Expired failed-attempt lockouts: also a scheduled job (register_jobs); this is the cron/manual entry
+    @app.cli.command("clear-lockouts")
+    def clear_lockouts_command():
+        """Resets failed-attempt lockouts whose LOCKOUT_TIME has passed."""
+        from common.lockouts import clear_expired_lockouts
+        count = clear_expired_lockouts(batch_size=app.config.get('LOCKOUT_CLEANUP_BATCH_SIZE', 500))
+        print(f"✅ Cleared {count} expired lockouts.")
 
     return app
 
@@ -89,7 +116,8 @@ def create_app():
 @login_manager.user_loader
 def load_user(user_id: str):
     try:
-        return db.session.get(User, int(user_id))
+        # Snapshot of the auth fields; the full User is only loaded if a view needs it
+        return identity_cache.get(int(user_id))
     except (ValueError, TypeError):
         return None
 
@@ -99,12 +127,8 @@ def unauth():
     flash("You must be logged in to view that page.", "info")
     return redirect(url_for("auth.login"))
 
-# Create the Flask app instance
-app = create_app()
-
 # --- Before Request Handlers ---
 
-@app.before_request
 def before_request_handler():
     """
     Combines multiple before_request checks into one function for clarity.
@@ -127,11 +151,130 @@ def before_request_handler():
     g.impersonator = None
     if g.is_impersonating and session.get('original_user_code'):
         impersonator_code = session.get('original_user_code')
-        # Use a safe query to get the impersonator object
-        g.impersonator = User.query.filter_by(USER_CODE=impersonator_code).first()
+        # Served from the identity cache like current_user
+        g.impersonator = identity_cache.get(impersonator_code)
+
+
+# --- Background Jobs ---
+
+_scheduler_lock = None # Held for the life of the process that runs the scheduler
+
+def start_scheduler(app):
+    """
+    Registers the background jobs and starts the scheduler, in at most one process per
+    host: the first process with SCHEDULER_ENABLED to lock <instance>/scheduler.lock runs
+    them and the other gunicorn workers skip. Called from gunicorn.conf.py and by
+    `python app.py`, never from create_app(), so CLI commands and scripts don't run jobs.
+    Returns True if this process now runs the scheduler.
+    """
+    global _scheduler_lock
+    if scheduler.running or not app.config.get('SCHEDULER_ENABLED', True):
+        return scheduler.running
+    if fcntl:
+        os.makedirs(app.instance_path, exist_ok=True)
+        lock_file = open(os.path.join(app.instance_path, 'scheduler.lock'), 'w')
+        try:
+            fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            lock_file.close()
+            return False
+        _scheduler_lock = lock_file # Released when this process exits, so a replacement worker takes over
+
+    register_jobs(app)
+    scheduler.init_app(app)
+    scheduler.start()
+    return scheduler.running
+
+def register_jobs(app):
+    """Adds every background job to the scheduler; each runs inside app's context."""
+    def version_job():
+        from about.routes import update_version
+        with app.app_context():
+            update_version()
+
+    scheduler.add_job(
+        id='check_version',
+        func=version_job,
+        trigger='interval',
+        hours=24,  # Check once per day
+        replace_existing=True
+    )
+    # Nightly audit log retention: move rows past AUDIT_RETENTION_DAYS to the archive
+    def archive_audit_job():
+        from common.audit_archive import archive_audit_log
+        with app.app_context():
+            archive_audit_log()
+
+    scheduler.add_job(
+        id='archive_audit_log',
+        func=archive_audit_job,
+        trigger='cron',
+        hour=3,  # Quiet hours
+        replace_existing=True
+    )
+    # Sales rollup catch-up: purchases written outside checkout (imports, seed data)
+    def sales_rollup_job():
+        from common.sales_rollup import catch_up_sales_rollups
+        with app.app_context():
+            catch_up_sales_rollups()
+
+    scheduler.add_job(
+        id='sales_rollup_catch_up',
+        func=sales_rollup_job,
+        trigger='interval',
+        minutes=15,
+        replace_existing=True
+    )
+    # Monthly invoices for the previous month. Checked daily rather than only on the 1st, so a
+    # month isn't skipped when no worker was up that morning; rendered invoices are skipped.
+    def invoice_job():
+        from common.invoices import generate_invoices, previous_period
+        with app.app_context():
+            generate_invoices(previous_period())
+
+    scheduler.add_job(
+        id='generate_invoices',
+        func=invoice_job,
+        trigger='cron',
+        hour=4,
+        misfire_grace_time=3600, # Still run if the worker was busy or restarting at 04:00
+        coalesce=True,
+        replace_existing=True
+    )
+    # Nightly incremental analytics export (only rows newer than the last run's watermark)
+    def analytics_export_job():
+        from common.analytics_export import run_analytics_export
+        with app.app_context():
+            run_analytics_export()
+
+    scheduler.add_job(
+        id='analytics_export',
+        func=analytics_export_job,
+        trigger='cron',
+        hour=2,
+        misfire_grace_time=3600, # A missed night is otherwise picked up by the next one, from the watermark
+        coalesce=True,
+        replace_existing=True
+    )
+    # Reset failed-attempt lockouts whose time has passed, so they stop showing as locked
+    def clear_lockouts_job():
+        from common.lockouts import clear_expired_lockouts
+        with app.app_context():
+            clear_expired_lockouts(batch_size=app.config.get('LOCKOUT_CLEANUP_BATCH_SIZE', 500))
+
+    scheduler.add_job(
+        id='clear_expired_lockouts',
+        func=clear_lockouts_job,
+        trigger='interval',
+        minutes=app.config.get('LOCKOUT_CLEANUP_MINUTES', 5),
+        replace_existing=True
+    )
 
 
 # --- Main Application Execution ---
 
+# No module-level app: `flask` finds create_app(), gunicorn runs "app:create_app()"
 if __name__ == '__main__':
-    app.run(debug=True)
\ No newline at end of file
+    dev_app = create_app()
+    start_scheduler(dev_app) # The reloader's watcher process keeps the lock, so jobs don't restart on every reload
+    dev_app.run(debug=True)
\ No newline at end of file
@@ -0,0 +1,23 @@
+import argparse
+from app import create_app
+from common.audit_archive import archive_audit_log, archived_through
+
+def main():
+    parser = argparse.ArgumentParser(description="Move old AUDIT_LOG rows into the compressed archive.")
+    parser.add_argument("--older-than-days", type=int, default=None, help="Defaults to AUDIT_RETENTION_DAYS.")
+    parser.add_argument("--batch-size", type=int, default=None, help="Defaults to AUDIT_ARCHIVE_BATCH_SIZE.")
+    parser.add_argument("--dry-run", action="store_true", help="Only count the rows that would be archived.")
+    args = parser.parse_args()
+
+    app = create_app()
+    with app.app_context():
+        print("--- Starting Audit Log Archive ---")
+        count = archive_audit_log(args.older_than_days, args.batch_size, dry_run=args.dry_run)
+        if args.dry_run:
+            print(f"{count} audit rows would be archived.")
+        else:
+            print(f"✅ Archived {count} audit rows. Archive now covers everything before {archived_through()}.")
+        print("\n--- Audit Log Archive Complete ---")
+
+if __name__ == '__main__':
+    main()
@@ -1,16 +1,15 @@
 # auth/routes.py
-import base64
-from io import BytesIO
 from urllib.parse import urlparse, urljoin
-from flask import Blueprint, render_template, request, redirect, url_for, flash
+from flask import Blueprint, render_template, request, redirect, url_for, flash, abort, current_app, Response
 from flask_login import login_user, logout_user, login_required, current_user
 import pyotp
-import qrcode
 from models import User, Role  # Role has DRIVER, SPONSOR, ADMINISTRATOR
 from datetime import datetime, timedelta
 from extensions import db
 from sqlalchemy import or_
-from common.logging import log_audit_event, LOGIN_EVENT
+from common.logging import log_audit_event, request_ip, LOGIN_EVENT
+from common.login_throttle import login_throttle
+from common.totp import qr_cache, secret_fingerprint, QR_FORMATS
 # If auth_bp is defined in __init__.py and imported, use that.
 # If defined here, the relative import might not be needed, but it's often harmless.
 # Assuming auth_bp is defined here based on the original structure.
@@ -62,16 +61,25 @@ def twofa_setup():
         current_user.TOTP_SECRET = pyotp.random_base32()
         db.session.commit()
 
-    # Generate QR code URI
-    uri = f"otpauth://totp/TripleTsRewards:{current_user.USERNAME}?secret={current_user.TOTP_SECRET}&issuer=TripleTsRewards"
-    img = qrcode.make(uri)
+    # The QR code is a separate (cached) image; the version changes with the secret
+    qr_url = url_for("auth.twofa_qr", fmt=current_app.config.get("TOTP_QR_FORMAT", "png"),
+                     v=secret_fingerprint(current_user.TOTP_SECRET))
+    return render_template("auth/setup_2fa.html", qr_url=qr_url, secret=current_user.TOTP_SECRET)
 
-    # Convert QR code image to data URL for embedding in HTML
-    buf = BytesIO()
-    img.save(buf, format="PNG")
-    qr_data_url = "data:image/png;base64," + base64.b64encode(buf.getvalue()).decode("utf-8")
-
-    return render_template("auth/setup_2fa.html", qr_data_url=qr_data_url, secret=current_user.TOTP_SECRET)
+@auth_bp.route("/twofa/qr.<fmt>", methods=["GET"])
+@login_required
+def twofa_qr(fmt):
+    """The 2FA setup QR code for the current user's secret, as SVG or PNG."""
+    if fmt not in QR_FORMATS or not current_user.TOTP_SECRET:
+        abort(404)
+    secret = current_user.TOTP_SECRET
+    response = Response(qr_cache.get(current_user.USER_CODE, current_user.USERNAME, secret, fmt),
+                        mimetype=QR_FORMATS[fmt])
+    response.set_etag(f"{secret_fingerprint(secret)}-{fmt}")
+    # Encodes the secret: browser cache only, never a shared one
+    response.cache_control.private = True
+    response.cache_control.max_age = 3600
+    return response.make_conditional(request)
 
 @auth_bp.route("/twofa/verify", methods=["POST"])
 @login_required
@@ -106,12 +114,13 @@ def login():
     if request.method == "POST":
         username = request.form.get("username", "").strip()
         password = request.form.get("password", "")
+        ip = request_ip()
+        login_throttle.check(username, ip) # 429 before USERS or bcrypt are touched
         user = User.query.filter_by(USERNAME=username).first()
-        ip = request.headers.get("X-Forwarded-For", request.remote_addr)
 
         if not user:
             flash("Invalid username or password", "danger")
-            log_audit_event(LOGIN_EVENT, f"FAIL user={username} ip={ip}")
+            login_throttle.failed(username, ip, "unknown_user", payload={"username": username})
             return render_template("common/login.html")
 
         if user.is_account_locked():
@@ -124,7 +133,8 @@ def login():
                  flash(f"Account locked due to too many failed login attempts. Try again {until}.", "danger")
             else: # Generic or unknown reason
                 flash("Account locked. Please contact your administrator.", "danger")
-            log_audit_event(LOGIN_EVENT, f"FAIL user={user.USERNAME} ip={ip} reason=locked({lock_reason})")
+            login_throttle.failed(user.USERNAME, ip, f"locked({lock_reason})", subject_id=user.USER_CODE,
+                                  details=f"reason=locked({lock_reason})")
             return render_template("common/login.html")
 
         if not user.check_password(password):
@@ -132,15 +142,20 @@ def login():
             db.session.commit()
             remaining = max(0, LOCKOUT_ATTEMPTS - user.FAILED_ATTEMPTS)
             flash(f"Invalid username or password. {remaining} attempts remaining before lockout.", "danger")
-            log_audit_event(LOGIN_EVENT, f"FAIL user={user.USERNAME} ip={ip} attempts={user.FAILED_ATTEMPTS}")
+            login_throttle.failed(user.USERNAME, ip, "bad_password", subject_id=user.USER_CODE,
+                                  details=f"attempts={user.FAILED_ATTEMPTS}",
+                                  payload={"attempts": user.FAILED_ATTEMPTS})
             return render_template("common/login.html")
 
         # On successful password check
         user.clear_failed_attempts()
         db.session.commit()
+        login_throttle.succeeded(username, ip)
         login_user(user) # Log the user in
         flash("Login successful!", "success")
-        log_audit_event(LOGIN_EVENT, f"SUCCESS user={user.USERNAME} role={user.USER_TYPE} ip={ip}")
+        log_audit_event(LOGIN_EVENT, f"SUCCESS user={user.USERNAME} role={user.USER_TYPE} ip={ip}",
+                        actor_id=user.USER_CODE, subject_id=user.USER_CODE, ip=ip,
+                        payload={"status": "SUCCESS", "role": user.USER_TYPE})
 
         # --- Redirect logic ---
         # If 2FA is enabled, redirect to verify step (implement this)
@@ -161,11 +176,12 @@ def login():
 @login_required
 def logout():
     """Handles user logout."""
-    ip = request.headers.get("X-Forwarded-For", request.remote_addr)
+    ip = request_ip()
     uname = current_user.USERNAME
     urole = current_user.USER_TYPE
 
-    log_audit_event("LOGOUT", f"user={uname} role={urole} ip={ip}") # Use a distinct event type
+    log_audit_event("LOGOUT", f"user={uname} role={urole} ip={ip}", # Use a distinct event type
+                    subject_id=current_user.USER_CODE, ip=ip, payload={"role": urole})
 
     logout_user()
 
@@ -195,7 +211,7 @@ def reset_password():
         # !!! IMPORTANT: In a real app, EMAIL this link. Do NOT flash it. !!!
         print(f"Password reset link for {user.USERNAME}: {reset_url}") # For dev purposes
         flash(f"Password reset link generated (valid for {RESET_TOKEN_TTL_MINUTES} minutes). Check console.", "info") # Dev message
-        log_audit_event("RESET REQUEST", f"Password reset link generated for user {user.USERNAME}.")
+        log_audit_event("RESET REQUEST", f"Password reset link generated for user {user.USERNAME}.", subject_id=user.USER_CODE)
         # Redirect back to login or show a confirmation message page
         return redirect(url_for("auth.login"))
 
@@ -218,7 +234,7 @@ def reset_token(token: str):
         user.clear_reset_token()
         db.session.commit()
         flash("Password reset token has expired. Please request a new one.", "warning")
-        log_audit_event("RESET EXPIRED", f"Password reset token expired for user {user.USERNAME}.")
+        log_audit_event("RESET EXPIRED", f"Password reset token expired for user {user.USERNAME}.", subject_id=user.USER_CODE)
         return redirect(url_for("auth.reset_password"))
 
     # Handle the password form submission
@@ -241,7 +257,7 @@ def reset_token(token: str):
         db.session.commit()
 
         flash("Your password has been reset successfully. You can now log in.", "success")
-        log_audit_event("RESET SUCCESS", f"Password reset successful for user {user.USERNAME}.")
+        log_audit_event("RESET SUCCESS", f"Password reset successful for user {user.USERNAME}.", subject_id=user.USER_CODE)
         return redirect(url_for("auth.login"))
 
     # For GET request (show the password reset form)
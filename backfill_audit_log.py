@@ -0,0 +1,163 @@
+import argparse
+import re
+from sqlalchemy import select, update, and_
+from app import create_app
+from models import db, AuditLog, User
+from common.audit_search import rebuild_search_index
+
+# --- CONFIGURATION ---
+DEFAULT_BATCH_SIZE = 1000
+# --- END CONFIGURATION ---
+
+# Patterns for the DETAILS strings written before the structured columns existed
+KV_PATTERN = re.compile(r"(\w+)=(\S+)")                       # LOGIN_EVENT / LOGOUT: "FAIL user=bob ip=1.2.3.4"
+ID_PATTERN = re.compile(r"\(ID: (\d+)\)")                      # "... user bob (ID: 12) ..."
+SPONSOR_ID_PATTERN = re.compile(r"Sponsor ID: (\d+)")          # DRIVER_POINTS award/remove/checkout
+ACTOR_PATTERN = re.compile(r"^(?:Admin|Sponsor) (\S+) ")       # "Admin alice unlocked ...", "Sponsor acme awarded ..."
+BY_DRIVER_PATTERN = re.compile(r"by driver \S+ \(ID: (\d+)\)") # Checkout deductions: the driver acted on themselves
+FOR_USER_PATTERN = re.compile(r"for user (\S+?)\.?$")         # "RESET SUCCESS ... for user bob."
+POINTS_PATTERN = re.compile(r"(awarded|removed) (\d+) points|Amount: (-?\d+)")
+BALANCE_PATTERN = re.compile(r"New Balance: (-?\d+)")
+
+
+def parse_legacy_details(event_type, details):
+    """
+    Extracts structured fields from a legacy DETAILS string.
+    Usernames are returned separately since they need a lookup to become USER_CODEs.
+    """
+    fields = {}
+    usernames = {}
+    payload = {}
+    if not details:
+        return fields, usernames, payload
+
+    kv = dict(KV_PATTERN.findall(details))
+    if kv:
+        if "ip" in kv:
+            fields["IP"] = kv["ip"].split(",")[0][:45]
+        if "user" in kv:
+            usernames["SUBJECT_USER_ID"] = kv["user"]
+        status = details.split(" ", 1)[0]
+        if status in ("SUCCESS", "FAIL"):
+            payload["status"] = status
+        for key in ("role", "attempts", "reason"):
+            if key in kv:
+                payload[key] = kv[key]
+
+    match = ID_PATTERN.search(details)
+    if match:
+        fields["SUBJECT_USER_ID"] = int(match.group(1))
+        usernames.pop("SUBJECT_USER_ID", None)
+
+    match = SPONSOR_ID_PATTERN.search(details)
+    if match:
+        fields["SPONSOR_ID"] = int(match.group(1))
+    elif event_type == "ADMIN_SPONSOR_REVIEW" and "SUBJECT_USER_ID" in fields:
+        fields["SPONSOR_ID"] = fields["SUBJECT_USER_ID"]
+
+    match = BY_DRIVER_PATTERN.search(details)
+    if match:
+        fields["ACTOR_USER_ID"] = int(match.group(1))
+    elif details.startswith("Sponsor ") and "SPONSOR_ID" in fields:
+        # Sponsors award/remove points as themselves
+        fields["ACTOR_USER_ID"] = fields["SPONSOR_ID"]
+    else:
+        match = ACTOR_PATTERN.search(details)
+        if match:
+            usernames["ACTOR_USER_ID"] = match.group(1)
+
+    if "SUBJECT_USER_ID" not in fields and "SUBJECT_USER_ID" not in usernames:
+        match = FOR_USER_PATTERN.search(details)
+        if match:
+            usernames["SUBJECT_USER_ID"] = match.group(1)
+
+    match = POINTS_PATTERN.search(details)
+    if match:
+        if match.group(3) is not None:
+            payload.update(action="purchase", points=int(match.group(3)))
+        else:
+            payload.update(action="award" if match.group(1) == "awarded" else "remove", points=int(match.group(2)))
+    match = BALANCE_PATTERN.search(details)
+    if match:
+        payload["balance"] = int(match.group(1))
+
+    return fields, usernames, payload
+
+
+def backfill_batch(rows):
+    """Parses one batch of rows and writes the structured columns back with a single bulk UPDATE."""
+    parsed = [(row, *parse_legacy_details(row.EVENT_TYPE, row.DETAILS)) for row in rows]
+
+    # Resolve every username mentioned in the batch with one IN query
+    wanted = {name for _, _, usernames, _ in parsed for name in usernames.values()}
+    user_codes = {}
+    if wanted:
+        user_codes = dict(db.session.execute(
+            select(User.USERNAME, User.USER_CODE).where(User.USERNAME.in_(wanted))
+        ).all())
+
+    updates = []
+    for row, fields, usernames, payload in parsed:
+        for column, name in usernames.items():
+            if name in user_codes:
+                fields[column] = user_codes[name]
+        if payload:
+            fields["PAYLOAD"] = payload
+        if fields:
+            updates.append({"EVENT_ID": row.EVENT_ID, **fields})
+
+    if updates:
+        # ORM bulk UPDATE by primary key (executemany under the hood)
+        db.session.execute(update(AuditLog), updates)
+    db.session.commit()
+    return len(updates)
+
+
+def backfill_structured_columns(batch_size=DEFAULT_BATCH_SIZE):
+    """Walks AUDIT_LOG in primary key order and fills structured columns for legacy rows."""
+    not_filled = and_(
+        AuditLog.ACTOR_USER_ID.is_(None),
+        AuditLog.SUBJECT_USER_ID.is_(None),
+        AuditLog.SPONSOR_ID.is_(None),
+        AuditLog.IP.is_(None),
+        AuditLog.PAYLOAD.is_(None),
+    )
+    last_id = 0
+    scanned = 0
+    filled = 0
+    while True:
+        # Keyset pagination keeps every batch an index range scan on the primary key
+        rows = db.session.execute(
+            select(AuditLog.EVENT_ID, AuditLog.EVENT_TYPE, AuditLog.DETAILS)
+            .where(AuditLog.EVENT_ID > last_id, not_filled)
+            .order_by(AuditLog.EVENT_ID)
+            .limit(batch_size)
+        ).all()
+        if not rows:
+            break
+        last_id = rows[-1].EVENT_ID
+        scanned += len(rows)
+        filled += backfill_batch(rows)
+        print(f"  - Processed up to EVENT_ID {last_id} ({scanned} scanned, {filled} filled).")
+    return scanned, filled
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Backfill structured AUDIT_LOG columns from legacy DETAILS strings.")
+    parser.add_argument("--batch-size", type=int, default=DEFAULT_BATCH_SIZE)
+    parser.add_argument("--search-index", action="store_true",
+                        help="Also rebuild the audit search token index (non-MySQL databases).")
+    args = parser.parse_args()
+
+    app = create_app()
+    with app.app_context():
+        print("--- Starting Audit Log Backfill ---")
+        scanned, filled = backfill_structured_columns(args.batch_size)
+        print(f"✅ Backfilled {filled} of {scanned} legacy audit rows.")
+        if args.search_index:
+            indexed = rebuild_search_index(args.batch_size)
+            print(f"✅ Indexed {indexed} audit rows for search.")
+        print("\n--- Audit Log Backfill Complete ---")
+
+if __name__ == '__main__':
+    main()
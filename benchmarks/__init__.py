@@ -0,0 +1,9 @@
+# benchmarks/__init__.py
+"""
+HTTP benchmark suite for the main driver and sponsor workflows.
+
+run_benchmarks.py (repo root) builds the app with create_app() against a scratch
+database, seeds it (benchmarks/seed.py), replaces the eBay API with a local stub
+(benchmarks/ebay_stub.py) and drives the scenarios in benchmarks/scenarios.py with
+concurrent clients over real HTTP.
+"""
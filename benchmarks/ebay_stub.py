@@ -0,0 +1,68 @@
+# benchmarks/ebay_stub.py
+"""
+Local stand-in for the eBay token and Browse APIs used by truck_rewards/routes.py.
+
+install() swaps the `requests` module seen by the store routes for a stub that answers
+token and item search calls from memory (optionally after a fixed delay), so benchmarks
+never leave the machine and product results are the same on every run.
+"""
+import os
+import time
+import zlib
+import requests
+
+_ITEMS_PER_PAGE = 20
+
+
+class _StubResponse:
+    def __init__(self, payload):
+        self._payload = payload
+        self.status_code = 200
+
+    def raise_for_status(self):
+        pass
+
+    def json(self):
+        return self._payload
+
+
+class StubRequests:
+    """Implements the small part of the requests API the store routes call."""
+    exceptions = requests.exceptions
+
+    def __init__(self, latency_ms=0):
+        self.latency = latency_ms / 1000.0
+
+    def _wait(self):
+        if self.latency:
+            time.sleep(self.latency)
+
+    def post(self, url, headers=None, data=None, **kwargs):
+        self._wait()
+        return _StubResponse({"access_token": "benchmark-token", "expires_in": 7200})
+
+    def get(self, url, headers=None, params=None, **kwargs):
+        self._wait()
+        params = params or {}
+        key = f"{params.get('category_ids', '')}:{params.get('q', '')}"
+        base = zlib.crc32(key.encode())
+        items = []
+        for i in range(min(int(params.get("limit", _ITEMS_PER_PAGE)), _ITEMS_PER_PAGE)):
+            n = (base + i * 7919) % 100000
+            items.append({
+                "itemId": f"v1|{n}|0",
+                "title": f"Benchmark item {n}",
+                "price": {"value": f"{5 + n % 200}.{n % 100:02d}", "currency": "USD"},
+                "image": {"imageUrl": f"https://i.ebayimg.com/images/bench/{n}.jpg"},
+            })
+        return _StubResponse({"total": len(items), "itemSummaries": items})
+
+
+def install(latency_ms=0):
+    """Points the store routes at the stub. Call before the first request."""
+    import truck_rewards.routes as store_routes
+    os.environ.setdefault("EBAY_PROD_APP_ID", "benchmark")
+    os.environ.setdefault("EBAY_PROD_CERT_ID", "benchmark")
+    os.environ.setdefault("EBAY_APP_ID", "benchmark")
+    os.environ.setdefault("EBAY_CERT_ID", "benchmark")
+    store_routes.requests = StubRequests(latency_ms)
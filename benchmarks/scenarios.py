@@ -0,0 +1,118 @@
+# benchmarks/scenarios.py
+"""
+Benchmark scenarios and the HTTP client that times them.
+
+A scenario is a setup(client, data, index) that logs a client in and picks its working
+set, plus a step(client, state, rng) that performs one operation (one or more requests).
+Every request is timed under an endpoint label; DB time comes from the Server-Timing
+header added by common/sql_metrics.py.
+"""
+import re
+import threading
+import time
+import requests
+
+_DB_TIMING = re.compile(r"db;dur=([\d.]+)")
+
+
+class Recorder:
+    """Thread-safe per-label samples: (latency ms, db ms or None, ok)."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.samples = {}
+
+    def add(self, label, latency_ms, db_ms, ok):
+        with self._lock:
+            self.samples.setdefault(label, []).append((latency_ms, db_ms, ok))
+
+
+class Client:
+    """One simulated user: a cookie-keeping HTTP session against the benchmark server."""
+
+    def __init__(self, base_url, recorder):
+        self.base_url = base_url
+        self.recorder = recorder
+        self.http = requests.Session()
+
+    def request(self, label, method, path, expect=(200, 302), **kwargs):
+        started = time.perf_counter()
+        response = self.http.request(method, self.base_url + path, allow_redirects=False, **kwargs)
+        latency_ms = (time.perf_counter() - started) * 1000
+        match = _DB_TIMING.search(response.headers.get("Server-Timing", ""))
+        # A redirect to the login page means the session was lost: count it as an error
+        ok = response.status_code in expect and "/auth/login" not in response.headers.get("Location", "")
+        self.recorder.add(label, latency_ms, float(match.group(1)) if match else None, ok)
+        return response
+
+    def login(self, username, password, label=None):
+        response = self.request(label or "auth.login", "POST", "/auth/login",
+                                data={"username": username, "password": password}, expect=(302,))
+        if response.status_code != 302:
+            raise RuntimeError(f"Benchmark login failed for {username} ({response.status_code})")
+        return response
+
+
+# --- Scenarios ---
+
+def _driver_setup(client, data, index):
+    drivers = list(data.drivers)
+    code = drivers[index % len(drivers)]
+    sponsor_id = data.drivers[code][0]
+    client.login(data.username(code), data.password, label="setup")
+    client.request("setup", "GET", f"/driver/select_store/{sponsor_id}")
+    return {"driver": code, "sponsor": sponsor_id}
+
+def _sponsor_setup(client, data, index):
+    sponsor_id = data.sponsors[index % len(data.sponsors)]
+    client.login(data.username(sponsor_id), data.password, label="setup")
+    return {"sponsor": sponsor_id, "drivers": data.drivers_of(sponsor_id)}
+
+def _item(rng):
+    n = rng.randrange(100000)
+    return {"id": f"v1|{n}|0", "title": f"Benchmark item {n}", "price": "12.50",
+            "pointsEquivalent": str(125), "image": ""}
+
+
+def login_setup(client, data, index):
+    drivers = list(data.drivers)
+    return {"username": data.username(drivers[index % len(drivers)]), "password": data.password}
+
+def login_step(client, state, rng):
+    client.http.cookies.clear() # Start from a fresh session every time
+    client.login(state["username"], state["password"])
+
+def browse_step(client, state, rng):
+    client.request("rewards_bp.store", "GET", "/truck-rewards/")
+    client.request("rewards_bp.products", "GET", "/truck-rewards/products",
+                   params={"q": rng.choice(["", "gloves", "flashlight", "cooler", "headset"])})
+    client.request("driver_bp.dashboard", "GET", "/driver/dashboard")
+
+def cart_step(client, state, rng):
+    client.request("rewards_bp.add_to_cart", "POST", "/truck-rewards/add_to_cart", data=_item(rng))
+    client.request("rewards_bp.view_cart", "GET", "/truck-rewards/cart")
+    client.request("rewards_bp.cart_count", "GET", "/truck-rewards/cart/count")
+    if rng.random() < 0.2:
+        client.request("rewards_bp.clear_cart", "POST", "/truck-rewards/cart/clear")
+
+def checkout_step(client, state, rng):
+    for _ in range(rng.randint(1, 3)):
+        client.request("setup", "POST", "/truck-rewards/add_to_cart", data=_item(rng))
+    client.request("rewards_bp.checkout", "POST", "/truck-rewards/checkout", expect=(302,))
+
+def sponsor_step(client, state, rng):
+    client.request("sponsor_bp.manage_points_page", "GET", "/sponsor/points")
+    client.request("sponsor_bp.purchase_history", "GET", "/sponsor/purchase_history")
+    if state["drivers"]:
+        client.request("sponsor_bp.manage_points", "POST", f"/sponsor/points/{rng.choice(state['drivers'])}",
+                       data={"action": "award", "points": "10", "reason": "benchmark"}, expect=(302,))
+
+
+# name -> (setup, step); run in this order
+SCENARIOS = {
+    "login": (login_setup, login_step),
+    "store_browse": (_driver_setup, browse_step),
+    "cart": (_driver_setup, cart_step),
+    "checkout": (_driver_setup, checkout_step),
+    "sponsor": (_sponsor_setup, sponsor_step),
+}
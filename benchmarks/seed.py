@@ -0,0 +1,46 @@
+# benchmarks/seed.py
+"""
+Benchmark dataset, generated by common/synthetic_data.py at the requested scale.
+
+Driver balances are topped up afterwards so checkout never runs out of points mid-run.
+"""
+from sqlalchemy import select, update
+from extensions import db
+from models import Role, DriverSponsorAssociation
+from common.synthetic_data import SeedPlan, seed_synthetic_data, synthetic_username
+
+PASSWORD = "benchmark-pass1"
+START_POINTS = 10_000_000
+
+
+class BenchmarkData:
+    """Who the scenarios log in as: sponsor codes and {driver code: [sponsor ids]}."""
+
+    def __init__(self, sponsors, drivers):
+        self.sponsors = sponsors
+        self.drivers = drivers
+        self.password = PASSWORD
+
+    def username(self, user_code):
+        return synthetic_username(Role.DRIVER if user_code in self.drivers else Role.SPONSOR, user_code)
+
+    def drivers_of(self, sponsor_id):
+        return [code for code, sponsor_ids in self.drivers.items() if sponsor_id in sponsor_ids]
+
+
+def seed_benchmark_data(sponsors=20, drivers=500, purchases_per_driver=20, seed=1):
+    """Seeds an empty database (inside an app context) and returns a BenchmarkData."""
+    plan = SeedPlan(drivers=drivers, sponsors=sponsors, admins=1, purchases=drivers * purchases_per_driver,
+                    notifications=drivers * 5, audit_events=drivers * 10, seed=seed, password=PASSWORD)
+    seed_synthetic_data(plan, progress=lambda message: None)
+    db.session.execute(update(DriverSponsorAssociation).values(points=START_POINTS))
+    db.session.commit()
+
+    memberships = {}
+    for driver_id, sponsor_id in db.session.execute(
+        select(DriverSponsorAssociation.driver_id, DriverSponsorAssociation.sponsor_id)
+        .order_by(DriverSponsorAssociation.driver_id)
+    ):
+        memberships.setdefault(driver_id, []).append(sponsor_id)
+    sponsor_ids = sorted({sponsor_id for sponsor_ids in memberships.values() for sponsor_id in sponsor_ids})
+    return BenchmarkData(sponsor_ids, memberships)
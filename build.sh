@@ -10,4 +10,16 @@ pip install -r requirements.txt
 echo "Running database migrations..."
 flask db upgrade
 
+# Weekly About-page version bump (no longer done at app startup)
+echo "Checking release version..."
+flask update-version
+
+# Compile every template into the Jinja bytecode cache so workers start warm
+echo "Precompiling templates..."
+python precompile_templates.py
+
+# Content-hashed, minified and precompressed static files (static/dist) for immutable caching
+echo "Building static assets..."
+python build_assets.py
+
 echo "Build completed successfully"
\ No newline at end of file
@@ -0,0 +1,32 @@
+import argparse
+import time
+from app import create_app
+from common.static_assets import build_assets, brotli, DIST_DIR, MANIFEST_NAME
+
+def main():
+    parser = argparse.ArgumentParser(description="Build static/dist: content-hashed, minified, precompressed assets and optimized images.")
+    parser.add_argument("--max-palette-error", type=float, default=None,
+                        help="Largest RMS difference (0-255) allowed when converting a PNG to a 256-colour palette "
+                             "(default STATIC_PALETTE_MAX_ERROR; 0 keeps every image lossless).")
+    args = parser.parse_args()
+
+    app = create_app()
+    max_error = args.max_palette_error
+    if max_error is None:
+        max_error = app.config.get("STATIC_PALETTE_MAX_ERROR", 8.0)
+
+    print("--- Starting Static Asset Build ---")
+    if brotli is None:
+        print("brotli is not installed; writing .gz variants only.")
+    started = time.perf_counter()
+    report = build_assets(app.static_folder, max_palette_error=max_error)
+    before = sum(original for _, original, _, _ in report)
+    after = sum(built for _, _, built, _ in report)
+    for path, original, built, encodings in report:
+        print(f"  {path:<32} {original / 1024:>8.1f} KB -> {built / 1024:>7.1f} KB  {' '.join(encodings)}")
+    print(f"✅ Built {len(report)} files ({before / 1024:.0f} KB -> {after / 1024:.0f} KB) into "
+          f"static/{DIST_DIR} with {MANIFEST_NAME} in {time.perf_counter() - started:.1f}s.")
+    print("\n--- Static Asset Build Complete ---")
+
+if __name__ == '__main__':
+    main()
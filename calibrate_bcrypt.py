@@ -0,0 +1,31 @@
+import argparse
+from common.password_hashing import benchmark_cost
+
+def main():
+    parser = argparse.ArgumentParser(description="Time bcrypt cost factors on this machine and recommend BCRYPT_LOG_ROUNDS.")
+    parser.add_argument("--target-ms", type=float, default=250.0, help="Longest acceptable time for one hash.")
+    parser.add_argument("--min-rounds", type=int, default=10)
+    parser.add_argument("--max-rounds", type=int, default=15)
+    parser.add_argument("--samples", type=int, default=5, help="Hashes timed per cost (the median is used).")
+    args = parser.parse_args()
+
+    print(f"--- Starting bcrypt Calibration (target {args.target_ms:.0f} ms) ---")
+    recommended = None
+    for rounds in range(args.min_rounds, args.max_rounds + 1):
+        median_ms = benchmark_cost(rounds, samples=args.samples)
+        within = median_ms <= args.target_ms
+        print(f"  cost {rounds:2d}: {median_ms:8.1f} ms {'✅' if within else ''}")
+        if within:
+            recommended = rounds
+        else:
+            break # Every further round doubles the time
+
+    if recommended is None:
+        print(f"❌ Even cost {args.min_rounds} exceeds {args.target_ms:.0f} ms on this machine.")
+    else:
+        print(f"✅ Recommended: BCRYPT_LOG_ROUNDS={recommended}")
+        print("Existing hashes are upgraded to the new cost on each user's next login.")
+    print("\n--- bcrypt Calibration Complete ---")
+
+if __name__ == '__main__':
+    main()
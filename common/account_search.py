@@ -0,0 +1,200 @@
+# common/account_search.py
+"""
+Account search and keyset paging for the admin account pages.
+
+Searches go through USER_SEARCH_TOKENS, an inverted index of lower-cased words from each
+user's username, names and email (the whole address, its local part and its domain are
+tokens too), keyed on (TOKEN, USER_CODE). A prefix match is a range scan of that key
+(TOKEN >= 'ann' AND TOKEN < 'ano') and a whole-word match is an equality lookup, so the
+cost follows the number of matching accounts, not the size of USERS. A search term is
+split into words the same way the index is ("mary-jane" is "mary" and "jane"), and also
+matched as a whole so a username or email typed in full still hits its own token. With
+several terms an account has to match all of them.
+
+The index is kept current by ORM insert/update/delete events on User and by the bulk
+paths (bulk import, synthetic seeding) through insert_user_rows(); rebuild_account_index.py
+fills it for accounts that existed before it, replacing one USER_CODE range per transaction
+so searches keep working while it runs.
+"""
+import re
+from sqlalchemy import select, delete, event, inspect, and_, union
+from sqlalchemy.exc import IntegrityError
+from extensions import db
+from models import User, AccountSearchToken
+
+WORD_PATTERN = re.compile(r"\w+")
+MAX_TOKEN_LENGTH = 64
+MAX_QUERY_TERMS = 4
+MATCH_MODES = ("prefix", "word")
+INDEXED_FIELDS = ("USERNAME", "FNAME", "LNAME", "EMAIL")
+
+_tokens = AccountSearchToken.__table__
+
+
+def account_tokens(username, fname, lname, email):
+    """Search tokens for one account."""
+    tokens = set()
+    for value in (username, fname, lname, email):
+        tokens.update(WORD_PATTERN.findall((value or "").lower()))
+    for whole in (username, email):
+        if whole:
+            tokens.add(whole.lower())
+    if email and "@" in email:
+        local, domain = email.lower().rsplit("@", 1)
+        tokens.update((local, domain))
+    return {token[:MAX_TOKEN_LENGTH] for token in tokens if token}
+
+def query_terms(text):
+    """
+    Lower-cased search terms (whitespace separated, at most MAX_QUERY_TERMS), each as
+    (whole term, its words as account_tokens splits them).
+    """
+    terms = []
+    for term in (text or "").lower().split()[:MAX_QUERY_TERMS]:
+        words = [word[:MAX_TOKEN_LENGTH] for word in WORD_PATTERN.findall(term)][:MAX_QUERY_TERMS]
+        terms.append((term[:MAX_TOKEN_LENGTH], words))
+    return terms
+
+
+# --- Index maintenance ---
+
+def index_accounts(connection, users):
+    """Adds postings for user column dicts (USER_CODE plus INDEXED_FIELDS) with one executemany."""
+    postings = []
+    for user in users:
+        for token in account_tokens(*(user.get(field) for field in INDEXED_FIELDS)):
+            postings.append({"TOKEN": token, "USER_CODE": user["USER_CODE"]})
+    if postings:
+        connection.execute(_tokens.insert(), postings)
+    return len(postings)
+
+def insert_user_rows(connection, rows):
+    """Inserts USERS column dicts on the given connection (one executemany), plus their search postings."""
+    connection.execute(User.__table__.insert(), rows)
+    index_accounts(connection, rows)
+
+def _reindex_range(low, high):
+    """Replaces the postings of every account with low < USER_CODE <= high. Does not commit."""
+    in_range = (AccountSearchToken.USER_CODE > low) & (AccountSearchToken.USER_CODE <= high)
+    db.session.execute(delete(AccountSearchToken).where(in_range))
+    rows = db.session.execute(
+        select(User.USER_CODE, *[getattr(User, field) for field in INDEXED_FIELDS])
+        .where(User.USER_CODE > low, User.USER_CODE <= high)
+    ).all()
+    index_accounts(db.session.connection(), [dict(row._mapping) for row in rows])
+    return len(rows)
+
+def rebuild_account_index(batch_size=1000):
+    """
+    Re-indexes every account, one USER_CODE range of batch_size accounts per transaction,
+    and drops postings of accounts that no longer exist. Returns the number of accounts indexed.
+    """
+    last_code = 0
+    total = 0
+    while True:
+        codes = db.session.execute(
+            select(User.USER_CODE).where(User.USER_CODE > last_code).order_by(User.USER_CODE).limit(batch_size)
+        ).scalars().all()
+        if not codes:
+            break
+        while True:
+            try:
+                count = _reindex_range(last_code, codes[-1])
+                db.session.commit()
+                break
+            except IntegrityError:
+                # An account in the range was created (and indexed) while this batch ran: redo it
+                db.session.rollback()
+        last_code = codes[-1]
+        total += count
+    # Left-over postings above the last account (accounts created since then are in USERS)
+    db.session.execute(delete(AccountSearchToken).where(
+        AccountSearchToken.USER_CODE > last_code,
+        AccountSearchToken.USER_CODE.not_in(select(User.USER_CODE).where(User.USER_CODE > last_code))))
+    db.session.commit()
+    return total
+
+def _user_fields(target):
+    return {"USER_CODE": target.USER_CODE, **{field: getattr(target, field) for field in INDEXED_FIELDS}}
+
+@event.listens_for(User, "after_insert")
+def _index_new_user(mapper, connection, target):
+    index_accounts(connection, [_user_fields(target)])
+
+@event.listens_for(User, "after_update")
+def _reindex_user(mapper, connection, target):
+    state = inspect(target)
+    if any(state.attrs[field].history.has_changes() for field in INDEXED_FIELDS):
+        connection.execute(_tokens.delete().where(_tokens.c.USER_CODE == target.USER_CODE))
+        index_accounts(connection, [_user_fields(target)])
+
+@event.listens_for(User, "after_delete")
+def _unindex_user(mapper, connection, target):
+    connection.execute(_tokens.delete().where(_tokens.c.USER_CODE == target.USER_CODE))
+
+
+# --- Querying ---
+
+def _term_condition(term, mode):
+    if mode == "word":
+        return AccountSearchToken.TOKEN == term
+    # Prefix as a key range, so any B-tree index serves it regardless of LIKE collation rules
+    upper = term[:-1] + chr(ord(term[-1]) + 1)
+    return (AccountSearchToken.TOKEN >= term) & (AccountSearchToken.TOKEN < upper)
+
+def _all_of(words, mode):
+    """USER_CODEs having a posting for every one of words."""
+    hits = select(AccountSearchToken.USER_CODE).where(_term_condition(words[0], mode))
+    for word in words[1:]:
+        hits = hits.where(AccountSearchToken.USER_CODE.in_(
+            select(AccountSearchToken.USER_CODE).where(_term_condition(word, mode))
+        ))
+    return hits
+
+def matching_accounts(text, mode="prefix"):
+    """
+    Condition on User for accounts matching every term of text, or None when text has no terms.
+    mode: 'prefix' (default) or 'word' (whole-word matches only).
+    """
+    terms = query_terms(text)
+    if not terms:
+        return None
+    mode = mode if mode in MATCH_MODES else "prefix"
+    conditions = []
+    for whole, words in terms:
+        hits = _all_of([whole], mode)
+        if words and words != [whole]:
+            hits = union(hits, _all_of(words, mode)) # The whole term (username, email) or all of its words
+        conditions.append(User.USER_CODE.in_(hits))
+    return and_(*conditions)
+
+def parse_cursor(key_column, value):
+    """A keyset cursor from the query string, converted to the key column's type (None if invalid)."""
+    if value in (None, ""):
+        return None
+    try:
+        return key_column.type.python_type(value)
+    except (ValueError, TypeError):
+        return None
+
+def fetch_account_page(query, key_column, after=None, before=None, per_page=50):
+    """
+    One keyset page of query ordered by key_column (a unique column), no OFFSET or COUNT.
+    Returns (rows, next_cursor, prev_cursor); a cursor is None when there is no such page.
+    """
+    if before is not None:
+        rows = query.filter(key_column < before).order_by(key_column.desc()).limit(per_page + 1).all()
+        has_prev = len(rows) > per_page
+        rows = list(reversed(rows[:per_page]))
+        has_next = True
+    else:
+        if after is not None:
+            query = query.filter(key_column > after)
+        rows = query.order_by(key_column.asc()).limit(per_page + 1).all()
+        has_next = len(rows) > per_page
+        rows = rows[:per_page]
+        has_prev = after is not None
+    key = key_column.key
+    next_cursor = getattr(rows[-1], key) if rows and has_next else None
+    prev_cursor = getattr(rows[0], key) if rows and has_prev else None
+    return rows, next_cursor, prev_cursor
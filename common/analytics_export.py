@@ -0,0 +1,390 @@
+# common/analytics_export.py
+"""
+Columnar exports of purchases, point ledger, logins, driver/sponsor balances and users
+for offline analysis.
+
+Rows are read in yield_per batches and written as Parquet (or Arrow IPC) through pyarrow
+when it is installed, falling back to gzipped CSV. Files are partitioned by month and sponsor:
+
+    <ANALYTICS_EXPORT_DIR>/purchases/month=2025-10/sponsor=12/part-20251101T020000123.parquet
+
+Append-only datasets (purchases, ledger, logins) are incremental: a watermark on their
+primary key is kept in _export_state.json and each run only writes newer rows. Ids are
+taken at INSERT but become visible at COMMIT, so a row can appear below the watermark
+after a run has passed it. Each run therefore re-reads the last ANALYTICS_EXPORT_ID_MARGIN
+ids below the watermark as well, and skips the ones the state lists as already exported.
+Small, mutable tables (balances, users) are written as a full snapshot=<run> directory per run.
+"""
+import csv
+import gzip
+import io
+import json
+import os
+import zlib
+from collections import OrderedDict
+from datetime import datetime
+from flask import current_app
+from sqlalchemy import select
+from extensions import db
+from models import Purchase, AuditLog, DriverSponsorAssociation, User
+from common.logging import DRIVER_POINTS, LOGIN_EVENT
+
+try:
+    import fcntl # Not available on Windows; exports then simply run unlocked
+except ImportError:
+    fcntl = None
+
+# Optional: without pyarrow every export is gzipped CSV. Imported on first export, not at startup
+pa = pq = None
+_pyarrow_checked = False
+
+EXPORT_BATCH_SIZE = 5000
+MAX_OPEN_PARTITIONS = 128 # Least recently used partition files are closed beyond this
+STATE_NAME = "_export_state.json"
+FILE_EXTENSIONS = {"parquet": "parquet", "arrow": "arrow", "csv": "csv.gz"}
+
+
+# --- Datasets ---
+
+def _month(value):
+    return value.strftime("%Y-%m") if value else "unknown"
+
+def _payload(row, key):
+    return (row.PAYLOAD or {}).get(key) if isinstance(row.PAYLOAD, dict) else None
+
+class Dataset:
+    """
+    One exported table: columns as (name, type) with type in int/str/datetime, a query for rows
+    above a watermark (or all rows for snapshots), and how a row maps to values and a partition.
+    For incremental datasets the first column is the watermark key.
+    """
+    def __init__(self, name, columns, query, to_values, partition, incremental=True):
+        self.name = name
+        self.columns = columns
+        self.query = query
+        self.to_values = to_values
+        self.partition = partition
+        self.incremental = incremental
+
+DATASETS = OrderedDict((dataset.name, dataset) for dataset in [
+    Dataset(
+        "purchases",
+        [("id", "int"), ("purchase_date", "datetime"), ("driver_id", "int"), ("sponsor_id", "int"),
+         ("item_id", "str"), ("title", "str"), ("points", "int"), ("quantity", "int")],
+        lambda since: select(Purchase.id, Purchase.purchase_date, Purchase.user_id, Purchase.sponsor_id,
+                             Purchase.item_id, Purchase.title, Purchase.points, Purchase.quantity)
+                      .where(Purchase.id > since).order_by(Purchase.id),
+        lambda row: tuple(row),
+        lambda row: (_month(row.purchase_date), row.sponsor_id),
+    ),
+    Dataset(
+        "points_ledger",
+        [("event_id", "int"), ("created_at", "datetime"), ("actor_user_id", "int"), ("driver_id", "int"),
+         ("sponsor_id", "int"), ("action", "str"), ("points", "int"), ("balance", "int")],
+        lambda since: select(AuditLog.EVENT_ID, AuditLog.CREATED_AT, AuditLog.ACTOR_USER_ID,
+                             AuditLog.SUBJECT_USER_ID, AuditLog.SPONSOR_ID, AuditLog.PAYLOAD)
+                      .where(AuditLog.EVENT_TYPE == DRIVER_POINTS, AuditLog.EVENT_ID > since)
+                      .order_by(AuditLog.EVENT_ID),
+        lambda row: (row.EVENT_ID, row.CREATED_AT, row.ACTOR_USER_ID, row.SUBJECT_USER_ID, row.SPONSOR_ID,
+                     _payload(row, "action"), _payload(row, "points"), _payload(row, "balance")),
+        lambda row: (_month(row.CREATED_AT), row.SPONSOR_ID if row.SPONSOR_ID is not None else "none"),
+    ),
+    Dataset(
+        "logins",
+        [("event_id", "int"), ("created_at", "datetime"), ("user_id", "int"), ("status", "str"),
+         ("role", "str"), ("ip", "str")],
+        lambda since: select(AuditLog.EVENT_ID, AuditLog.CREATED_AT, AuditLog.SUBJECT_USER_ID,
+                             AuditLog.IP, AuditLog.PAYLOAD)
+                      .where(AuditLog.EVENT_TYPE == LOGIN_EVENT, AuditLog.EVENT_ID > since)
+                      .order_by(AuditLog.EVENT_ID),
+        lambda row: (row.EVENT_ID, row.CREATED_AT, row.SUBJECT_USER_ID,
+                     _payload(row, "status"), _payload(row, "role"), row.IP),
+        lambda row: (_month(row.CREATED_AT), None),
+    ),
+    Dataset(
+        "driver_balances",
+        [("driver_id", "int"), ("sponsor_id", "int"), ("points", "int")],
+        lambda since: select(DriverSponsorAssociation.driver_id, DriverSponsorAssociation.sponsor_id,
+                             DriverSponsorAssociation.points)
+                      .order_by(DriverSponsorAssociation.sponsor_id, DriverSponsorAssociation.driver_id),
+        lambda row: tuple(row),
+        lambda row: (None, row.sponsor_id),
+        incremental=False,
+    ),
+    Dataset(
+        "users",
+        # No credentials or contact details: analysts get ids, roles and account state only
+        [("user_code", "int"), ("username", "str"), ("user_type", "str"), ("created_at", "datetime"),
+         ("is_active", "int"), ("is_locked_out", "int"), ("totp_enabled", "int")],
+        lambda since: select(User.USER_CODE, User.USERNAME, User.USER_TYPE, User.CREATED_AT,
+                             User.IS_ACTIVE, User.IS_LOCKED_OUT, User.TOTP_ENABLED)
+                      .order_by(User.USER_CODE),
+        lambda row: (row.USER_CODE, row.USERNAME, row.USER_TYPE, row.CREATED_AT,
+                     row.IS_ACTIVE, row.IS_LOCKED_OUT, int(bool(row.TOTP_ENABLED))),
+        lambda row: (_month(row.CREATED_AT), None),
+        incremental=False,
+    ),
+])
+
+def _arrow_schema(dataset):
+    types = {"int": pa.int64(), "str": pa.string(), "datetime": pa.timestamp("us")}
+    return pa.schema([(name, types[kind]) for name, kind in dataset.columns])
+
+def _record_batch(dataset, schema, rows):
+    columns = list(zip(*rows)) if rows else [[] for _ in dataset.columns]
+    return pa.RecordBatch.from_arrays(
+        [pa.array(column, type=field.type) for column, field in zip(columns, schema)], schema=schema)
+
+def _csv_value(value):
+    return value.isoformat() if isinstance(value, datetime) else value
+
+def _load_pyarrow():
+    """True when pyarrow is installed (importing it the first time)."""
+    global pa, pq, _pyarrow_checked
+    if not _pyarrow_checked:
+        try:
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+        except ImportError:
+            pass
+        _pyarrow_checked = True
+    return pa is not None
+
+def resolve_format(fmt=None):
+    """'parquet', 'arrow' or 'csv'; columnar formats fall back to csv without pyarrow."""
+    fmt = fmt or current_app.config.get("ANALYTICS_EXPORT_FORMAT", "parquet")
+    if fmt not in FILE_EXTENSIONS:
+        raise ValueError(f"Unknown export format '{fmt}'")
+    return fmt if fmt == "csv" or _load_pyarrow() else "csv"
+
+
+# --- Partitioned files ---
+
+class _PartitionFile:
+    """One output file, written under a .tmp name and renamed into place by commit()."""
+    def __init__(self, dataset, fmt, path):
+        self.path = path
+        self.tmp_path = path + ".tmp"
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        if fmt == "csv":
+            self.fh = gzip.open(self.tmp_path, "wt", newline="", encoding="utf-8")
+            self.csv = csv.writer(self.fh)
+            self.csv.writerow([name for name, _ in dataset.columns])
+        else:
+            self.dataset = dataset
+            self.schema = _arrow_schema(dataset)
+            if fmt == "parquet":
+                self.writer = pq.ParquetWriter(self.tmp_path, self.schema, compression="zstd")
+            else:
+                self.writer = pa.ipc.new_file(self.tmp_path, self.schema,
+                                              options=pa.ipc.IpcWriteOptions(compression="zstd"))
+        self.fmt = fmt
+
+    def write(self, rows):
+        if self.fmt == "csv":
+            self.csv.writerows([_csv_value(value) for value in row] for row in rows)
+        else:
+            self.writer.write_batch(_record_batch(self.dataset, self.schema, rows))
+
+    def close(self):
+        if self.fmt == "csv":
+            self.fh.close()
+        else:
+            self.writer.close()
+
+    def commit(self):
+        os.replace(self.tmp_path, self.path)
+
+class _PartitionSet:
+    """Routes rows to per-partition files, keeping at most MAX_OPEN_PARTITIONS open."""
+    def __init__(self, dataset, fmt, root, run_id):
+        self.dataset = dataset
+        self.fmt = fmt
+        self.root = root
+        self.run_id = run_id
+        self.open = OrderedDict()
+        self.closed = []
+        self.parts = {}
+
+    def _path(self, key):
+        month, sponsor = key
+        parts = [self.root, self.dataset.name]
+        if not self.dataset.incremental:
+            parts.append(f"snapshot={self.run_id}") # Readers take the newest snapshot directory
+        if month is not None:
+            parts.append(f"month={month}")
+        if sponsor is not None:
+            parts.append(f"sponsor={sponsor}")
+        # A partition reopened after eviction gets a new part number
+        number = self.parts[key] = self.parts.get(key, -1) + 1
+        suffix = f"-{number}" if number else ""
+        return os.path.join(*parts, f"part-{self.run_id}{suffix}.{FILE_EXTENSIONS[self.fmt]}")
+
+    def write(self, key, rows):
+        handle = self.open.pop(key, None)
+        if handle is None:
+            if len(self.open) >= MAX_OPEN_PARTITIONS:
+                _, evicted = self.open.popitem(last=False)
+                evicted.close()
+                self.closed.append(evicted)
+            handle = _PartitionFile(self.dataset, self.fmt, self._path(key))
+        self.open[key] = handle
+        handle.write(rows)
+
+    def finish(self):
+        """Closes every file, then renames them into place. Returns the number of files."""
+        files = self.closed + list(self.open.values())
+        for handle in self.open.values():
+            handle.close()
+        for handle in files:
+            handle.commit()
+        return len(files)
+
+    def abort(self):
+        for handle in self.closed + list(self.open.values()):
+            try:
+                handle.close()
+            except Exception:
+                pass
+            if os.path.exists(handle.tmp_path):
+                os.remove(handle.tmp_path)
+
+
+# --- State ---
+
+def export_dir():
+    return current_app.config.get("ANALYTICS_EXPORT_DIR") or os.path.join(current_app.instance_path, "analytics")
+
+def load_export_state():
+    path = os.path.join(export_dir(), STATE_NAME)
+    if not os.path.exists(path):
+        return {"version": 1, "datasets": {}}
+    with open(path, "r", encoding="utf-8") as fh:
+        return json.load(fh)
+
+def _save_export_state(state):
+    path = os.path.join(export_dir(), STATE_NAME)
+    with open(path + ".tmp", "w", encoding="utf-8") as fh:
+        json.dump(state, fh, indent=1, sort_keys=True)
+    os.replace(path + ".tmp", path)
+
+
+# --- Running ---
+
+def _run_id():
+    # Millisecond precision so back-to-back runs never share a snapshot directory
+    return datetime.utcnow().strftime("%Y%m%dT%H%M%S%f")[:-3]
+
+def export_dataset(dataset, fmt, since=0, run_id=None, margin=0, exported=()):
+    """
+    Writes one dataset's rows above `since - margin` into partition files, skipping the keys in
+    `exported`. Returns (rows, files, new watermark, exported keys within margin of it).
+    """
+    run_id = run_id or _run_id()
+    partitions = _PartitionSet(dataset, fmt, export_dir(), run_id)
+    exported = set(exported)
+    stmt = dataset.query(since - margin).execution_options(yield_per=EXPORT_BATCH_SIZE) # Server-side cursor
+    rows_written = 0
+    watermark = since
+    try:
+        for batch in db.session.execute(stmt).partitions():
+            grouped = {}
+            for row in batch:
+                if dataset.incremental:
+                    if row[0] in exported:
+                        continue # Written by an earlier run
+                    exported.add(row[0])
+                grouped.setdefault(dataset.partition(row), []).append(dataset.to_values(row))
+                rows_written += 1
+            for key, rows in grouped.items():
+                partitions.write(key, rows)
+            if dataset.incremental:
+                watermark = max(watermark, batch[-1][0])
+        files = partitions.finish()
+    except Exception:
+        partitions.abort()
+        raise
+    recent = sorted(key for key in exported if key > watermark - margin) if dataset.incremental else []
+    return rows_written, files, watermark, recent
+
+def run_analytics_export(names=None, fmt=None, full=False):
+    """
+    Exports the named datasets (default: all). Incremental datasets continue from their saved
+    watermark unless full is set. The watermark is saved only after a dataset's files are in
+    place, so an interrupted run is simply repeated. Returns {name: (rows, files)}, or None
+    when another process (the nightly job, cron or a manual run) is already exporting.
+    """
+    fmt = resolve_format(fmt)
+    os.makedirs(export_dir(), exist_ok=True)
+    lock_file = open(os.path.join(export_dir(), ".lock"), "w")
+    try:
+        if fcntl:
+            try:
+                # Two overlapping runs would both export the rows above the same watermark
+                fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                return None
+
+        state = load_export_state()
+        run_id = _run_id()
+        margin = current_app.config.get("ANALYTICS_EXPORT_ID_MARGIN", 5000)
+        results = {}
+        for name in names or DATASETS:
+            dataset = DATASETS[name]
+            previous = {} if full or not dataset.incremental else state["datasets"].get(name, {})
+            rows, files, watermark, recent = export_dataset(
+                dataset, fmt, previous.get("watermark", 0), run_id,
+                margin=margin if dataset.incremental else 0, exported=previous.get("recent_ids", ()))
+            state["datasets"][name] = {"watermark": watermark, "recent_ids": recent,
+                                       "last_run": run_id, "format": fmt, "rows": rows}
+            _save_export_state(state)
+            results[name] = (rows, files)
+        return results
+    finally:
+        lock_file.close()
+
+
+# --- Streaming (admin download) ---
+
+class _ChunkSink(io.RawIOBase):
+    """Write-only file object whose contents are handed out chunk by chunk."""
+    def __init__(self):
+        self.chunks = []
+    def writable(self):
+        return True
+    def write(self, data):
+        self.chunks.append(bytes(data))
+        return len(data)
+    def drain(self):
+        data = b"".join(self.chunks)
+        self.chunks = []
+        return data
+
+def stream_dataset(name, since=0, fmt=None):
+    """
+    Yields one dataset (rows above `since`) as a single unpartitioned file, batch by batch:
+    an Arrow IPC stream when pyarrow is installed, otherwise gzipped CSV.
+    """
+    dataset = DATASETS[name]
+    stmt = dataset.query(since).execution_options(yield_per=EXPORT_BATCH_SIZE)
+    if resolve_format(fmt) != "csv":
+        sink = _ChunkSink()
+        schema = _arrow_schema(dataset)
+        writer = pa.ipc.new_stream(sink, schema, options=pa.ipc.IpcWriteOptions(compression="zstd"))
+        for batch in db.session.execute(stmt).partitions():
+            writer.write_batch(_record_batch(dataset, schema, [dataset.to_values(row) for row in batch]))
+            yield sink.drain()
+        writer.close()
+        yield sink.drain()
+        return
+
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 31) # wbits=31 -> gzip container
+    text = io.StringIO()
+    writer = csv.writer(text)
+    writer.writerow([column for column, _ in dataset.columns])
+    for batch in db.session.execute(stmt).partitions():
+        writer.writerows([_csv_value(value) for value in dataset.to_values(row)] for row in batch)
+        yield compressor.compress(text.getvalue().encode("utf-8"))
+        text.seek(0)
+        text.truncate(0)
+    yield compressor.compress(text.getvalue().encode("utf-8")) + compressor.flush()
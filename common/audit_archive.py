@@ -0,0 +1,273 @@
+# common/audit_archive.py
+"""
+Retention for AUDIT_LOG: rows older than AUDIT_RETENTION_DAYS are moved out of the
+database into gzipped, day-partitioned JSON Lines files with a manifest, and read
+back transparently by the audit viewer and exports when a date range reaches them.
+
+Layout under AUDIT_ARCHIVE_DIR:
+    manifest.json
+    2024/01/audit_2024-01-05.jsonl.gz   (one gzip member appended per archive batch)
+
+Readers share one parsed manifest per process, re-read only when the file changes.
+"""
+import copy
+import gzip
+import json
+import os
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+from flask import current_app
+from sqlalchemy import select, delete
+from extensions import db
+from models import AuditLog
+from common.audit_search import remove_from_index
+
+try:
+    import fcntl # Not available on Windows; archiving then simply runs unlocked
+except ImportError:
+    fcntl = None
+
+MANIFEST_NAME = "manifest.json"
+_manifest_cache = {} # path -> ((inode, mtime, size), manifest); shared, so readers must not modify it
+ARCHIVE_COLUMNS = ["EVENT_ID", "EVENT_TYPE", "DETAILS", "CREATED_AT", "ACTOR_USER_ID",
+                   "SUBJECT_USER_ID", "SPONSOR_ID", "IP", "PAYLOAD"]
+
+
+# --- Manifest ---
+
+def archive_dir():
+    path = current_app.config.get("AUDIT_ARCHIVE_DIR") or os.path.join(current_app.instance_path, "audit_archive")
+    return path
+
+def _read_manifest(path):
+    if not os.path.exists(path):
+        return {"version": 1, "archived_through": None, "partitions": {}}
+    with open(path, "r", encoding="utf-8") as fh:
+        return json.load(fh)
+
+def load_manifest():
+    """
+    Returns the archive manifest (an empty one when nothing has been archived yet), parsed
+    once per version of the file. The result is shared: treat it as read-only.
+    """
+    path = os.path.join(archive_dir(), MANIFEST_NAME)
+    try:
+        stat = os.stat(path)
+        version = (stat.st_ino, stat.st_mtime_ns, stat.st_size) # Every save is a new file (os.replace)
+    except FileNotFoundError:
+        version = None
+    cached = _manifest_cache.get(path)
+    if cached is not None and cached[0] == version:
+        return cached[1]
+    manifest = _read_manifest(path)
+    _manifest_cache[path] = (version, manifest)
+    return manifest
+
+def _save_manifest(manifest):
+    # Write-then-rename so readers never see a half written manifest
+    path = os.path.join(archive_dir(), MANIFEST_NAME)
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as fh:
+        json.dump(manifest, fh, indent=1, sort_keys=True)
+        fh.flush()
+        os.fsync(fh.fileno())
+    os.replace(tmp_path, path)
+
+def archived_through(manifest=None):
+    """Every archived row is older than this datetime (None if nothing is archived)."""
+    manifest = manifest or load_manifest()
+    if not manifest.get("archived_through"):
+        return None
+    return datetime.fromisoformat(manifest["archived_through"])
+
+def archive_reaches(start_dt, manifest=None):
+    """True when a query starting at start_dt (None = beginning of time) needs cold storage."""
+    cutoff = archived_through(manifest)
+    return cutoff is not None and (start_dt is None or start_dt < cutoff)
+
+
+# --- Writing ---
+
+def _serialize(row):
+    data = {column: getattr(row, column) for column in ARCHIVE_COLUMNS}
+    data["CREATED_AT"] = row.CREATED_AT.isoformat()
+    return data
+
+def _partition_path(day):
+    return f"{day[:4]}/{day[5:7]}/audit_{day}.jsonl.gz"
+
+def _write_partition(day, rows):
+    """Appends rows for one day to its partition file as a new gzip member."""
+    path = os.path.join(archive_dir(), _partition_path(day))
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "ab") as raw:
+        with gzip.GzipFile(fileobj=raw, mode="wb") as fh:
+            for row in rows:
+                fh.write((json.dumps(row) + "\n").encode("utf-8"))
+        raw.flush()
+        os.fsync(raw.fileno())
+
+def _count_partition(manifest, day, rows):
+    """Adds rows to that day's manifest entry (row count, per-type counts, EVENT_ID range)."""
+    entry = manifest["partitions"].setdefault(day, {"file": _partition_path(day), "rows": 0, "counts": {},
+                                                    "min_event_id": None, "max_event_id": None})
+    entry["rows"] += len(rows)
+    for row in rows:
+        entry["counts"][row["EVENT_TYPE"]] = entry["counts"].get(row["EVENT_TYPE"], 0) + 1
+    ids = [row["EVENT_ID"] for row in rows]
+    entry["min_event_id"] = min(ids + ([entry["min_event_id"]] if entry["min_event_id"] is not None else []))
+    entry["max_event_id"] = max(ids + ([entry["max_event_id"]] if entry["max_event_id"] is not None else []))
+
+def _delete_archived(event_ids):
+    try:
+        db.session.execute(delete(AuditLog).where(AuditLog.EVENT_ID.in_(event_ids)))
+        remove_from_index(event_ids)
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
+
+def archive_audit_log(older_than_days=None, batch_size=None, dry_run=False):
+    """
+    Moves AUDIT_LOG rows older than the retention window into the archive, batch by batch.
+    Each batch is written and fsynced, then counted in the manifest with its EVENT_IDs
+    listed as pending, and only then deleted; a failed delete puts the previous manifest
+    back. So rows are never missing from both the table and the manifest: a crash can at
+    worst leave a batch in both places, and the next run finishes its delete first.
+    Returns the number of rows archived (or that would be, for dry_run).
+    """
+    older_than_days = older_than_days or current_app.config.get("AUDIT_RETENTION_DAYS", 365)
+    batch_size = batch_size or current_app.config.get("AUDIT_ARCHIVE_BATCH_SIZE", 5000)
+    cutoff = (datetime.utcnow() - timedelta(days=older_than_days)).replace(hour=0, minute=0, second=0, microsecond=0)
+
+    if dry_run:
+        return db.session.execute(
+            select(db.func.count()).select_from(AuditLog).where(AuditLog.CREATED_AT < cutoff)
+        ).scalar()
+
+    os.makedirs(archive_dir(), exist_ok=True)
+    lock_file = open(os.path.join(archive_dir(), ".lock"), "w")
+    try:
+        if fcntl:
+            try:
+                # Only one process (e.g. one of several gunicorn workers) archives at a time
+                fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                return 0
+
+        path = os.path.join(archive_dir(), MANIFEST_NAME)
+        manifest = _read_manifest(path) # Own copy: the cached one is shared with readers
+        if manifest.get("pending_event_ids"):
+            # The previous run stopped between counting a batch and deleting it
+            _delete_archived(manifest.pop("pending_event_ids"))
+            _save_manifest(manifest)
+
+        total = 0
+        while True:
+            rows = db.session.execute(
+                select(*[getattr(AuditLog, column) for column in ARCHIVE_COLUMNS])
+                .where(AuditLog.CREATED_AT < cutoff)
+                .order_by(AuditLog.EVENT_ID)
+                .limit(batch_size)
+            ).all()
+            if not rows:
+                break
+
+            by_day = {}
+            for row in rows:
+                by_day.setdefault(row.CREATED_AT.strftime("%Y-%m-%d"), []).append(_serialize(row))
+            for day, day_rows in by_day.items():
+                _write_partition(day, day_rows)
+
+            archived_ids = [row.EVENT_ID for row in rows]
+            previous_manifest = copy.deepcopy(manifest)
+            for day, day_rows in by_day.items():
+                _count_partition(manifest, day, day_rows)
+            through = archived_through(manifest)
+            if through is None or cutoff > through:
+                manifest["archived_through"] = cutoff.isoformat() # Readers look in the archive from now on
+            manifest["pending_event_ids"] = archived_ids
+            _save_manifest(manifest)
+            try:
+                _delete_archived(archived_ids)
+            except Exception:
+                _save_manifest(previous_manifest) # The rows are still in the table: don't count them twice
+                raise
+            del manifest["pending_event_ids"]
+            _save_manifest(manifest)
+            total += len(rows)
+
+        previous = archived_through(manifest)
+        if previous is None or cutoff > previous:
+            manifest["archived_through"] = cutoff.isoformat()
+            _save_manifest(manifest)
+        return total
+    finally:
+        lock_file.close()
+
+
+# --- Reading ---
+
+def _read_partition(entry):
+    """Loads one day's archived rows (deduplicated by EVENT_ID) as attribute-style objects."""
+    path = os.path.join(archive_dir(), entry["file"])
+    rows = {}
+    with gzip.open(path, "rt", encoding="utf-8") as fh:
+        for line in fh:
+            if line.strip():
+                data = json.loads(line)
+                data["CREATED_AT"] = datetime.fromisoformat(data["CREATED_AT"])
+                rows[data["EVENT_ID"]] = SimpleNamespace(**data)
+    return list(rows.values())
+
+def _matches(row, event_type, start_dt, end_dt):
+    if event_type and row.EVENT_TYPE != event_type:
+        return False
+    if start_dt and row.CREATED_AT < start_dt:
+        return False
+    if end_dt and row.CREATED_AT >= end_dt + timedelta(days=1): # end date is inclusive
+        return False
+    return True
+
+def iter_archived_rows(event_type=None, start_dt=None, end_dt=None, before=None, after=None, newest_first=True):
+    """
+    Yields archived rows matching the viewer/export filters, ordered by (CREATED_AT, EVENT_ID).
+    before/after are (CREATED_AT, EVENT_ID) keyset cursors. Only one day partition is held
+    in memory at a time, and partitions outside the date range are never opened.
+    """
+    manifest = load_manifest()
+    days = sorted(manifest["partitions"], reverse=newest_first)
+    for day in days:
+        day_start = datetime.strptime(day, "%Y-%m-%d")
+        if start_dt and day_start + timedelta(days=1) <= start_dt:
+            continue
+        if end_dt and day_start > end_dt:
+            continue
+        if before and day_start > before[0]:
+            continue
+        if after and day_start + timedelta(days=1) <= after[0]:
+            continue
+        entry = manifest["partitions"][day]
+        if event_type and not entry["counts"].get(event_type):
+            continue
+        rows = [row for row in _read_partition(entry) if _matches(row, event_type, start_dt, end_dt)]
+        rows.sort(key=lambda row: (row.CREATED_AT, row.EVENT_ID), reverse=newest_first)
+        for row in rows:
+            key = (row.CREATED_AT, row.EVENT_ID)
+            if before and key >= tuple(before):
+                continue
+            if after and key <= tuple(after):
+                continue
+            yield row
+
+def archived_day_counts(event_type=None, start_dt=None, end_dt=None):
+    """Per-day counts straight from the manifest (no archive files are opened)."""
+    counts = []
+    for day, entry in load_manifest()["partitions"].items():
+        day_start = datetime.strptime(day, "%Y-%m-%d")
+        if (start_dt and day_start < start_dt.replace(hour=0, minute=0, second=0, microsecond=0)) or (end_dt and day_start > end_dt):
+            continue
+        count = entry["counts"].get(event_type, 0) if event_type else entry["rows"]
+        if count:
+            counts.append((day, count))
+    return counts
@@ -0,0 +1,141 @@
+# common/audit_search.py
+"""
+Full-text search over AUDIT_LOG.DETAILS.
+
+On MySQL the FULLTEXT index on DETAILS is used (MATCH ... AGAINST, ranked by relevance).
+Elsewhere (e.g. SQLite in development) a token inverted index, AUDIT_SEARCH_TOKENS, is
+kept up to date by the audit writer and by ORM inserts, and hits are ranked by how many
+query terms they contain, newest first.
+"""
+import re
+from flask import current_app, has_app_context
+from sqlalchemy import select, func, event, delete
+from sqlalchemy.dialects.mysql import match
+from extensions import db
+from models import AuditLog, AuditSearchToken
+
+TOKEN_PATTERN = re.compile(r"[\w@.:-]+")
+IP_PATTERN = re.compile(r"^(\d{1,3}(\.\d{1,3}){3}|[0-9a-fA-F:]*:[0-9a-fA-F:]+)$") # IPv4 or IPv6
+MAX_TOKEN_LENGTH = 64
+MAX_QUERY_TOKENS = 8
+
+
+def tokenize(text):
+    """Lower-cased search tokens; keeps IPs, emails and usernames whole (e.g. 10.0.0.1, bob@x.com)."""
+    tokens = set()
+    for raw in TOKEN_PATTERN.findall((text or "").lower()):
+        token = raw.strip(".:-")
+        if len(token) > 1:
+            tokens.add(token[:MAX_TOKEN_LENGTH])
+    return tokens
+
+def search_backend(dialect_name):
+    """'fulltext' or 'tokens', from AUDIT_SEARCH_BACKEND ('auto' picks by database dialect)."""
+    backend = current_app.config.get("AUDIT_SEARCH_BACKEND", "auto") if has_app_context() else "auto"
+    if backend == "auto":
+        return "fulltext" if dialect_name == "mysql" else "tokens"
+    return backend
+
+def uses_token_index(connection):
+    return search_backend(connection.dialect.name) == "tokens"
+
+
+# --- Index maintenance ---
+
+def index_audit_rows(connection, rows):
+    """Adds postings for (event_id, row_dict) pairs with one executemany."""
+    postings = []
+    for event_id, row in rows:
+        for token in tokenize(row.get("DETAILS")) | tokenize(row.get("IP")):
+            postings.append({"TOKEN": token, "EVENT_ID": event_id})
+    if postings:
+        connection.execute(AuditSearchToken.__table__.insert(), postings)
+    return len(postings)
+
+def insert_and_index(connection, rows):
+    """
+    Inserts audit rows for the write-behind writer and indexes them in the same transaction.
+    Needs the new EVENT_IDs, so uses INSERT ... RETURNING where the dialect supports it with
+    executemany, and falls back to one INSERT per row otherwise.
+    """
+    table = AuditLog.__table__
+    if connection.dialect.insert_executemany_returning:
+        result = connection.execute(table.insert().returning(table.c.EVENT_ID, sort_by_parameter_order=True), rows)
+        ids = [event_id for (event_id,) in result]
+    else:
+        ids = [connection.execute(table.insert(), row).inserted_primary_key[0] for row in rows]
+    index_audit_rows(connection, zip(ids, rows))
+
+def remove_from_index(event_ids):
+    """Drops postings for rows that left AUDIT_LOG (e.g. moved to the archive)."""
+    if event_ids:
+        db.session.execute(delete(AuditSearchToken).where(AuditSearchToken.EVENT_ID.in_(event_ids)))
+
+def rebuild_search_index(batch_size=1000):
+    """Indexes every existing AUDIT_LOG row in keyset batches. Returns the number of rows indexed."""
+    if not uses_token_index(db.session.connection()):
+        return 0 # MySQL maintains its FULLTEXT index itself
+    db.session.execute(delete(AuditSearchToken))
+    db.session.commit()
+    last_id = 0
+    total = 0
+    while True:
+        rows = db.session.execute(
+            select(AuditLog.EVENT_ID, AuditLog.DETAILS, AuditLog.IP)
+            .where(AuditLog.EVENT_ID > last_id)
+            .order_by(AuditLog.EVENT_ID)
+            .limit(batch_size)
+        ).all()
+        if not rows:
+            return total
+        index_audit_rows(db.session.connection(), [(row.EVENT_ID, {"DETAILS": row.DETAILS, "IP": row.IP}) for row in rows])
+        db.session.commit()
+        last_id = rows[-1].EVENT_ID
+        total += len(rows)
+
+@event.listens_for(AuditLog, "after_insert")
+def _index_orm_insert(mapper, connection, target):
+    """Keeps the token index current for rows added through the session (checkout, points)."""
+    if uses_token_index(connection):
+        index_audit_rows(connection, [(target.EVENT_ID, {"DETAILS": target.DETAILS, "IP": target.IP})])
+
+
+# --- Querying ---
+
+def search_audit_log(term, conditions=(), limit=100):
+    """Returns up to limit AuditLog rows matching term, best hits first, within the given filters."""
+    tokens = sorted(tokenize(term))[:MAX_QUERY_TOKENS]
+    if not tokens:
+        return []
+
+    if IP_PATTERN.match(term.strip()):
+        # IPs are a structured column with their own index; no text search needed
+        return (AuditLog.query
+                .filter(AuditLog.IP == term.strip(), *conditions)
+                .order_by(AuditLog.CREATED_AT.desc(), AuditLog.EVENT_ID.desc())
+                .limit(limit)
+                .all())
+
+    if search_backend(db.engine.dialect.name) == "fulltext":
+        score = match(AuditLog.DETAILS, against=term).in_natural_language_mode()
+        return (AuditLog.query
+                .filter(score, *conditions)
+                .order_by(score.desc(), AuditLog.EVENT_ID.desc())
+                .limit(limit)
+                .all())
+
+    # Postings lookup on the (TOKEN, EVENT_ID) primary key, joined back for the filters
+    score = func.count(AuditSearchToken.TOKEN).label("score")
+    hits = (
+        select(AuditSearchToken.EVENT_ID, score)
+        .join(AuditLog, AuditLog.EVENT_ID == AuditSearchToken.EVENT_ID)
+        .where(AuditSearchToken.TOKEN.in_(tokens), *conditions)
+        .group_by(AuditSearchToken.EVENT_ID)
+        .order_by(score.desc(), AuditSearchToken.EVENT_ID.desc())
+        .limit(limit)
+        .subquery()
+    )
+    return (AuditLog.query
+            .join(hits, hits.c.EVENT_ID == AuditLog.EVENT_ID)
+            .order_by(hits.c.score.desc(), AuditLog.EVENT_ID.desc())
+            .all())
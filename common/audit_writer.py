@@ -0,0 +1,170 @@
+# common/audit_writer.py
+import atexit
+import logging
+import os
+import queue
+import threading
+from contextlib import nullcontext
+from flask import has_app_context
+from extensions import db
+from models import AuditLog
+from common.audit_search import uses_token_index, insert_and_index
+
+logger = logging.getLogger(__name__)
+
+
+def insert_audit_rows(connection, rows):
+    """Inserts AUDIT_LOG column dicts on the given connection (one executemany), plus their search postings."""
+    if uses_token_index(connection):
+        insert_and_index(connection, rows) # Search postings go in the same transaction
+    else:
+        connection.execute(AuditLog.__table__.insert(), rows)
+
+
+class AuditWriter:
+    """
+    Write-behind writer for AUDIT_LOG rows.
+
+    Events are queued in-process and a background thread flushes them as one
+    multi-row INSERT, either every AUDIT_FLUSH_INTERVAL seconds or as soon as
+    AUDIT_BATCH_SIZE rows are waiting. Inserts go through their own engine
+    connection, so they never commit (or roll back) the caller's session.
+
+    A batch that fails to insert is kept and retried with exponential backoff (up
+    to AUDIT_RETRY_MAX_DELAY seconds apart) instead of being dropped. Until a retry
+    succeeds, new events skip the queue and are inserted synchronously, so callers
+    see database errors just as they did before the writer existed.
+    """
+
+    def __init__(self, app=None):
+        self.app = None
+        self.mode = "async"
+        self.flush_interval = 1.0
+        self.batch_size = 200
+        self.retry_max_delay = 30.0
+        self._queue = None
+        self._wake = threading.Event()
+        self._lock = threading.Lock()
+        self._thread = None
+        self._pid = None
+        self._stopping = False
+        self._pending = []      # Batch being written; kept until its insert succeeds
+        self._failing = False   # Last background flush failed: write synchronously meanwhile
+        self._flush_lock = threading.Lock()
+        self._atexit_registered = False
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.app = app
+        self.mode = app.config.get("AUDIT_WRITE_MODE", "async")
+        self.flush_interval = app.config.get("AUDIT_FLUSH_INTERVAL", 1.0)
+        self.batch_size = app.config.get("AUDIT_BATCH_SIZE", 200)
+        self.retry_max_delay = app.config.get("AUDIT_RETRY_MAX_DELAY", 30.0)
+        self._queue = queue.Queue(maxsize=app.config.get("AUDIT_QUEUE_MAX", 10000))
+        app.extensions["audit_writer"] = self
+        if not self._atexit_registered: # create_app() may run more than once per process
+            atexit.register(self.shutdown)
+            self._atexit_registered = True
+
+    # --- Public API ---
+
+    def write(self, row: dict, sync: bool = False):
+        """Queues one AUDIT_LOG row (a column dict), or inserts it right away when sync is requested."""
+        if sync or self.mode == "sync" or self.app is None or self._failing:
+            self._insert([row])
+            return
+        self._ensure_thread()
+        try:
+            self._queue.put_nowait(row)
+        except queue.Full:
+            # Never drop audit events: fall back to a synchronous insert under back-pressure
+            self._insert([row])
+            return
+        if self._queue.qsize() >= self.batch_size:
+            self._wake.set()
+
+    def flush(self):
+        """
+        Writes everything currently queued. Returns the number of rows written.
+        Raises if an insert fails; the failed batch stays pending for the next flush.
+        """
+        written = 0
+        with self._flush_lock:
+            while True:
+                if not self._pending:
+                    self._pending = self._drain(self.batch_size)
+                if not self._pending:
+                    return written
+                self._insert(self._pending)
+                written += len(self._pending)
+                self._pending = []
+
+    def shutdown(self):
+        """Stops the background thread and drains the queue (registered with atexit)."""
+        self._stopping = True
+        self._wake.set()
+        thread = self._thread
+        if thread is not None and thread.is_alive() and self._pid == os.getpid():
+            thread.join(timeout=max(5.0, self.flush_interval * 2))
+        if self._queue is not None:
+            try:
+                self.flush()
+            except Exception:
+                # Exiting with the database unreachable: the application log is the last place left
+                logger.exception("Failed to write %d audit rows at shutdown", len(self._pending) + self._queue.qsize())
+                for row in self._pending + self._drain(self._queue.qsize()):
+                    logger.warning("AUDIT (unsaved): %s", row)
+                self._pending = []
+
+    # --- Internals ---
+
+    def _ensure_thread(self):
+        # Threads don't survive fork(): start one lazily in every worker process
+        if self._thread is not None and self._thread.is_alive() and self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._thread is not None and self._thread.is_alive() and self._pid == os.getpid():
+                return
+            self._pid = os.getpid()
+            self._stopping = False
+            self._thread = threading.Thread(target=self._run, name="audit-writer", daemon=True)
+            self._thread.start()
+
+    def _run(self):
+        failures = 0
+        while not self._stopping:
+            delay = self.flush_interval
+            if failures:
+                delay = min(self.retry_max_delay, self.flush_interval * 2 ** failures)
+            self._wake.wait(delay)
+            self._wake.clear()
+            try:
+                self.flush()
+                failures, self._failing = 0, False
+            except Exception:
+                failures += 1
+                self._failing = True
+                logger.exception("Audit writer flush failed (%d in a row); %d rows kept for retry",
+                                 failures, len(self._pending) + self._queue.qsize())
+
+    def _drain(self, limit):
+        batch = []
+        while len(batch) < limit:
+            try:
+                batch.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def _insert(self, rows):
+        """Inserts rows with a single executemany on a dedicated connection (raises on failure)."""
+        if self.app is None and not has_app_context():
+            raise RuntimeError("audit_writer.init_app() has not been called and there is no application context")
+        # Before init_app, the caller's app context supplies the engine
+        with self.app.app_context() if self.app is not None else nullcontext():
+            with db.engine.begin() as conn:
+                insert_audit_rows(conn, rows)
+
+
+audit_writer = AuditWriter()
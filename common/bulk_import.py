@@ -0,0 +1,221 @@
+# common/bulk_import.py
+"""
+Bulk driver import from CSV or JSON, for onboarding a whole fleet at once.
+
+The file is parsed and checked up front: required fields and lengths, duplicates within
+the file, and usernames/emails that already exist (one IN query per IMPORT_LOOKUP_CHUNK
+rows). Nothing is written unless every row is valid.
+
+Temporary passwords are hashed at the normal BCRYPT_LOG_ROUNDS cost (a driver may never
+log in, so a cheaper hash would stay in USERS indefinitely) in a pool of BULK_IMPORT_WORKERS
+processes. The pool is spawned, not forked, because imports run on a request thread of a
+live worker whose other threads may hold locks, and whose engine holds open connections. USERS,
+DRIVERS and DRIVER_SPONSOR_ASSOCIATIONS rows are then inserted with executemany in
+batches, all in one transaction. The plain passwords only ever leave in the credentials
+report returned to the importer.
+"""
+import csv
+import io
+import json
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+from itertools import repeat
+from flask import current_app, request, flash, Response
+from sqlalchemy import select, or_
+from sqlalchemy.exc import IntegrityError
+from extensions import db
+from models import User, Driver, DriverSponsorAssociation, Role, new_temporary_password
+from common.password_hashing import hash_passwords
+from common.id_allocator import reserve_user_codes
+from common.account_search import insert_user_rows
+from common.logging import log_audit_event
+
+IMPORT_FIELDS = ("username", "email", "fname", "lname", "license_number")
+REPORT_FIELDS = ("user_code", "username", "email", "fname", "lname", "temporary_password")
+IMPORT_LOOKUP_CHUNK = 5000 # Usernames/emails per existence query
+HASH_CHUNK = 200           # Passwords per worker task
+# (field, required, max length, default)
+_RULES = (
+    ("username", True, 50, None),
+    ("email", True, 100, None),
+    ("fname", False, 50, "New"),
+    ("lname", False, 50, "Driver"),
+    ("license_number", False, 50, "N/A"),
+)
+
+
+class BulkImportError(ValueError):
+    """The upload can't be imported; the message is safe to show to the user."""
+
+
+def parse_import_file(filename, data):
+    """
+    Rows (dicts of IMPORT_FIELDS, with a 'line' number) from a CSV with a header row or a
+    JSON array of objects. Raises BulkImportError for unreadable files.
+    """
+    try:
+        text = data.decode("utf-8-sig")
+    except UnicodeDecodeError:
+        raise BulkImportError("The file must be UTF-8 encoded.")
+
+    if (filename or "").lower().endswith(".json") or text.lstrip().startswith("["):
+        try:
+            records = json.loads(text)
+        except ValueError as e:
+            raise BulkImportError(f"Invalid JSON: {e}")
+        if not isinstance(records, list) or not all(isinstance(r, dict) for r in records):
+            raise BulkImportError("JSON imports must be an array of objects.")
+        numbered = enumerate(records, start=1)
+    else:
+        reader = csv.DictReader(io.StringIO(text))
+        if not reader.fieldnames or not {"username", "email"} <= {f.strip().lower() for f in reader.fieldnames}:
+            raise BulkImportError("The CSV header must include at least 'username' and 'email'.")
+        numbered = enumerate(reader, start=2) # Line 1 is the header
+
+    rows = []
+    for line, record in numbered:
+        record = {str(k).strip().lower(): v for k, v in record.items() if k is not None}
+        row = {field: str(record.get(field) or "").strip() for field in IMPORT_FIELDS}
+        row["line"] = line
+        rows.append(row)
+    return rows
+
+def validate_rows(rows):
+    """
+    Fills in defaults and checks every row. Returns a list of (line, message) errors;
+    empty when the whole import can go ahead.
+    """
+    errors = []
+    seen_usernames, seen_emails = {}, {}
+    for row in rows:
+        for field, required, max_length, default in _RULES:
+            if not row[field]:
+                if required:
+                    errors.append((row["line"], f"{field} is required"))
+                elif default:
+                    row[field] = default
+            elif len(row[field]) > max_length:
+                errors.append((row["line"], f"{field} is longer than {max_length} characters"))
+        if row["email"] and "@" not in row["email"]:
+            errors.append((row["line"], f"'{row['email']}' is not an email address"))
+
+        for field, seen in (("username", seen_usernames), ("email", seen_emails)):
+            key = row[field].lower()
+            if key and key in seen:
+                errors.append((row["line"], f"{field} '{row[field]}' repeats line {seen[key]}"))
+            elif key:
+                seen[key] = row["line"]
+
+    taken_usernames, taken_emails = set(), set()
+    for start in range(0, len(rows), IMPORT_LOOKUP_CHUNK):
+        chunk = rows[start:start + IMPORT_LOOKUP_CHUNK]
+        usernames = [r["username"] for r in chunk if r["username"]]
+        emails = [r["email"] for r in chunk if r["email"]]
+        for username, email in db.session.execute(
+            select(User.USERNAME, User.EMAIL).where(or_(User.USERNAME.in_(usernames), User.EMAIL.in_(emails)))
+        ):
+            taken_usernames.add(username.lower())
+            taken_emails.add(email.lower())
+    for row in rows:
+        if row["username"].lower() in taken_usernames:
+            errors.append((row["line"], f"username '{row['username']}' already exists"))
+        if row["email"].lower() in taken_emails:
+            errors.append((row["line"], f"email '{row['email']}' already exists"))
+    return sorted(errors)
+
+def _hash_all(passwords, rounds, workers):
+    chunks = [passwords[i:i + HASH_CHUNK] for i in range(0, len(passwords), HASH_CHUNK)]
+    if workers > 1 and len(chunks) > 1:
+        with ProcessPoolExecutor(max_workers=min(workers, len(chunks)),
+                                 mp_context=multiprocessing.get_context("spawn")) as pool:
+            results = list(pool.map(hash_passwords, chunks, repeat(rounds)))
+    else:
+        results = [hash_passwords(chunk, rounds) for chunk in chunks]
+    return [password_hash for chunk in results for password_hash in chunk]
+
+def import_drivers(rows, sponsor_id=None):
+    """
+    Creates a driver account for every (validated) row, associated with sponsor_id when given.
+    Returns the credentials report rows (dicts of REPORT_FIELDS), in file order.
+    """
+    config = current_app.config
+    batch_size = config.get("BULK_IMPORT_BATCH_SIZE", 1000)
+    workers = config.get("BULK_IMPORT_WORKERS") or os.cpu_count() or 1
+    rounds = config.get("BCRYPT_LOG_ROUNDS", 12)
+
+    passwords = [new_temporary_password() for _ in rows]
+    hashes = _hash_all(passwords, rounds, workers)
+
+    first_code = reserve_user_codes(len(rows))
+    now = datetime.utcnow()
+    users, drivers, associations, report = [], [], [], []
+    for offset, (row, password, password_hash) in enumerate(zip(rows, passwords, hashes)):
+        user_code = first_code + offset
+        users.append({
+            "USER_CODE": user_code, "USERNAME": row["username"], "PASS": password_hash,
+            "USER_TYPE": Role.DRIVER, "FNAME": row["fname"], "LNAME": row["lname"], "EMAIL": row["email"],
+            "CREATED_AT": now, "IS_ACTIVE": 1, "IS_LOCKED_OUT": 0, "FAILED_ATTEMPTS": 0,
+        })
+        drivers.append({"DRIVER_ID": user_code, "LICENSE_NUMBER": row["license_number"]})
+        if sponsor_id is not None:
+            associations.append({"driver_id": user_code, "sponsor_id": sponsor_id, "points": 0})
+        report.append({"user_code": user_code, "username": row["username"], "email": row["email"],
+                       "fname": row["fname"], "lname": row["lname"], "temporary_password": password})
+
+    connection = db.session.connection()
+    try:
+        for start in range(0, len(users), batch_size):
+            insert_user_rows(connection, users[start:start + batch_size]) # Searchable right away
+        for table, values in ((Driver.__table__, drivers), (DriverSponsorAssociation.__table__, associations)):
+            for start in range(0, len(values), batch_size):
+                connection.execute(table.insert(), values[start:start + batch_size])
+        db.session.commit()
+    except IntegrityError:
+        db.session.rollback()
+        raise BulkImportError("Another account was created with one of these usernames or emails "
+                              "while the import ran. Nothing was imported; please upload the file again.")
+    return report
+
+def credentials_csv(report):
+    """The credentials report as CSV text."""
+    out = io.StringIO()
+    writer = csv.DictWriter(out, fieldnames=REPORT_FIELDS)
+    writer.writeheader()
+    writer.writerows(report)
+    return out.getvalue()
+
+def handle_import_upload(sponsor_id, render):
+    """
+    Shared POST handler for the admin and sponsor import pages. Returns the credentials
+    report as a CSV download, or render(errors=..., total=...) when the upload is rejected.
+    """
+    upload = request.files.get("file")
+    if not upload or not upload.filename:
+        flash("Choose a CSV or JSON file to import.", "danger")
+        return render(errors=[], total=0), 400
+    max_rows = current_app.config.get("BULK_IMPORT_MAX_ROWS", 20000)
+    try:
+        rows = parse_import_file(upload.filename, upload.read())
+        if not rows:
+            raise BulkImportError("The file has no rows.")
+        if len(rows) > max_rows:
+            raise BulkImportError(f"The file has {len(rows)} rows; the limit is {max_rows} per import.")
+        errors = validate_rows(rows)
+        if errors:
+            flash("Nothing was imported. Fix the rows below and upload the file again.", "danger")
+            return render(errors=errors, total=len(rows)), 400
+        report = import_drivers(rows, sponsor_id=sponsor_id)
+    except BulkImportError as e:
+        flash(str(e), "danger")
+        return render(errors=[], total=0), 400
+
+    log_audit_event("BULK_IMPORT_USERS", f"Imported {len(report)} drivers from {upload.filename}"
+                    + (f" for sponsor {sponsor_id}" if sponsor_id is not None else ""),
+                    sponsor_id=sponsor_id, payload={"count": len(report), "file": upload.filename}, sync=True)
+    filename = f"driver_credentials_{datetime.utcnow():%Y%m%d-%H%M%S}.csv"
+    return Response(credentials_csv(report), mimetype="text/csv", headers={
+        "Content-Disposition": f"attachment; filename={filename}",
+        "Cache-Control": "no-store", # Contains plain temporary passwords
+    })
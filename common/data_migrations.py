@@ -0,0 +1,116 @@
+# common/data_migrations.py
+"""
+Small framework for set-based, resumable data migrations (see migrate_data.py).
+
+A KeysetStep walks the rows still to migrate in primary key order, batch_size keys at a
+time, and applies one set-based statement (INSERT ... SELECT ... WHERE NOT EXISTS, or an
+UPDATE) to each key range. Every batch commits together with its checkpoint row in
+DATA_MIGRATION_CHECKPOINTS, so an interrupted run resumes after the last committed batch
+and a failure only loses the batch in flight. A step that finished is scanned again from
+the first key on the next run, so rows added since then (new drivers, sponsors...) are
+migrated too; the pending conditions make that safe and cheap.
+"""
+import time
+from datetime import datetime
+from sqlalchemy import select, func
+from extensions import db
+from models import DataMigrationCheckpoint
+
+PROGRESS_INTERVAL = 5.0 # Seconds between progress lines
+
+
+class KeysetStep:
+    """
+    One migration step.
+    key_column: integer key of the driving table, used for batches and checkpoints.
+    pending: callable returning the WHERE conditions (on the driving table) of rows still to migrate.
+    apply: callable(lo, hi) returning the statement that migrates pending rows with lo <= key <= hi.
+    """
+
+    def __init__(self, name, description, key_column, pending, apply):
+        self.name = name
+        self.description = description
+        self.key_column = key_column
+        self.pending = pending
+        self.apply = apply
+
+    def count_pending(self):
+        return db.session.execute(
+            select(func.count()).select_from(self.key_column.table).where(*self.pending())
+        ).scalar()
+
+
+class StepReport:
+    def __init__(self, name, rows=0, batches=0, elapsed=0.0, status="done"):
+        self.name = name
+        self.rows = rows
+        self.batches = batches
+        self.elapsed = elapsed
+        self.status = status # 'done' or 'dry-run'
+
+    @property
+    def rows_per_second(self):
+        return self.rows / self.elapsed if self.elapsed else 0.0
+
+
+def _checkpoint(name, restart):
+    checkpoint = db.session.get(DataMigrationCheckpoint, name)
+    if checkpoint is not None and (restart or checkpoint.status == "done"):
+        # Only an interrupted run is resumed; anything else scans every pending row again
+        db.session.delete(checkpoint)
+        db.session.commit()
+        checkpoint = None
+    if checkpoint is None:
+        checkpoint = DataMigrationCheckpoint(name=name, last_key=None, rows_done=0, status="running")
+        db.session.add(checkpoint)
+        db.session.commit()
+    return checkpoint
+
+def run_step(step, batch_size=5000, restart=False, progress=print):
+    """Runs one step to completion, resuming an interrupted run from its checkpoint. Returns a StepReport."""
+    checkpoint = _checkpoint(step.name, restart)
+    if checkpoint.last_key is not None:
+        progress(f"  resuming {step.name} after key {checkpoint.last_key} ({checkpoint.rows_done} rows already done)")
+
+    report = StepReport(step.name)
+    started = last_progress = time.perf_counter()
+    while True:
+        query = select(step.key_column).where(*step.pending()).order_by(step.key_column).limit(batch_size)
+        if checkpoint.last_key is not None:
+            query = query.where(step.key_column > checkpoint.last_key)
+        keys = db.session.execute(query).scalars().all()
+        if not keys:
+            break
+
+        result = db.session.execute(step.apply(keys[0], keys[-1]))
+        rows = max(result.rowcount or 0, 0)
+        checkpoint.last_key = keys[-1]
+        checkpoint.rows_done += rows
+        checkpoint.updated_at = datetime.utcnow()
+        db.session.commit() # The batch and its checkpoint land together
+        report.rows += rows
+        report.batches += 1
+
+        if time.perf_counter() - last_progress >= PROGRESS_INTERVAL:
+            last_progress = time.perf_counter()
+            elapsed = last_progress - started
+            progress(f"  {step.name}: {report.rows} rows in {report.batches} batches ({report.rows / elapsed:,.0f} rows/s)")
+        if len(keys) < batch_size:
+            break
+
+    checkpoint.status = "done"
+    checkpoint.updated_at = datetime.utcnow()
+    db.session.commit()
+    report.elapsed = time.perf_counter() - started
+    return report
+
+def run_steps(steps, batch_size=5000, dry_run=False, restart=False, progress=print):
+    """Runs steps in order (or only counts their pending rows when dry_run). Returns their StepReports."""
+    reports = []
+    for step in steps:
+        if dry_run:
+            reports.append(StepReport(step.name, rows=step.count_pending(), status="dry-run"))
+            continue
+        progress(f"{step.description}...")
+        reports.append(run_step(step, batch_size, restart, progress))
+    return reports
@@ -0,0 +1,83 @@
+# common/id_allocator.py
+"""
+USER_CODE allocation from the ID_SEQUENCES table.
+
+Every process reserves a block of USER_CODE_BLOCK_SIZE codes at a time (one short
+transaction: read MAX(USER_CODE) as a floor, UPDATE the counter, read it back) and hands
+them out from memory. Most user creations therefore run no allocation query at all, the
+MAX(USER_CODE) lookup (an index-only read of the primary key) happens once per block,
+and concurrent creations can't pick the same code. Bulk paths reserve exactly the range
+they need in one go.
+
+Reservations commit on their own connection, independently of the caller's session: a
+rolled-back user creation leaves a gap rather than holding the counter row locked for the
+whole request. Unused codes in a block are also lost when the process exits. The counter
+never falls behind MAX(USER_CODE), so rows inserted some other way can't cause collisions.
+"""
+import os
+import threading
+from flask import current_app
+from sqlalchemy import select, update, insert, func, case
+from sqlalchemy.exc import IntegrityError
+from extensions import db
+from models import IdSequence, User
+
+_sequences = IdSequence.__table__
+
+
+class IdAllocator:
+    """Hands out IDs for one table from per-process blocks; see module docstring."""
+
+    def __init__(self, name, column):
+        self.name = name
+        self.column = column
+        self._lock = threading.Lock()
+        self._next = self._end = 0
+        self._pid = None
+
+    def next(self):
+        """One new ID, from this process's current block (reserving a new block when it runs out)."""
+        with self._lock:
+            if self._pid != os.getpid() or self._next >= self._end:
+                # A forked worker must not keep handing out its parent's block
+                block_size = current_app.config.get("USER_CODE_BLOCK_SIZE", 20)
+                self._next = self.reserve(block_size)
+                self._end = self._next + block_size
+                self._pid = os.getpid()
+            value = self._next
+            self._next += 1
+            return value
+
+    def reserve(self, count):
+        """Reserves count consecutive new IDs and returns the first one."""
+        while True:
+            with db.engine.begin() as connection:
+                # Plain (non-locking) read, kept out of the UPDATE so reserving never waits on USERS
+                floor = (connection.execute(select(func.max(self.column))).scalar() or 0) + 1
+                current = _sequences.c.next_value
+                result = connection.execute(
+                    update(_sequences).where(_sequences.c.name == self.name)
+                    .values(next_value=case((current < floor, floor), else_=current) + count)
+                )
+                if result.rowcount:
+                    # The UPDATE holds the row lock until commit, so this reads our own value
+                    end = connection.execute(
+                        select(current).where(_sequences.c.name == self.name)
+                    ).scalar()
+                    return end - count
+            try:
+                with db.engine.begin() as connection:
+                    connection.execute(insert(_sequences).values(name=self.name, next_value=floor))
+            except IntegrityError:
+                pass # Another process created the counter first
+
+
+user_codes = IdAllocator("USERS", User.USER_CODE)
+
+def next_user_code():
+    """Next free USER_CODE for a new account."""
+    return user_codes.next()
+
+def reserve_user_codes(count):
+    """First of count consecutive new USER_CODEs, for bulk creation."""
+    return user_codes.reserve(count)
@@ -0,0 +1,186 @@
+# common/identity_cache.py
+"""
+Short-TTL cache of the user fields authentication needs, so load_user and the
+impersonator lookup don't query USERS on every request.
+
+Entries are compact snapshots (role, active flag, lockout state, names, notification
+preferences) keyed by user, at most IDENTITY_CACHE_SIZE of them, kept for up to
+IDENTITY_CACHE_TTL seconds (0 turns the cache off).
+
+Every snapshot carries the user's USERS.IDENTITY_VERSION, and a hit is only served after
+reading that one column again (a primary-key lookup, instead of loading the user). Any
+ORM update of a User increments the version in the same UPDATE (admin edits, locks,
+unlocks, disables, failed logins...), as do the Core UPDATEs in common/lockouts.py, so
+a change committed by any worker or host is seen by the next request everywhere. Code
+that changes users with other Core statements must include version_bump() in its values.
+
+Within a process, ORM changes also drop the snapshot when they commit (bump()), and a
+miss whose query overlapped a bump isn't stored, so it can't put the old row back.
+
+load_user returns a CachedUser: snapshot fields are plain reads, and anything else
+(relationships, methods such as set_password, attribute writes) loads the ORM User once
+for that request and delegates to it.
+"""
+import threading
+import time
+from collections import OrderedDict
+from flask_login import UserMixin
+from sqlalchemy import event, select
+from sqlalchemy.orm import Session
+from extensions import db
+from models import User
+
+SNAPSHOT_FIELDS = (
+    "USER_CODE", "USERNAME", "USER_TYPE", "FNAME", "LNAME", "EMAIL",
+    "IS_ACTIVE", "IS_LOCKED_OUT", "LOCKOUT_TIME", "LOCKED_REASON", "TOTP_ENABLED",
+    "wants_point_notifications", "wants_order_notifications", "IDENTITY_VERSION",
+)
+
+
+def version_bump():
+    """Values to add to a Core UPDATE of USERS so identity caches see the change."""
+    return {"IDENTITY_VERSION": User.IDENTITY_VERSION + 1}
+
+
+class CachedUser(UserMixin):
+    """current_user built from a snapshot; falls back to the ORM User for everything else."""
+
+    def __init__(self, snapshot):
+        self.__dict__["_snapshot"] = dict(snapshot) # Own copy: writes must not leak into the cache
+        self.__dict__["_user"] = None
+
+    def __getattr__(self, name):
+        snapshot = self.__dict__["_snapshot"]
+        if name in snapshot:
+            return snapshot[name]
+        if name.startswith("__"):
+            raise AttributeError(name)
+        return getattr(self.orm_user(), name)
+
+    def __setattr__(self, name, value):
+        setattr(self.orm_user(), name, value)
+        if name in self._snapshot:
+            self._snapshot[name] = value
+
+    def __repr__(self):
+        return f"<CachedUser {self._snapshot['USER_CODE']} {self._snapshot['USERNAME']}>"
+
+    def orm_user(self):
+        """The full User, loaded on first use within the request."""
+        if self.__dict__["_user"] is None:
+            self.__dict__["_user"] = db.session.get(User, self._snapshot["USER_CODE"])
+        return self.__dict__["_user"]
+
+    def get_id(self):
+        return str(self._snapshot["USER_CODE"])
+
+    # Same rules as the model, evaluated on the snapshot
+    is_account_locked = User.is_account_locked
+
+
+class IdentityCache:
+    """Per-process snapshot cache; see module docstring."""
+
+    def __init__(self, app=None):
+        self.ttl = 10
+        self.max_entries = 10000
+        self._entries = OrderedDict() # user_code -> (expires_at, snapshot), in LRU order
+        self._generation = 0          # Advanced by every bump; a miss that saw it move doesn't store its row
+        self._lock = threading.Lock()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.ttl = app.config.get("IDENTITY_CACHE_TTL", 10)
+        self.max_entries = app.config.get("IDENTITY_CACHE_SIZE", 10000)
+        app.extensions["identity_cache"] = self
+
+    def get(self, user_code):
+        """
+        A CachedUser for user_code, or None if there is no such user. A hit reads only
+        IDENTITY_VERSION; a miss (or an out-of-date snapshot) queries the snapshot columns.
+        """
+        if not self.ttl:
+            return db.session.get(User, user_code) # Cache disabled
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(user_code)
+            if entry and entry[0] <= now:
+                del self._entries[user_code] # Expired
+                entry = None
+            elif entry:
+                self._entries.move_to_end(user_code)
+
+        if entry:
+            version = db.session.execute(
+                select(User.IDENTITY_VERSION).where(User.USER_CODE == user_code)
+            ).scalar()
+            if version is not None and version == entry[1]["IDENTITY_VERSION"]:
+                return CachedUser(entry[1])
+            with self._lock:
+                if self._entries.get(user_code) is entry:
+                    del self._entries[user_code] # Changed (or deleted) since it was cached
+            if version is None:
+                return None
+
+        with self._lock:
+            generation = self._generation
+
+        row = db.session.execute(
+            select(*[getattr(User, field) for field in SNAPSHOT_FIELDS]).where(User.USER_CODE == user_code)
+        ).first()
+        if row is None:
+            return None
+        snapshot = dict(row._mapping)
+        with self._lock:
+            # A bump while the query ran may mean this row is already out of date: use it, don't keep it
+            if self._generation == generation:
+                self._entries[user_code] = (now + self.ttl, snapshot)
+                self._entries.move_to_end(user_code)
+                while len(self._entries) > self.max_entries:
+                    self._entries.popitem(last=False)
+        return CachedUser(snapshot)
+
+    def bump(self, *user_codes):
+        """Invalidates the given users' snapshots in this process."""
+        with self._lock:
+            self._generation += 1
+            for user_code in user_codes:
+                self._entries.pop(user_code, None)
+
+    def bump_all(self):
+        """Invalidates every snapshot, e.g. after a bulk UPDATE of USERS."""
+        with self._lock:
+            self._generation += 1
+            self._entries.clear()
+
+
+identity_cache = IdentityCache()
+
+
+# --- Invalidation on ORM changes ---
+
+@event.listens_for(User, "before_update")
+def _bump_version(mapper, connection, target):
+    # Part of the same UPDATE, so the new version commits (or rolls back) with the change
+    if Session.object_session(target).is_modified(target, include_collections=False):
+        target.IDENTITY_VERSION = User.IDENTITY_VERSION + 1
+
+@event.listens_for(User, "after_update")
+@event.listens_for(User, "after_delete")
+def _user_changed(mapper, connection, target):
+    # Bump now (readers of the uncommitted row must not cache it) and again after commit
+    identity_cache.bump(target.USER_CODE)
+    session = Session.object_session(target)
+    if session is not None:
+        session.info.setdefault("identity_changes", set()).add(target.USER_CODE)
+
+@event.listens_for(Session, "after_commit")
+def _bump_committed(session):
+    changed = session.info.pop("identity_changes", None)
+    if changed:
+        identity_cache.bump(*changed)
+
+@event.listens_for(Session, "after_soft_rollback")
+def _forget_rolled_back(session, previous_transaction):
+    session.info.pop("identity_changes", None)
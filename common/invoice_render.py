@@ -0,0 +1,123 @@
+# common/invoice_render.py
+"""
+Invoice document rendering, run inside ProcessPoolExecutor workers.
+
+Kept free of Flask/SQLAlchemy imports on purpose: each job is a plain dict, so workers
+never touch the database and stay cheap to start. See common/invoices.py for the driver.
+"""
+import html
+import os
+from functools import lru_cache
+
+try:
+    from PIL import Image, ImageDraw, ImageFont
+except ImportError: # Pillow missing: only HTML invoices are available
+    Image = None
+
+PDF_AVAILABLE = Image is not None
+
+PAGE_SIZE = (1275, 1650)  # US Letter at 150 dpi
+MARGIN = 90
+LINE_HEIGHT = 26
+LINES_PER_PAGE = (PAGE_SIZE[1] - 2 * MARGIN) // LINE_HEIGHT
+# Table columns for PDF pages: (x position, right aligned?)
+COLUMNS = ((MARGIN, False), (700, True), (880, True), (PAGE_SIZE[0] - MARGIN, True))
+
+_font = None # Loaded once per worker process
+
+
+def money(cents):
+    return f"${cents // 100:,}.{cents % 100:02d}"
+
+def _pdf_lines(job):
+    """The invoice as a list of lines; table lines are 4-tuples of cells, the rest plain strings."""
+    lines = [
+        "Triple T's Rewards - Sponsor Invoice",
+        "",
+        f"Invoice #: {job['invoice_id']}",
+        f"Sponsor: {job['org_name']} (ID: {job['sponsor_id']})",
+        f"Period: {job['period']}",
+        f"Point ratio: {job['point_ratio']} points per $1.00",
+        "",
+        ("Driver", "Items", "Points", "Amount"),
+    ]
+    for line in job["lines"]:
+        lines.append((line["username"][:40], str(line["items"]), str(line["points"]), money(line["amount_cents"])))
+    lines += ["", ("Total", str(job["items"]), str(job["points"]), money(job["amount_cents"]))]
+    return lines
+
+def render_html(job):
+    rows = "".join(
+        f"<tr><td>{html.escape(line['username'])}</td><td>{line['items']}</td>"
+        f"<td>{line['points']}</td><td>{money(line['amount_cents'])}</td></tr>"
+        for line in job["lines"]
+    )
+    return (
+        "<!doctype html><html><head><meta charset='utf-8'>"
+        f"<title>Invoice {job['period']} - {html.escape(job['org_name'])}</title>"
+        "<style>body{font-family:sans-serif;margin:2rem}table{border-collapse:collapse;width:100%}"
+        "td,th{border-bottom:1px solid #ccc;padding:.3rem;text-align:right}td:first-child,th:first-child{text-align:left}</style>"
+        "</head><body>"
+        "<h1>Triple T's Rewards - Sponsor Invoice</h1>"
+        f"<p>Invoice #{job['invoice_id']}<br>Sponsor: {html.escape(job['org_name'])} (ID: {job['sponsor_id']})<br>"
+        f"Period: {job['period']}<br>Point ratio: {job['point_ratio']} points per $1.00</p>"
+        "<table><thead><tr><th>Driver</th><th>Items</th><th>Points</th><th>Amount</th></tr></thead>"
+        f"<tbody>{rows}</tbody>"
+        f"<tfoot><tr><th>Total</th><th>{job['items']}</th><th>{job['points']}</th><th>{money(job['amount_cents'])}</th></tr></tfoot>"
+        "</table></body></html>"
+    ).encode("utf-8")
+
+def _get_font():
+    global _font
+    if _font is None:
+        try:
+            _font = ImageFont.load_default(size=18) # Pillow >= 10.1 with FreeType
+        except (TypeError, OSError, ImportError):
+            _font = ImageFont.load_default()
+    return _font
+
+@lru_cache(maxsize=8192)
+def _text_mask(text):
+    """
+    1-bit mask and advance width of a rendered string. Glyph rendering dominates PDF time, and most strings
+    (labels, usernames, small numbers) repeat across invoices, so each worker renders them once.
+    """
+    font = _get_font()
+    advance = int(font.getlength(text) + 0.5)
+    mask = Image.new("1", (advance + LINE_HEIGHT // 2, LINE_HEIGHT), 0) # Room for overhanging glyphs
+    ImageDraw.Draw(mask).text((0, 0), text, font=font, fill=1)
+    return mask, advance
+
+def render_pdf(job, fh):
+    """Stamps the invoice onto 1-bit pages (small and fast to encode) and saves them as one PDF."""
+    lines = _pdf_lines(job)
+    pages = []
+    for start in range(0, len(lines), LINES_PER_PAGE):
+        page = Image.new("1", PAGE_SIZE, 1)
+        for i, line in enumerate(lines[start:start + LINES_PER_PAGE]):
+            y = MARGIN + i * LINE_HEIGHT
+            cells = zip((line,), COLUMNS) if isinstance(line, str) else zip(line, COLUMNS)
+            for text, (x, right) in cells:
+                if not text:
+                    continue
+                mask, advance = _text_mask(text)
+                page.paste(0, (x - advance if right else x, y), mask)
+        pages.append(page)
+    pages[0].save(fh, "PDF", resolution=150, save_all=True, append_images=pages[1:])
+
+def render_invoice(job):
+    """
+    Worker entry point: renders one invoice to job['output_dir']/job['file_path'].
+    Written to a temp file and renamed, so a crashed run never leaves a half written invoice.
+    Returns (invoice_id, file_path).
+    """
+    path = os.path.join(job["output_dir"], job["file_path"])
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, "wb") as fh:
+        if job["format"] == "pdf":
+            render_pdf(job, fh)
+        else:
+            fh.write(render_html(job))
+    os.replace(tmp_path, path)
+    return job["invoice_id"], job["file_path"]
@@ -0,0 +1,200 @@
+# common/invoices.py
+"""
+Monthly sponsor invoices for redeemed points.
+
+For a period ('YYYY-MM') the totals of every sponsor come from one grouped query over
+PURCHASES (plus one for the per-driver lines), converted to dollars through
+StoreSettings.point_ratio. Documents are rendered in a process pool (common/invoice_render.py)
+and each finished batch marks its invoices rendered and writes their INVOICE_EVENT audit
+rows in a single transaction.
+
+The pool's workers are spawned, not forked: the scheduler runs this inside a gunicorn worker
+whose other threads (scheduler, audit writer, bcrypt pool) may hold locks at fork time, and
+a forked child would also inherit the engine's pooled connections. Spawned workers start
+from a fresh interpreter and only import common/invoice_render.py, so they have neither.
+
+Runs are idempotent and resumable: INVOICES has one row per (sponsor, period), rendered
+invoices are skipped unless force is given, and pending ones are picked up by the next run.
+"""
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+from flask import current_app
+from sqlalchemy import select, update, func
+from extensions import db
+from models import Purchase, Sponsor, StoreSettings, User, Invoice
+from common.logging import INVOICE_EVENT, build_audit_row
+from common.audit_writer import insert_audit_rows
+from common.invoice_render import render_invoice, money, PDF_AVAILABLE
+
+DEFAULT_POINT_RATIO = 10 # Same default as StoreSettings.point_ratio
+RESULT_BATCH_SIZE = 200  # Invoices marked rendered (and audited) per transaction
+
+
+# --- Periods ---
+
+def period_bounds(period):
+    """[start, end) datetimes for a 'YYYY-MM' period. Raises ValueError for bad input."""
+    start = datetime.strptime(period, "%Y-%m")
+    end = start.replace(year=start.year + 1, month=1) if start.month == 12 else start.replace(month=start.month + 1)
+    return start, end
+
+def previous_period(today=None):
+    """The last complete month, e.g. '2025-09' during October 2025."""
+    today = today or datetime.utcnow()
+    return (today.replace(year=today.year - 1, month=12) if today.month == 1
+            else today.replace(month=today.month - 1)).strftime("%Y-%m")
+
+def invoice_dir():
+    return current_app.config.get("INVOICE_DIR") or os.path.join(current_app.instance_path, "invoices")
+
+def to_cents(points, point_ratio):
+    """Points -> cents at point_ratio points per dollar, rounded half up."""
+    return (points * 100 + point_ratio // 2) // point_ratio
+
+
+# --- Totals ---
+
+def invoice_totals(period):
+    """
+    {sponsor_id: {...totals, 'lines': [...]}} for every sponsor with purchases in the period.
+    Two grouped queries in total, both range scans on ix_purchases_date_sponsor.
+    """
+    start, end = period_bounds(period)
+    in_period = (Purchase.purchase_date >= start, Purchase.purchase_date < end)
+    points = func.sum(Purchase.points * Purchase.quantity)
+    items = func.sum(Purchase.quantity)
+
+    totals = {}
+    for row in db.session.execute(
+        select(Purchase.sponsor_id, Sponsor.ORG_NAME, StoreSettings.point_ratio,
+               points.label("points"), items.label("items"))
+        .outerjoin(Sponsor, Sponsor.SPONSOR_ID == Purchase.sponsor_id)
+        .outerjoin(StoreSettings, StoreSettings.sponsor_id == Purchase.sponsor_id)
+        .where(*in_period)
+        .group_by(Purchase.sponsor_id, Sponsor.ORG_NAME, StoreSettings.point_ratio)
+    ):
+        ratio = row.point_ratio if row.point_ratio and row.point_ratio > 0 else DEFAULT_POINT_RATIO
+        totals[row.sponsor_id] = {
+            "org_name": row.ORG_NAME or f"Sponsor {row.sponsor_id}",
+            "point_ratio": ratio,
+            "points": int(row.points),
+            "items": int(row.items),
+            "amount_cents": to_cents(int(row.points), ratio),
+            "lines": [],
+        }
+
+    for row in db.session.execute(
+        select(Purchase.sponsor_id, Purchase.user_id, User.USERNAME,
+               points.label("points"), items.label("items"))
+        .outerjoin(User, User.USER_CODE == Purchase.user_id)
+        .where(*in_period)
+        .group_by(Purchase.sponsor_id, Purchase.user_id, User.USERNAME)
+        .order_by(Purchase.sponsor_id, User.USERNAME)
+    ):
+        invoice = totals[row.sponsor_id]
+        invoice["lines"].append({
+            "username": row.USERNAME or f"Driver {row.user_id}",
+            "points": int(row.points),
+            "items": int(row.items),
+            "amount_cents": to_cents(int(row.points), invoice["point_ratio"]),
+        })
+    return totals
+
+
+# --- Generation ---
+
+def _prepare_invoices(period, totals, force):
+    """Creates or refreshes INVOICES rows for the period. Returns the ids left to render."""
+    existing = {invoice.sponsor_id: invoice for invoice in Invoice.query.filter_by(period=period)}
+    for sponsor_id, data in totals.items():
+        invoice = existing.get(sponsor_id)
+        if invoice is None:
+            invoice = Invoice(sponsor_id=sponsor_id, period=period)
+            db.session.add(invoice)
+        elif invoice.status == "rendered" and not force:
+            continue
+        invoice.points = data["points"]
+        invoice.items = data["items"]
+        invoice.point_ratio = data["point_ratio"]
+        invoice.amount_cents = data["amount_cents"]
+        invoice.status = "pending"
+    db.session.commit()
+    return db.session.execute(
+        select(Invoice.id, Invoice.sponsor_id).where(Invoice.period == period, Invoice.status == "pending")
+    ).all()
+
+def _record_rendered(period, results, totals):
+    """Marks a batch of invoices rendered and writes their INVOICE_EVENT rows, in one transaction."""
+    now = datetime.utcnow()
+    db.session.execute(update(Invoice), [
+        {"id": invoice_id, "status": "rendered", "file_path": file_path, "rendered_at": now}
+        for invoice_id, file_path, _ in results
+    ])
+    audit_rows = []
+    for invoice_id, file_path, sponsor_id in results:
+        data = totals[sponsor_id]
+        audit_rows.append(build_audit_row(
+            INVOICE_EVENT,
+            f"Invoice {period} generated for {data['org_name']} (Sponsor ID: {sponsor_id}): "
+            f"{data['points']} points = {money(data['amount_cents'])}.",
+            sponsor_id=sponsor_id,
+            payload={"action": "generated", "invoice_id": invoice_id, "period": period,
+                     "points": data["points"], "amount_cents": data["amount_cents"], "file": file_path},
+        ))
+    insert_audit_rows(db.session.connection(), audit_rows)
+    db.session.commit()
+
+def generate_invoices(period, workers=None, fmt=None, force=False):
+    """
+    Generates every sponsor's invoice for the period. Returns (rendered, skipped).
+    workers <= 1 renders in-process (handy for small runs and debugging).
+    """
+    fmt = fmt or current_app.config.get("INVOICE_FORMAT", "pdf")
+    if fmt == "pdf" and not PDF_AVAILABLE:
+        fmt = "html"
+    workers = workers or current_app.config.get("INVOICE_WORKERS") or os.cpu_count() or 1
+
+    totals = invoice_totals(period)
+    pending = _prepare_invoices(period, totals, force)
+    output_dir = invoice_dir()
+    jobs = [
+        {
+            **totals[sponsor_id],
+            "invoice_id": invoice_id,
+            "sponsor_id": sponsor_id,
+            "period": period,
+            "format": fmt,
+            "output_dir": output_dir,
+            "file_path": f"{period}/invoice_{period}_sponsor_{sponsor_id}.{fmt}",
+        }
+        for invoice_id, sponsor_id in pending
+        if sponsor_id in totals # Leftover rows for sponsors with no purchases any more
+    ]
+
+    sponsor_of = {job["invoice_id"]: job["sponsor_id"] for job in jobs}
+    rendered = 0
+    batch = []
+    pool = None
+    if workers > 1 and len(jobs) > 1:
+        pool = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn"))
+    try:
+        if pool:
+            # Several jobs per task keeps pickling/IPC overhead well below the render time
+            results = pool.map(render_invoice, jobs, chunksize=max(1, len(jobs) // (workers * 4)))
+        else:
+            results = map(render_invoice, jobs)
+        for invoice_id, file_path in results:
+            batch.append((invoice_id, file_path, sponsor_of[invoice_id]))
+            if len(batch) >= RESULT_BATCH_SIZE:
+                _record_rendered(period, batch, totals)
+                rendered += len(batch)
+                batch = []
+        if batch:
+            _record_rendered(period, batch, totals)
+            rendered += len(batch)
+    finally:
+        if pool:
+            pool.shutdown()
+    return rendered, len(totals) - len(jobs)
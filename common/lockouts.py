@@ -0,0 +1,68 @@
+# common/lockouts.py
+"""
+Set-based maintenance of failed-attempt lockouts.
+
+User.register_failed_attempt() locks an account for 15 minutes, but nothing cleared the
+row once that time passed: is_account_locked() just stopped honouring it, so the admin
+locked-users page kept listing expired locks. clear_expired_lockouts() resets them in
+keyset batches, every LOCKOUT_CLEANUP_MINUTES from the scheduler (app.start_scheduler) or
+from cron via `flask clear-lockouts`. unlock_all() is a single UPDATE instead of loading
+every locked user.
+
+Both only touch LOCKED_REASON = 'failed_attempts'; admin timeouts are left alone. The
+USERS index ix_users_lockout (IS_LOCKED_OUT, LOCKED_REASON, LOCKOUT_TIME) serves the
+active and expired lookups as range scans.
+"""
+from datetime import datetime
+from sqlalchemy import select, update
+from extensions import db
+from models import User
+from common.identity_cache import identity_cache, version_bump
+
+FAILED_ATTEMPTS_REASON = "failed_attempts"
+
+_CLEARED = {"FAILED_ATTEMPTS": 0, "LOCKOUT_TIME": None, "IS_LOCKED_OUT": 0, "LOCKED_REASON": None}
+
+
+def _failed_attempt_lock():
+    return (User.IS_LOCKED_OUT == 1) & (User.LOCKED_REASON == FAILED_ATTEMPTS_REASON)
+
+def active_lockouts(now=None):
+    """Query for accounts still locked by failed attempts, soonest expiry first."""
+    now = now or datetime.utcnow()
+    return User.query.filter(_failed_attempt_lock(), User.LOCKOUT_TIME > now).order_by(User.LOCKOUT_TIME)
+
+def unlock_all():
+    """Clears every failed-attempt lockout with one UPDATE and commits. Returns the number of accounts unlocked."""
+    result = db.session.execute(
+        update(User).where(_failed_attempt_lock()).values(**_CLEARED, **version_bump())
+        .execution_options(synchronize_session=False)
+    )
+    db.session.commit()
+    identity_cache.bump_all() # Core UPDATE: the ORM events don't see which users changed (version_bump covers other workers)
+    return result.rowcount
+
+def clear_expired_lockouts(batch_size=500, now=None):
+    """
+    Clears failed-attempt lockouts whose LOCKOUT_TIME has passed, batch_size accounts per
+    transaction so no long lock is held on USERS. Returns the number of accounts cleared.
+    """
+    now = now or datetime.utcnow()
+    expired = _failed_attempt_lock() & (User.LOCKOUT_TIME <= now)
+    total = 0
+    while True:
+        codes = db.session.execute(
+            select(User.USER_CODE).where(expired).order_by(User.LOCKOUT_TIME).limit(batch_size)
+        ).scalars().all()
+        if not codes:
+            return total
+        # Conditions repeated so an account re-locked since the SELECT is left locked
+        result = db.session.execute(
+            update(User).where(User.USER_CODE.in_(codes), expired).values(**_CLEARED, **version_bump())
+            .execution_options(synchronize_session=False)
+        )
+        db.session.commit()
+        identity_cache.bump(*codes)
+        total += result.rowcount
+        if len(codes) < batch_size:
+            return total
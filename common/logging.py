@@ -1,7 +1,8 @@
-from extensions import db
-from models import AuditLog
+from common.audit_writer import audit_writer
 import logging
 from datetime import datetime
+from flask import has_request_context, request
+from flask_login import current_user
 
 #Event Type Conventions
 SALES_BY_SPONSOR = "SALES_BY_SPONSOR"
@@ -12,13 +13,45 @@ LOGIN_EVENT    = "LOGIN_EVENT"
 
 logging.basicConfig(level=logging.INFO)
 
-def log_audit_event(event_type: str, details: str = ""):
-    log_entry = AuditLog(
-        EVENT_TYPE=event_type,
-        DETAILS=details or None,
-        CREATED_AT=datetime.utcnow()
-    )
-    db.session.add(log_entry)
-    db.session.commit()
+def request_ip():
+    """
+    Returns the client IP for the current request, or None outside a request.
+    X-Forwarded-For is never read here: behind proxies, ProxyFix (TRUSTED_PROXY_COUNT)
+    sets remote_addr from the entries those proxies added, which clients can't forge.
+    """
+    if not has_request_context():
+        return None
+    return request.remote_addr
+
+def _request_actor_id():
+    """USER_CODE of the logged in user, or None outside a request / when anonymous."""
+    if has_request_context() and current_user.is_authenticated:
+        return current_user.USER_CODE
+    return None
+
+def build_audit_row(event_type: str, details: str = "", actor_id=None, subject_id=None,
+                    sponsor_id=None, ip=None, payload=None):
+    """Builds the column dict for one AUDIT_LOG row, filling actor/ip from the request when omitted."""
+    return {
+        "EVENT_TYPE": event_type,
+        "DETAILS": details or None,
+        "CREATED_AT": datetime.utcnow(),
+        "ACTOR_USER_ID": actor_id if actor_id is not None else _request_actor_id(),
+        "SUBJECT_USER_ID": subject_id,
+        "SPONSOR_ID": sponsor_id,
+        "IP": ip if ip is not None else request_ip(),
+        "PAYLOAD": payload or None,
+    }
+
+def log_audit_event(event_type: str, details: str = "", actor_id=None, subject_id=None,
+                    sponsor_id=None, ip=None, payload=None, sync=False):
+    """
+    Records an audit event through the write-behind audit writer.
+    The caller's session is left untouched; pass sync=True when the row must be
+    durable before the response returns.
+    """
+    row = build_audit_row(event_type, details, actor_id=actor_id, subject_id=subject_id,
+                          sponsor_id=sponsor_id, ip=ip, payload=payload)
+    audit_writer.write(row, sync=sync)
     logging.info("AUDIT: %s - %s", event_type, details)
-    return log_entry
\ No newline at end of file
+    return row
@@ -0,0 +1,312 @@
+# common/login_throttle.py
+"""
+Login rate limiting and aggregated failure auditing.
+
+Failed sign-ins are counted in two sliding windows of LOGIN_RATE_WINDOW seconds: one per
+(username, client IP) and one per client IP. Once either is over its limit
+(LOGIN_RATE_LIMIT_PER_USER / LOGIN_RATE_LIMIT_PER_IP) the attempt is answered with 429
+and Retry-After before USERS is read or bcrypt runs. Attempts that are rejected or that
+succeed are never counted, and a successful sign-in resets its (username, IP) window.
+Keying the username window on the IP too means posting someone else's username from
+one address can't lock them out everywhere; guessing one account's password from many
+addresses is stopped by the account lockout (LOCKOUT_ATTEMPTS) instead. Successful
+sign-ins never count against the IP either, so a depot whose drivers all share one
+address behind NAT can sign in at shift change. The
+IP is request.remote_addr, which only reflects X-Forwarded-For when TRUSTED_PROXY_COUNT
+says how many proxies to trust, so clients can't pick their own key.
+
+Each window is a sliding-window counter: the hits in the current fixed window plus a
+share of the previous window's hits, weighted by how much of it still overlaps. That
+needs two integers per key, not a timestamp per attempt. In-process counters are split
+over SHARDS dicts, each with its own lock, so concurrent logins rarely wait on each
+other. Set LOGIN_RATE_LIMIT_BACKEND_URL (redis://...) to share the counters between
+workers and hosts; this needs the optional redis package. If the backend is unreachable
+the limiter lets attempts through rather than blocking every sign-in.
+
+Repeated failures for the same (username, IP, reason) are collapsed in the audit log.
+The first failure is written as before. The ones that follow within
+LOGIN_FAILURE_AUDIT_INTERVAL seconds become a single LOGIN_EVENT row with a count, written
+by a background thread when the interval ends. So a credential-stuffing burst costs a
+handful of AUDIT_LOG rows instead of one per attempt.
+"""
+import atexit
+import logging
+import math
+import os
+import threading
+import time
+import zlib
+from datetime import datetime
+from flask import flash, render_template
+from common.logging import log_audit_event, LOGIN_EVENT
+
+try:
+    import redis
+except ImportError: # Optional: without it the counters are per process
+    redis = None
+
+logger = logging.getLogger(__name__)
+
+SHARDS = 16
+MAX_KEYS_PER_SHARD = 10000 # Stale keys are pruned beyond this
+
+
+class LoginRateLimited(Exception):
+    """Raised when a sign-in attempt is over the rate limit; retry_after is in seconds."""
+
+    def __init__(self, retry_after):
+        super().__init__(f"too many sign-in attempts, retry in {retry_after}s")
+        self.retry_after = retry_after
+
+
+# --- Counter stores ---
+
+class MemoryWindowStore:
+    """Per-process window counters, sharded by key."""
+
+    def __init__(self, shards=SHARDS):
+        self._shards = [({}, threading.Lock()) for _ in range(shards)]
+
+    def _shard(self, key):
+        return self._shards[zlib.crc32(key.encode("utf-8")) % len(self._shards)]
+
+    def hit(self, key, window_index):
+        """Counts one hit in window_index. Returns (hits in that window, hits in the one before)."""
+        counters, lock = self._shard(key)
+        with lock:
+            entry = counters.get(key)
+            if entry is None or entry[0] < window_index - 1:
+                entry = [window_index, 0, 0]
+            elif entry[0] == window_index - 1:
+                entry = [window_index, 0, entry[1]] # Roll the window forward
+            entry[1] += 1
+            counters[key] = entry
+            if len(counters) > MAX_KEYS_PER_SHARD:
+                for stale in [k for k, e in counters.items() if e[0] < window_index - 1]:
+                    del counters[stale]
+            return entry[1], entry[2]
+
+    def peek(self, key, window_index):
+        """Like hit() without counting anything."""
+        counters, lock = self._shard(key)
+        with lock:
+            entry = counters.get(key)
+            if entry is None or entry[0] < window_index - 1:
+                return 0, 0
+            if entry[0] == window_index - 1:
+                return 0, entry[1]
+            return entry[1], entry[2]
+
+    def reset(self, key):
+        counters, lock = self._shard(key)
+        with lock:
+            counters.pop(key, None)
+
+
+class RedisWindowStore:
+    """Window counters shared through Redis: one INCR'd key per (key, window), expiring after two windows."""
+
+    def __init__(self, url, window, prefix="login-rate:"):
+        if redis is None:
+            raise RuntimeError("LOGIN_RATE_LIMIT_BACKEND_URL is set but the redis package is not installed")
+        self._client = redis.Redis.from_url(url, socket_timeout=0.25, socket_connect_timeout=0.25)
+        self._window = window
+        self._prefix = prefix
+
+    def hit(self, key, window_index):
+        current = f"{self._prefix}{key}:{window_index}"
+        pipe = self._client.pipeline(transaction=False)
+        pipe.incr(current)
+        pipe.expire(current, int(self._window * 2))
+        pipe.get(f"{self._prefix}{key}:{window_index - 1}")
+        hits, _, previous = pipe.execute()
+        return int(hits), int(previous or 0)
+
+    def peek(self, key, window_index):
+        hits, previous = self._client.mget(f"{self._prefix}{key}:{window_index}",
+                                           f"{self._prefix}{key}:{window_index - 1}")
+        return int(hits or 0), int(previous or 0)
+
+    def reset(self, key):
+        window_index = int(time.time() // self._window)
+        self._client.delete(f"{self._prefix}{key}:{window_index}", f"{self._prefix}{key}:{window_index - 1}")
+
+
+# --- Failure audit aggregation ---
+
+class FailureAudit:
+    """Collapses repeated login failures into one LOGIN_EVENT row per key and interval; see module docstring."""
+
+    def __init__(self, interval=60.0):
+        self.interval = interval
+        self._pending = {} # (username, ip, reason) -> entry
+        self._lock = threading.Lock()
+        self._next_due = math.inf
+        self._wake = threading.Event()
+        self._thread = None
+        self._pid = None
+
+    def record(self, username, ip, reason, subject_id=None, details="", payload=None):
+        """Audits one failure: written right away if it's the first for its key in this interval, otherwise counted."""
+        self.flush()
+        key = (username.lower(), ip, reason)
+        now = time.monotonic()
+        with self._lock:
+            entry = self._pending.get(key)
+            if entry is not None:
+                entry["count"] += 1
+                entry["last_at"] = datetime.utcnow()
+                entry["subject_id"] = entry["subject_id"] or subject_id
+                return
+            self._pending[key] = {"username": username, "due": now + self.interval, "count": 0,
+                                  "last_at": None, "subject_id": subject_id}
+            self._next_due = min(self._next_due, now + self.interval)
+        self._ensure_thread()
+        self._wake.set()
+        log_audit_event(LOGIN_EVENT, f"FAIL user={username} ip={ip}" + (f" {details}" if details else ""),
+                        subject_id=subject_id, ip=ip, payload={"status": "FAIL", "reason": reason, **(payload or {})})
+
+    def flush(self, force=False):
+        """Writes the aggregated rows whose interval has ended (all of them when force is set)."""
+        now = time.monotonic()
+        if not force and now < self._next_due:
+            return
+        with self._lock:
+            due = [key for key, entry in self._pending.items() if force or entry["due"] <= now]
+            summaries = [(key, self._pending.pop(key)) for key in due]
+            self._next_due = min((entry["due"] for entry in self._pending.values()), default=math.inf)
+        for (_, ip, reason), entry in summaries:
+            if not entry["count"]:
+                continue # Only the first failure happened; it is already in the log
+            log_audit_event(
+                LOGIN_EVENT, f"FAIL x{entry['count']} user={entry['username']} ip={ip} reason={reason} "
+                             f"(repeated within {int(self.interval)}s, last at {entry['last_at']:%Y-%m-%d %H:%M:%S} UTC)",
+                subject_id=entry["subject_id"], ip=ip,
+                payload={"status": "FAIL", "reason": reason, "count": entry["count"],
+                         "last_at": entry["last_at"].isoformat()})
+
+    def _ensure_thread(self):
+        # Threads don't survive fork(): start one lazily in every worker process
+        if self._thread is not None and self._thread.is_alive() and self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._thread is not None and self._thread.is_alive() and self._pid == os.getpid():
+                return
+            self._pid = os.getpid()
+            self._thread = threading.Thread(target=self._run, name="login-failure-audit", daemon=True)
+            self._thread.start()
+
+    def _run(self):
+        # Sleeps until the earliest pending interval ends; record() wakes it when that moves
+        while True:
+            delay = self._next_due - time.monotonic()
+            self._wake.wait(None if delay == math.inf else max(0.0, delay))
+            self._wake.clear()
+            try:
+                self.flush()
+            except Exception:
+                logger.exception("Login failure audit flush failed")
+
+
+# --- Limiter ---
+
+class LoginThrottle:
+    """
+    Sliding-window limits on sign-in attempts per IP and per username, plus the failure
+    audit aggregator. Registered as app.extensions['login_throttle']; see module docstring.
+    """
+
+    def __init__(self, app=None):
+        self.enabled = True
+        self.window = 300
+        self.per_ip = 30
+        self.per_user = 10
+        self.store = MemoryWindowStore()
+        self.failures = FailureAudit()
+        self._atexit_registered = False
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.enabled = app.config.get("LOGIN_RATE_LIMIT_ENABLED", True)
+        self.window = app.config.get("LOGIN_RATE_WINDOW", 300)
+        self.per_ip = app.config.get("LOGIN_RATE_LIMIT_PER_IP", 30)
+        self.per_user = app.config.get("LOGIN_RATE_LIMIT_PER_USER", 10)
+        backend_url = app.config.get("LOGIN_RATE_LIMIT_BACKEND_URL")
+        self.store = RedisWindowStore(backend_url, self.window) if backend_url else MemoryWindowStore()
+        self.failures = FailureAudit(app.config.get("LOGIN_FAILURE_AUDIT_INTERVAL", 60))
+        app.extensions["login_throttle"] = self
+        app.register_error_handler(LoginRateLimited, self._limited_response)
+        if not self._atexit_registered: # create_app() may run more than once per process
+            atexit.register(self._flush_failures)
+            self._atexit_registered = True
+
+    # --- Public API ---
+
+    def check(self, username, ip):
+        """Raises LoginRateLimited when one more failure for (username, ip) or ip would be over its limit."""
+        if not self.enabled:
+            return
+        now = time.time()
+        window_index = int(now // self.window)
+        overlap = 1.0 - (now % self.window) / self.window # Share of the previous window still inside the sliding one
+        retry_after = 0
+        for key, limit in ((f"ip:{ip}", self.per_ip), (self._user_key(username, ip), self.per_user)):
+            try:
+                hits, previous = self.store.peek(key, window_index)
+            except Exception as e: # Shared backend down: fail open rather than block every sign-in
+                logger.warning("Login rate limit store unavailable: %s", e)
+                return
+            if hits + 1 + previous * overlap > limit: # + 1: this attempt, should it fail
+                retry_after = max(retry_after, self._retry_after(hits, previous, limit, now))
+        if retry_after:
+            self.failures.record(username, ip, "rate_limited")
+            raise LoginRateLimited(retry_after)
+
+    def succeeded(self, username, ip):
+        """Clears the (username, ip) window after a successful sign-in."""
+        if not self.enabled:
+            return
+        try:
+            self.store.reset(self._user_key(username, ip))
+        except Exception as e:
+            logger.warning("Login rate limit store unavailable: %s", e)
+
+    def failed(self, username, ip, reason, subject_id=None, details="", payload=None):
+        """Counts a failed sign-in against (username, ip) and ip and audits it, aggregating repeats (see FailureAudit)."""
+        if self.enabled:
+            window_index = int(time.time() // self.window)
+            try:
+                self.store.hit(f"ip:{ip}", window_index)
+                self.store.hit(self._user_key(username, ip), window_index)
+            except Exception as e:
+                logger.warning("Login rate limit store unavailable: %s", e)
+        self.failures.record(username, ip, reason, subject_id=subject_id, details=details, payload=payload)
+
+    # --- Internals ---
+
+    @staticmethod
+    def _user_key(username, ip):
+        return f"user:{username.lower()}:{ip}"
+
+    def _flush_failures(self):
+        # Looked up at exit: init_app replaces the aggregator
+        self.failures.flush(force=True)
+
+    def _retry_after(self, hits, previous, limit, now):
+        """Seconds until one more attempt would fit under the limit, assuming none are made meanwhile."""
+        elapsed = now % self.window
+        room = limit - 1 # The next attempt counts itself
+        if hits <= room and previous:
+            # Still in this window: hits + 1 + previous * (1 - t / window) <= limit
+            return max(1, math.ceil(self.window * (1 - (room - hits) / previous) - elapsed))
+        # After the rollover this window's hits become the weighted previous ones
+        return max(1, math.ceil(self.window - elapsed + max(0.0, self.window * (1 - room / hits))))
+
+    @staticmethod
+    def _limited_response(e):
+        flash(f"Too many sign-in attempts. Please wait {e.retry_after} seconds and try again.", "danger")
+        return render_template("common/login.html"), 429, {"Retry-After": str(e.retry_after)}
+
+
+login_throttle = LoginThrottle()
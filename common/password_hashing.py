@@ -0,0 +1,271 @@
+# common/password_hashing.py
+"""
+Runs bcrypt through a bounded thread pool.
+
+bcrypt releases the GIL, so hashing on the request thread lets a burst of logins occupy
+every core and starve the rest of the app. Here at most PASSWORD_HASH_WORKERS hashes run
+at once per process and at most PASSWORD_HASH_QUEUE_MAX more wait for a slot; a request
+that can't get a place within PASSWORD_HASH_QUEUE_TIMEOUT seconds fails fast with
+PasswordHashingBusy (a 503 with Retry-After) instead of piling up.
+
+Those limits are per process, and with gunicorn's default sync workers a process never
+has more than one hash in flight, so they alone can't stop a login storm from occupying
+every worker. On top of them, hashes take one of PASSWORD_HASH_HOST_SLOTS slots shared by
+every process on the host (flock'd files under <instance>/bcrypt_slots), and at most
+PASSWORD_HASH_HOST_QUEUE more requests wait for one; anything beyond that gets the 503
+immediately. Keep slots + queue below the number of gunicorn workers (see gunicorn.conf.py)
+so some workers are always free for the rest of the app.
+
+The cost factor is Flask-Bcrypt's BCRYPT_LOG_ROUNDS (pick it with calibrate_bcrypt.py).
+Hashes made with a different cost are re-hashed on the next successful login
+(User.check_password).
+"""
+import os
+import random
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from extensions import bcrypt
+from common.sql_metrics import percentile
+
+try:
+    import fcntl # Not available on Windows; only the per-process limits apply there
+except ImportError:
+    fcntl = None
+
+SAMPLES = 500 # Recent calls kept per operation for the percentiles
+HOST_POLL_INTERVAL = 0.01 # Seconds between tries for a host slot while queued
+
+
+class PasswordHashingBusy(RuntimeError):
+    """Raised when the hashing queue is full; the caller should retry shortly."""
+
+
+def hash_cost(password_hash):
+    """The cost factor stored in a bcrypt hash ('$2b$12$...' -> 12), or None if it isn't one."""
+    parts = (password_hash or "").split("$")
+    if len(parts) < 4 or not parts[2].isdigit():
+        return None
+    return int(parts[2])
+
+def benchmark_cost(rounds, samples=5, password="calibration-password"):
+    """Median milliseconds for one bcrypt hash at the given cost on this machine."""
+    import bcrypt as _bcrypt
+    timings = []
+    for _ in range(samples):
+        started = time.perf_counter()
+        _bcrypt.hashpw(password.encode("utf-8"), _bcrypt.gensalt(rounds))
+        timings.append((time.perf_counter() - started) * 1000.0)
+    return sorted(timings)[len(timings) // 2]
+
+
+def hash_passwords(passwords, rounds):
+    """bcrypt hashes (str) of a list of passwords; runs in ProcessPoolExecutor workers for bulk imports."""
+    import bcrypt as _bcrypt
+    return [_bcrypt.hashpw(p.encode("utf-8"), _bcrypt.gensalt(rounds)).decode("utf-8") for p in passwords]
+
+
+class HostSlots:
+    """
+    A host-wide counting semaphore made of flock'd files: one file per slot, held by
+    whichever process (or thread) has that slot. Locks die with their process.
+    """
+
+    def __init__(self, directory, prefix, count):
+        self.directory = directory
+        self.prefix = prefix
+        self.count = count
+        self._files = None
+        self._held = set() # Slots taken by this process: flock won't refuse our own descriptor
+        self._pid = None
+        self._lock = threading.Lock()
+
+    def try_acquire(self):
+        """Takes a free slot without waiting. Returns its number, or None when all are taken."""
+        with self._lock:
+            if self._pid != os.getpid(): # A forked child must not share its parent's lock descriptors
+                os.makedirs(self.directory, exist_ok=True)
+                self._files = [open(os.path.join(self.directory, f"{self.prefix}-{i}.lock"), "w")
+                               for i in range(self.count)]
+                self._held = set()
+                self._pid = os.getpid()
+            start = random.randrange(self.count) # Spread processes over the files
+            for i in range(self.count):
+                slot = (start + i) % self.count
+                if slot in self._held:
+                    continue
+                try:
+                    fcntl.flock(self._files[slot], fcntl.LOCK_EX | fcntl.LOCK_NB)
+                except BlockingIOError:
+                    continue
+                self._held.add(slot)
+                return slot
+            return None
+
+    def release(self, slot):
+        with self._lock:
+            fcntl.flock(self._files[slot], fcntl.LOCK_UN)
+            self._held.discard(slot)
+
+
+class PasswordHasher:
+    """
+    Bounded executor for bcrypt hash/check calls, with queue-time metrics.
+    Registered as app.extensions['password_hasher']; see module docstring.
+    """
+
+    def __init__(self, app=None):
+        self.workers = os.cpu_count() or 2
+        self.queue_max = 32
+        self.queue_timeout = 5.0
+        self.rounds = 12
+        self._executor = None
+        self._pid = None
+        self._slots = None
+        self._lock = threading.Lock()
+        self._stats = {}
+        self._in_flight = 0
+        self._host_slots = None
+        self._host_queue = None
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.workers = app.config.get("PASSWORD_HASH_WORKERS") or os.cpu_count() or 2
+        self.queue_max = app.config.get("PASSWORD_HASH_QUEUE_MAX", 32)
+        self.queue_timeout = app.config.get("PASSWORD_HASH_QUEUE_TIMEOUT", 5.0)
+        self.rounds = app.config.get("BCRYPT_LOG_ROUNDS", 12)
+        self._slots = threading.BoundedSemaphore(self.workers + self.queue_max)
+        if fcntl is not None:
+            host_slots = app.config.get("PASSWORD_HASH_HOST_SLOTS") or max(1, (os.cpu_count() or 2) // 2)
+            host_queue = app.config.get("PASSWORD_HASH_HOST_QUEUE") or host_slots
+            directory = os.path.join(app.instance_path, "bcrypt_slots")
+            self._host_slots = HostSlots(directory, "run", host_slots)
+            self._host_queue = HostSlots(directory, "wait", host_queue)
+        app.extensions["password_hasher"] = self
+        app.register_error_handler(PasswordHashingBusy, self._busy_response)
+
+    # --- Public API ---
+
+    def hash(self, password):
+        """bcrypt hash (str) of password at the configured cost."""
+        return self._run("hash", lambda: bcrypt.generate_password_hash(password, self.rounds).decode("utf-8"))
+
+    def check(self, password_hash, password):
+        """True if password matches password_hash."""
+        return self._run("check", lambda: bcrypt.check_password_hash(password_hash, password))
+
+    def needs_rehash(self, password_hash):
+        """True when password_hash was made with a different cost than the configured one."""
+        cost = hash_cost(password_hash)
+        return cost is not None and cost != self.rounds
+
+    def stats(self):
+        """Per-operation call counts, rejections and queue/run time percentiles (ms) for this process."""
+        with self._lock:
+            snapshot = {op: (dict(s), list(s["wait_ms"]), list(s["run_ms"])) for op, s in self._stats.items()}
+            in_flight = self._in_flight
+        operations = []
+        for op, (s, wait_ms, run_ms) in sorted(snapshot.items()):
+            wait_ms.sort()
+            run_ms.sort()
+            operations.append({
+                "operation": op,
+                "calls": s["calls"],
+                "rejected": s["rejected"],
+                "wait_ms": {p: percentile(wait_ms, p) for p in (50, 95, 99)},
+                "run_ms": {p: percentile(run_ms, p) for p in (50, 95, 99)},
+            })
+        return {"workers": self.workers, "queue_max": self.queue_max, "rounds": self.rounds,
+                "host_slots": self._host_slots.count if self._host_slots else None,
+                "host_queue": self._host_queue.count if self._host_queue else None,
+                "in_flight": in_flight, "operations": operations}
+
+    # --- Internals ---
+
+    def _ensure_executor(self):
+        if self._executor is None or self._pid != os.getpid():
+            with self._lock:
+                if self._executor is None or self._pid != os.getpid(): # New process after a fork
+                    self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="bcrypt")
+                    self._slots = threading.BoundedSemaphore(self.workers + self.queue_max)
+                    self._pid = os.getpid()
+        return self._executor
+
+    def _record(self, op, **fields):
+        with self._lock:
+            s = self._stats.setdefault(op, {"calls": 0, "rejected": 0,
+                                            "wait_ms": deque(maxlen=SAMPLES), "run_ms": deque(maxlen=SAMPLES)})
+            if fields.get("rejected"):
+                s["rejected"] += 1
+                return
+            s["calls"] += 1
+            s["wait_ms"].append(fields["wait_ms"])
+            s["run_ms"].append(fields["run_ms"])
+
+    def _acquire_host_slot(self, deadline):
+        """A host-wide slot, waiting in the host-wide queue until deadline; None if neither is free in time."""
+        slot = self._host_slots.try_acquire()
+        if slot is not None:
+            return slot
+        place = self._host_queue.try_acquire()
+        if place is None:
+            return None # Queue full: fail now rather than hold this worker
+        try:
+            while time.monotonic() < deadline:
+                time.sleep(HOST_POLL_INTERVAL)
+                slot = self._host_slots.try_acquire()
+                if slot is not None:
+                    return slot
+            return None
+        finally:
+            self._host_queue.release(place)
+
+    def _run(self, op, fn):
+        executor = self._ensure_executor()
+        deadline = time.monotonic() + self.queue_timeout
+        if not self._slots.acquire(timeout=self.queue_timeout):
+            self._record(op, rejected=True)
+            raise PasswordHashingBusy(f"password {op} queue is full")
+        submitted = time.perf_counter()
+        host_slot = None
+        if self._host_slots is not None:
+            try:
+                host_slot = self._acquire_host_slot(deadline)
+            except Exception:
+                self._slots.release()
+                raise
+            if host_slot is None:
+                self._slots.release()
+                self._record(op, rejected=True)
+                raise PasswordHashingBusy(f"password {op} host queue is full")
+        timings = {}
+
+        def task():
+            timings["started"] = time.perf_counter()
+            try:
+                return fn()
+            finally:
+                timings["finished"] = time.perf_counter()
+
+        with self._lock:
+            self._in_flight += 1
+        try:
+            return executor.submit(task).result()
+        finally:
+            with self._lock:
+                self._in_flight -= 1
+            if host_slot is not None:
+                self._host_slots.release(host_slot)
+            self._slots.release()
+            if "started" in timings:
+                self._record(op, wait_ms=(timings["started"] - submitted) * 1000.0,
+                             run_ms=(timings["finished"] - timings["started"]) * 1000.0)
+
+    @staticmethod
+    def _busy_response(e):
+        return "Too many sign-ins at once, please try again in a moment.", 503, {"Retry-After": "1"}
+
+
+password_hasher = PasswordHasher()
@@ -0,0 +1,214 @@
+# common/sales_rollup.py
+"""
+Daily sales rollups built from PURCHASES, so reports never scan the raw purchases table.
+
+SALES_SPONSOR_DAILY holds one row per (sponsor, day) and SALES_DRIVER_DAILY one row per
+(driver, sponsor, day), each with points spent, items and orders. PURCHASES.rolled_up
+marks the purchases already counted in them.
+
+Checkout adds its own order with record_order(), in the same transaction: its purchases
+are inserted with rolled_up set, and its two rollup rows are incremented with an atomic
+upsert. Concurrent checkouts only wait on each other when they touch the same sponsor's
+row for the same day. The catch-up job (and rollup_sales.py) rolls up everything else,
+e.g. imports and seed data, by selecting the purchases that aren't rolled up yet.
+SALES_ROLLUP_STATE serialises catch-up runs and records how far the last one got.
+"""
+from datetime import datetime
+from sqlalchemy import select, delete, update, func, tuple_
+from extensions import db
+from models import Purchase, SponsorSalesDaily, DriverSalesDaily, SalesRollupState, Sponsor, User
+
+STATE_NAME = "purchases"
+DEFAULT_BATCH_SIZE = 5000
+UPSERT_CHUNK = 500 # Rollup rows per multi-row INSERT
+
+
+# --- Maintenance ---
+
+def lock_rollup_state():
+    """
+    Row-locks the catch-up state (SELECT ... FOR UPDATE), creating it on first use.
+    Only catch-up and rebuild take it, so two of them never roll up the same purchases.
+    Checkout never does.
+    """
+    state = db.session.execute(
+        select(SalesRollupState).where(SalesRollupState.name == STATE_NAME).with_for_update()
+    ).scalar_one_or_none()
+    if state is None:
+        state = SalesRollupState(name=STATE_NAME, last_purchase_id=0)
+        db.session.add(state)
+        db.session.flush()
+    return state
+
+def _order_key(row):
+    # One checkout = one driver, one sponsor and one NOW() timestamp, in consecutive ids
+    return (row.user_id, row.sponsor_id, row.purchase_date)
+
+def _aggregate(rows, previous_key=None):
+    """Sums a batch of purchase rows per rollup key. Returns (sponsor_totals, driver_totals, last_order_key)."""
+    sponsor_totals = {}
+    driver_totals = {}
+    for row in rows:
+        day = row.purchase_date.date() if isinstance(row.purchase_date, datetime) else row.purchase_date
+        new_order = _order_key(row) != previous_key
+        previous_key = _order_key(row)
+        for totals, key in ((sponsor_totals, (row.sponsor_id, day)),
+                            (driver_totals, (row.user_id, row.sponsor_id, day))):
+            entry = totals.setdefault(key, [0, 0, 0])
+            entry[0] += row.points * row.quantity
+            entry[1] += row.quantity
+            entry[2] += 1 if new_order else 0
+    return sponsor_totals, driver_totals, previous_key
+
+def _upsert(model, key_columns, totals):
+    """
+    Adds totals onto the rollup rows in SQL (INSERT ... ON DUPLICATE KEY / ON CONFLICT
+    UPDATE col = col + new), so concurrent writers never lose each other's increments.
+    """
+    if not totals:
+        return
+    table = model.__table__
+    dialect = db.session.get_bind().dialect.name
+    if dialect not in ("mysql", "sqlite", "postgresql"):
+        _apply(model, key_columns, totals)
+        return
+    rows = [dict(zip(key_columns, key), points=points, items=items, orders=orders)
+            for key, (points, items, orders) in totals.items()]
+    for i in range(0, len(rows), UPSERT_CHUNK):
+        chunk = rows[i:i + UPSERT_CHUNK]
+        if dialect == "mysql":
+            from sqlalchemy.dialects.mysql import insert
+            stmt = insert(table).values(chunk)
+            stmt = stmt.on_duplicate_key_update(
+                {name: table.c[name] + stmt.inserted[name] for name in ("points", "items", "orders")})
+        else:
+            if dialect == "sqlite":
+                from sqlalchemy.dialects.sqlite import insert
+            else:
+                from sqlalchemy.dialects.postgresql import insert
+            stmt = insert(table).values(chunk)
+            stmt = stmt.on_conflict_do_update(
+                index_elements=list(key_columns),
+                set_={name: table.c[name] + stmt.excluded[name] for name in ("points", "items", "orders")})
+        db.session.execute(stmt)
+
+def _apply(model, key_columns, totals):
+    """Read-modify-write fallback for databases without an upsert (concurrent writers can race)."""
+    columns = [getattr(model, name) for name in key_columns]
+    existing = {
+        tuple(getattr(row, name) for name in key_columns): row
+        for row in db.session.execute(select(model).where(tuple_(*columns).in_(list(totals)))).scalars()
+    }
+    for key, (points, items, orders) in totals.items():
+        row = existing.get(key)
+        if row is None:
+            db.session.add(model(**dict(zip(key_columns, key)), points=points, items=items, orders=orders))
+        else:
+            row.points += points
+            row.items += items
+            row.orders += orders
+
+def record_order(purchases):
+    """
+    Adds one checkout's purchases (inserted with rolled_up=True and one shared purchase_date)
+    to its sponsor's and driver's rollup rows for that day. Does not commit.
+    """
+    sponsor_totals, driver_totals, _ = _aggregate(purchases)
+    _upsert(SponsorSalesDaily, ("sponsor_id", "day"), sponsor_totals)
+    _upsert(DriverSalesDaily, ("driver_id", "sponsor_id", "day"), driver_totals)
+
+def roll_up_pending(state, batch_size=DEFAULT_BATCH_SIZE, previous_key=None):
+    """
+    Rolls up one batch of purchases that aren't rolled up yet and flags them.
+    Does not commit; the caller owns the transaction. Returns (rows rolled up, last order key).
+    """
+    rows = db.session.execute(
+        select(Purchase.id, Purchase.user_id, Purchase.sponsor_id, Purchase.points,
+               Purchase.quantity, Purchase.purchase_date)
+        .where(Purchase.rolled_up == db.false())
+        .order_by(Purchase.id)
+        .limit(batch_size)
+    ).all()
+    if not rows:
+        return 0, previous_key
+
+    sponsor_totals, driver_totals, previous_key = _aggregate(rows, previous_key)
+    _upsert(SponsorSalesDaily, ("sponsor_id", "day"), sponsor_totals)
+    _upsert(DriverSalesDaily, ("driver_id", "sponsor_id", "day"), driver_totals)
+    db.session.execute(update(Purchase).where(Purchase.id.in_([row.id for row in rows])).values(rolled_up=True))
+    state.last_purchase_id = max(state.last_purchase_id, rows[-1].id)
+    state.updated_at = datetime.utcnow()
+    db.session.flush()
+    return len(rows), previous_key
+
+def catch_up_sales_rollups(batch_size=DEFAULT_BATCH_SIZE):
+    """Rolls up every purchase not rolled up yet, committing per batch. Returns the row count."""
+    total = 0
+    previous_key = None # Carried across batches so an order split by the batch limit counts once
+    while True:
+        state = lock_rollup_state()
+        count, previous_key = roll_up_pending(state, batch_size, previous_key)
+        if count < batch_size:
+            # Everything committed is now in the rollups, checkouts included
+            newest = db.session.execute(select(func.max(Purchase.id))).scalar() or 0
+            state.last_purchase_id = max(state.last_purchase_id, newest)
+            state.updated_at = datetime.utcnow()
+        db.session.commit()
+        total += count
+        if count < batch_size:
+            return total
+
+def rebuild_sales_rollups(batch_size=DEFAULT_BATCH_SIZE):
+    """Drops both rollup tables and rebuilds them from PURCHASES. Returns the row count."""
+    state = lock_rollup_state()
+    db.session.execute(delete(SponsorSalesDaily))
+    db.session.execute(delete(DriverSalesDaily))
+    db.session.execute(update(Purchase).where(Purchase.rolled_up == db.true()).values(rolled_up=False))
+    state.last_purchase_id = 0
+    db.session.commit()
+    return catch_up_sales_rollups(batch_size)
+
+
+# --- Reports ---
+
+def _day_range(query, model, start_dt=None, end_dt=None):
+    if start_dt:
+        query = query.where(model.day >= start_dt.date())
+    if end_dt:
+        query = query.where(model.day <= end_dt.date()) # end date is inclusive
+    return query
+
+def sales_by_sponsor(start_dt=None, end_dt=None):
+    """Per-sponsor totals over a date range, biggest spenders first."""
+    query = (
+        select(SponsorSalesDaily.sponsor_id, Sponsor.ORG_NAME.label("org_name"),
+               func.sum(SponsorSalesDaily.points).label("points"),
+               func.sum(SponsorSalesDaily.items).label("items"),
+               func.sum(SponsorSalesDaily.orders).label("orders"))
+        .outerjoin(Sponsor, Sponsor.SPONSOR_ID == SponsorSalesDaily.sponsor_id)
+        .group_by(SponsorSalesDaily.sponsor_id, Sponsor.ORG_NAME)
+        .order_by(func.sum(SponsorSalesDaily.points).desc())
+    )
+    return db.session.execute(_day_range(query, SponsorSalesDaily, start_dt, end_dt)).all()
+
+def sales_by_driver(start_dt=None, end_dt=None, sponsor_id=None):
+    """Per (driver, sponsor) totals over a date range, optionally for one sponsor."""
+    query = (
+        select(DriverSalesDaily.driver_id, User.USERNAME.label("username"),
+               DriverSalesDaily.sponsor_id, Sponsor.ORG_NAME.label("org_name"),
+               func.sum(DriverSalesDaily.points).label("points"),
+               func.sum(DriverSalesDaily.items).label("items"),
+               func.sum(DriverSalesDaily.orders).label("orders"))
+        .outerjoin(User, User.USER_CODE == DriverSalesDaily.driver_id)
+        .outerjoin(Sponsor, Sponsor.SPONSOR_ID == DriverSalesDaily.sponsor_id)
+        .group_by(DriverSalesDaily.driver_id, User.USERNAME, DriverSalesDaily.sponsor_id, Sponsor.ORG_NAME)
+        .order_by(func.sum(DriverSalesDaily.points).desc())
+    )
+    if sponsor_id:
+        query = query.where(DriverSalesDaily.sponsor_id == sponsor_id)
+    return db.session.execute(_day_range(query, DriverSalesDaily, start_dt, end_dt)).all()
+
+def rollups_current_through():
+    """(PURCHASES.id the last catch-up covered up to, when) for the report footer, or (0, None) before the first run."""
+    state = db.session.get(SalesRollupState, STATE_NAME)
+    return (state.last_purchase_id, state.updated_at) if state else (0, None)
@@ -0,0 +1,172 @@
+# common/sql_metrics.py
+"""
+Per-request SQL instrumentation.
+
+Engine before/after_cursor_execute listeners count the statements each request runs,
+add up their time and tally them by fingerprint (the SQL with literals and IN lists
+collapsed). When a request finishes it gets a Server-Timing header and one JSON log line,
+a warning is logged when one fingerprint ran more than SQL_N_PLUS_ONE_THRESHOLD times
+(the usual sign of an N+1 loop), and the numbers are added to per-endpoint samples for
+the admin SQL metrics page.
+
+Samples are kept in memory, so each worker process reports on its own traffic.
+"""
+import json
+import logging
+import math
+import re
+import threading
+import time
+from collections import Counter, deque
+from datetime import datetime
+from flask import g, request, has_request_context
+from sqlalchemy import event
+from extensions import db
+
+logger = logging.getLogger(__name__)
+
+_LITERALS = re.compile(r"'(?:[^']|'')*'|\b\d+(?:\.\d+)?\b")
+_IN_LISTS = re.compile(r"\(\s*(?:\?|%s|:\w+)(?:\s*,\s*(?:\?|%s|:\w+))*\s*\)")
+_SPACES = re.compile(r"\s+")
+
+
+def fingerprint(statement):
+    """Statement shape: literals become ?, IN lists of any length become (...), whitespace is squeezed."""
+    statement = _LITERALS.sub("?", statement)
+    statement = _IN_LISTS.sub("(...)", statement)
+    return _SPACES.sub(" ", statement).strip()
+
+def percentile(sorted_values, pct):
+    """Nearest-rank percentile of an already sorted list."""
+    if not sorted_values:
+        return 0.0
+    # The smallest value with at least pct% of the values at or below it (pct * n first: 7 / 100 * 100 != 7)
+    rank = max(0, min(len(sorted_values) - 1, math.ceil(pct * len(sorted_values) / 100.0) - 1))
+    return sorted_values[rank]
+
+
+class SQLMetrics:
+    """
+    Collects per-request query counts, DB time and repeated statements.
+    Registered as app.extensions['sql_metrics']; see module docstring.
+    """
+
+    def __init__(self, app=None):
+        self.app = None
+        self._lock = threading.Lock()
+        self._samples = {}      # endpoint -> deque of (total_ms, db_ms, queries)
+        self._warnings = deque(maxlen=50)
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.app = app
+        self.enabled = app.config.get("SQL_METRICS_ENABLED", True)
+        self.threshold = app.config.get("SQL_N_PLUS_ONE_THRESHOLD", 10)
+        self.max_samples = app.config.get("SQL_METRICS_SAMPLES", 500)
+        app.extensions["sql_metrics"] = self
+        if not self.enabled:
+            return
+
+        with app.app_context():
+            engine = db.engine
+        # create_app() may run more than once per process (tests, CLI scripts) with the same engine
+        if not event.contains(engine, "before_cursor_execute", self._before_cursor_execute):
+            event.listen(engine, "before_cursor_execute", self._before_cursor_execute)
+            event.listen(engine, "after_cursor_execute", self._after_cursor_execute)
+        app.before_request(self._start_request)
+        app.after_request(self._finish_request)
+
+    # --- Engine events ---
+
+    def _before_cursor_execute(self, conn, cursor, statement, parameters, context, executemany):
+        if has_request_context() and "sql_stats" in g:
+            conn.info.setdefault("sql_metrics_start", []).append(time.perf_counter())
+
+    def _after_cursor_execute(self, conn, cursor, statement, parameters, context, executemany):
+        if not (has_request_context() and "sql_stats" in g):
+            return
+        starts = conn.info.get("sql_metrics_start")
+        if not starts:
+            return
+        elapsed = time.perf_counter() - starts.pop()
+        stats = g.sql_stats
+        stats["queries"] += 1
+        stats["db_time"] += elapsed
+        stats["fingerprints"][fingerprint(statement)] += 1
+
+    # --- Request hooks ---
+
+    def _start_request(self):
+        g.sql_stats = {"start": time.perf_counter(), "queries": 0, "db_time": 0.0, "fingerprints": Counter()}
+
+    def _finish_request(self, response):
+        stats = g.pop("sql_stats", None)
+        if stats is None:
+            return response
+        total_ms = (time.perf_counter() - stats["start"]) * 1000
+        db_ms = stats["db_time"] * 1000
+        endpoint = request.endpoint or "<unmatched>"
+
+        response.headers.add(
+            "Server-Timing", f'db;dur={db_ms:.1f};desc="{stats["queries"]} queries", app;dur={total_ms:.1f}'
+        )
+        if endpoint.endswith("static"):
+            return response
+
+        repeated = [(sql, count) for sql, count in stats["fingerprints"].most_common(3) if count > self.threshold]
+        logger.info(json.dumps({
+            "event": "request_sql",
+            "method": request.method,
+            "endpoint": endpoint,
+            "path": request.path,
+            "status": response.status_code,
+            "queries": stats["queries"],
+            "db_ms": round(db_ms, 2),
+            "total_ms": round(total_ms, 2),
+            "distinct_statements": len(stats["fingerprints"]),
+        }))
+        for sql, count in repeated:
+            logger.warning("Possible N+1 on %s %s: statement ran %d times: %s",
+                           request.method, endpoint, count, sql[:300])
+
+        with self._lock:
+            samples = self._samples.get(endpoint)
+            if samples is None:
+                samples = self._samples[endpoint] = deque(maxlen=self.max_samples)
+            samples.append((total_ms, db_ms, stats["queries"]))
+            for sql, count in repeated:
+                self._warnings.appendleft({"at": datetime.utcnow(), "endpoint": endpoint, "count": count, "sql": sql})
+        return response
+
+    # --- Reporting ---
+
+    def endpoint_summary(self):
+        """Per-endpoint request count and p50/p95/p99 of request time, DB time and query count, slowest p95 first."""
+        with self._lock:
+            snapshot = {endpoint: list(samples) for endpoint, samples in self._samples.items()}
+        summary = []
+        for endpoint, samples in snapshot.items():
+            total_ms, db_ms, queries = (sorted(column) for column in zip(*samples))
+            summary.append({
+                "endpoint": endpoint,
+                "requests": len(samples),
+                "total_ms": {p: percentile(total_ms, p) for p in (50, 95, 99)},
+                "db_ms": {p: percentile(db_ms, p) for p in (50, 95, 99)},
+                "queries": {p: percentile(queries, p) for p in (50, 95, 99)},
+                "max_queries": queries[-1],
+            })
+        summary.sort(key=lambda row: row["total_ms"][95], reverse=True)
+        return summary
+
+    def recent_warnings(self):
+        with self._lock:
+            return list(self._warnings)
+
+    def reset(self):
+        with self._lock:
+            self._samples.clear()
+            self._warnings.clear()
+
+
+sql_metrics = SQLMetrics()
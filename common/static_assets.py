@@ -0,0 +1,258 @@
+# common/static_assets.py
+"""
+Fingerprinted, minified and precompressed static assets.
+
+build_assets.py (run by build.sh) writes a copy of every file under static/ to
+static/dist/ with a content hash in its name (css/style.css -> dist/css/style.1f3a9c0b2e.css):
+
+- CSS and JS are minified (comments and indentation removed, line breaks kept in JS);
+- PNGs are re-encoded by Pillow, as a 256-colour palette when that stays within
+  STATIC_PALETTE_MAX_ERROR (RMS, 0-255) of the original, losslessly otherwise;
+- text files get .gz and, when the optional brotli package is installed, .br variants.
+
+The mapping is saved in static/dist/manifest.json. When it is present (and the app isn't
+in debug mode):
+- url_for('static', filename='css/style.css') returns the hashed URL;
+- hashed files are served with Cache-Control: public, max-age=<a year>, immutable, since
+  their content can never change under that name;
+- the .br or .gz variant is sent when the client's Accept-Encoding allows it.
+Without a manifest the originals are served exactly as before.
+"""
+import gzip
+import hashlib
+import io
+import json
+import mimetypes
+import os
+import re
+import shutil
+from flask import current_app, request, send_from_directory
+
+try:
+    import brotli
+except ImportError: # Optional: without it only .gz variants are written
+    brotli = None
+
+DIST_DIR = "dist"
+MANIFEST_NAME = "manifest.json"
+HASH_LENGTH = 10
+COMPRESSIBLE = {".css", ".js", ".svg", ".json", ".txt", ".html", ".map"}
+ENCODINGS = (("br", ".br"), ("gzip", ".gz")) # In order of preference
+IMMUTABLE_MAX_AGE = 365 * 24 * 3600
+
+
+# --- Minification ---
+
+_CSS_COMMENT = re.compile(r"/\*.*?\*/", re.S)
+_CSS_SPACE = re.compile(r"\s+")
+_CSS_PUNCTUATION = re.compile(r"\s*([{};,>])\s*")
+_JS_REGEX_PRECEDERS = set("(,=:[!&|?{};+-*%<>~^")
+
+def minify_css(source):
+    """Drops comments and redundant whitespace."""
+    css = _CSS_COMMENT.sub("", source)
+    css = _CSS_SPACE.sub(" ", css)
+    css = _CSS_PUNCTUATION.sub(r"\1", css)
+    return css.replace(";}", "}").strip()
+
+def minify_js(source):
+    """
+    Drops comments, indentation and blank lines. Strings, template literals and regex
+    literals are copied untouched, and line breaks are kept so automatic semicolon
+    insertion works as before.
+    """
+    out = []
+    i, n = 0, len(source)
+    last = "" # Last significant code character, to tell a regex literal from a division
+
+    def emit_space(char):
+        if out and out[-1] not in (" ", "\n"):
+            out.append(char)
+        elif char == "\n" and out and out[-1] == " ":
+            out[-1] = "\n" # No trailing spaces
+
+    while i < n:
+        c = source[i]
+        if c in "'\"`":
+            j = i + 1
+            while j < n and source[j] != c:
+                j += 2 if source[j] == "\\" else 1
+            out.append(source[i:j + 1])
+            i, last = j + 1, c
+        elif source.startswith("//", i):
+            end = source.find("\n", i)
+            i = n if end < 0 else end
+        elif source.startswith("/*", i):
+            end = source.find("*/", i + 2)
+            i = n if end < 0 else end + 2
+            emit_space(" ")
+        elif c == "/" and (last in _JS_REGEX_PRECEDERS or not last):
+            j, in_class = i + 1, False
+            while j < n and source[j] != "\n":
+                if source[j] == "\\":
+                    j += 2
+                    continue
+                if source[j] == "[":
+                    in_class = True
+                elif source[j] == "]":
+                    in_class = False
+                elif source[j] == "/" and not in_class:
+                    break
+                j += 1
+            out.append(source[i:j + 1])
+            i, last = j + 1, "/"
+        elif c == "\n":
+            emit_space("\n")
+            i += 1
+        elif c.isspace():
+            emit_space(" ")
+            i += 1
+        else:
+            out.append(c)
+            last = c
+            i += 1
+    return "".join(out).strip() + "\n"
+
+
+# --- Images ---
+
+def optimize_png(data, max_palette_error=8.0):
+    """Smallest acceptable PNG encoding of data: a 256-colour palette when it's close enough, else lossless."""
+    from PIL import Image, ImageChops, ImageStat
+    image = Image.open(io.BytesIO(data))
+    image.load()
+    candidates = [data]
+
+    lossless = io.BytesIO()
+    image.save(lossless, format="PNG", optimize=True)
+    candidates.append(lossless.getvalue())
+
+    if image.mode != "P":
+        rgba = image.convert("RGBA")
+        palette = rgba.quantize(256, method=Image.Quantize.FASTOCTREE)
+        # Compare as seen on a dark and a light background, so hidden colour under transparent pixels doesn't count
+        error = 0.0
+        for background in ((0, 0, 0, 255), (255, 255, 255, 255)):
+            base = Image.new("RGBA", rgba.size, background)
+            original = Image.alpha_composite(base, rgba).convert("RGB")
+            quantized = Image.alpha_composite(base, palette.convert("RGBA")).convert("RGB")
+            error = max(error, *ImageStat.Stat(ImageChops.difference(original, quantized)).rms)
+        if error <= max_palette_error:
+            encoded = io.BytesIO()
+            palette.save(encoded, format="PNG", optimize=True)
+            candidates.append(encoded.getvalue())
+    return min(candidates, key=len)
+
+
+# --- Build ---
+
+def _hashed_name(path, content):
+    stem, ext = os.path.splitext(path)
+    return f"{stem}.{hashlib.sha256(content).hexdigest()[:HASH_LENGTH]}{ext}"
+
+def _precompress(path, content):
+    """Writes .gz (and .br) next to path when they are smaller. Returns the encodings written."""
+    written = []
+    variants = [("gzip", ".gz", gzip.compress(content, compresslevel=9, mtime=0))]
+    if brotli is not None:
+        variants.insert(0, ("br", ".br", brotli.compress(content, quality=11)))
+    for encoding, suffix, compressed in variants:
+        if len(compressed) < len(content):
+            with open(path + suffix, "wb") as fh:
+                fh.write(compressed)
+            written.append(encoding)
+    return written
+
+def build_assets(static_folder, max_palette_error=8.0):
+    """
+    Rebuilds static/dist from the files under static_folder and writes the manifest.
+    Returns a list of (source path, original bytes, built bytes, encodings) per file.
+    """
+    dist = os.path.join(static_folder, DIST_DIR)
+    shutil.rmtree(dist, ignore_errors=True)
+    files, encodings, report = {}, {}, []
+    for root, dirs, names in os.walk(static_folder):
+        dirs[:] = sorted(d for d in dirs if os.path.join(root, d) != dist)
+        for name in sorted(names):
+            source = os.path.join(root, name)
+            rel = os.path.relpath(source, static_folder).replace(os.sep, "/")
+            with open(source, "rb") as fh:
+                original = fh.read()
+            ext = os.path.splitext(name)[1].lower()
+            if ext == ".css":
+                content = minify_css(original.decode("utf-8")).encode("utf-8")
+            elif ext == ".js":
+                content = minify_js(original.decode("utf-8")).encode("utf-8")
+            elif ext == ".png":
+                content = optimize_png(original, max_palette_error)
+            else:
+                content = original
+
+            hashed = f"{DIST_DIR}/{_hashed_name(rel, content)}"
+            target = os.path.join(static_folder, *hashed.split("/"))
+            os.makedirs(os.path.dirname(target), exist_ok=True)
+            with open(target, "wb") as fh:
+                fh.write(content)
+            written = _precompress(target, content) if ext in COMPRESSIBLE else []
+            files[rel] = hashed
+            if written:
+                encodings[hashed] = written
+            report.append((rel, len(original), len(content), written))
+
+    with open(os.path.join(dist, MANIFEST_NAME), "w") as fh:
+        json.dump({"files": files, "encodings": encodings}, fh, indent=2, sort_keys=True)
+    return report
+
+
+# --- Serving ---
+
+class StaticAssets:
+    """Hashed static URLs and precompressed responses from the build manifest; see module docstring."""
+
+    def __init__(self, app=None):
+        self.files = {}      # 'css/style.css' -> 'dist/css/style.<hash>.css'
+        self.encodings = {}  # hashed path -> ['br', 'gzip']
+        self.hashed = set()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.extensions["static_assets"] = self
+        manifest = app.config.get("STATIC_MANIFEST") or os.path.join(app.static_folder, DIST_DIR, MANIFEST_NAME)
+        if not app.config.get("STATIC_ASSETS_ENABLED", True) or app.debug or not os.path.exists(manifest):
+            return # Originals, served as Flask always has
+        with open(manifest) as fh:
+            data = json.load(fh)
+        self.files = data.get("files", {})
+        self.encodings = data.get("encodings", {})
+        self.hashed = set(self.files.values())
+        app.url_defaults(self._hashed_url)
+        app.view_functions["static"] = self.send_static
+
+    def _hashed_url(self, endpoint, values):
+        if endpoint == "static" and values.get("filename") in self.files:
+            values["filename"] = self.files[values["filename"]]
+
+    def send_static(self, filename):
+        """The static view: a precompressed variant when the client accepts one, immutable caching for hashed files."""
+        available = self.encodings.get(filename, ())
+        response = None
+        for encoding, suffix in ENCODINGS:
+            if encoding in available and request.accept_encodings[encoding]:
+                response = send_from_directory(current_app.static_folder, filename + suffix,
+                                               mimetype=mimetypes.guess_type(filename)[0])
+                response.headers["Content-Encoding"] = encoding
+                break
+        if response is None:
+            response = current_app.send_static_file(filename)
+        if available:
+            response.vary.add("Accept-Encoding")
+        if filename in self.hashed:
+            response.cache_control.public = True
+            response.cache_control.max_age = current_app.config.get("STATIC_IMMUTABLE_MAX_AGE", IMMUTABLE_MAX_AGE)
+            response.cache_control.immutable = True
+            response.cache_control.no_cache = None
+        return response
+
+
+static_assets = StaticAssets()
@@ -0,0 +1,269 @@
+# common/synthetic_data.py
+"""
+Synthetic data for benchmarks and capacity planning.
+
+Generates administrators, sponsors (with store settings) and drivers with their profile
+rows, driver/sponsor associations, purchases, notifications and audit history. Activity
+is skewed the way real traffic is: which drivers buy, which sponsors they join and which
+items are popular all follow a Zipf-like distribution, and point balances are heavy tailed.
+
+Everything is drawn from one random.Random(seed) and dated relative to plan.end_date, so
+the same plan on the same starting database produces the same rows. Rows are written with
+Core executemany inserts in batches of plan.batch_size, committed per batch; user codes
+are one block reserved from the USER_CODE sequence, so a seed can be added to a non-empty database.
+"""
+import bisect
+import itertools
+import random
+from datetime import datetime, timedelta
+from extensions import db, bcrypt
+from models import (User, Role, Admin, Sponsor, Driver, StoreSettings, DriverSponsorAssociation,
+                    Purchase, Notification)
+from common.logging import LOGIN_EVENT, DRIVER_POINTS, build_audit_row
+from common.audit_writer import insert_audit_rows
+from common.id_allocator import reserve_user_codes
+from common.account_search import insert_user_rows
+
+# Named sizes for seed_data.py --preset; any field can still be overridden
+PRESETS = {
+    "small": {"drivers": 1000, "sponsors": 20, "purchases": 20000, "notifications": 10000, "audit_events": 20000},
+    "medium": {"drivers": 20000, "sponsors": 100, "purchases": 200000, "notifications": 100000, "audit_events": 200000},
+    "million": {"drivers": 100000, "sponsors": 500, "purchases": 1000000, "notifications": 500000, "audit_events": 1000000},
+}
+
+POINT_RATIOS = (5, 10, 10, 10, 20, 100) # StoreSettings.point_ratio choices, 10 (the default) most common
+CATEGORIES = ("2984", "58058", "11700", "26395", "15032")
+
+
+class SeedPlan:
+    """Cardinalities and shape of one synthetic dataset."""
+
+    def __init__(self, drivers=1000, sponsors=20, admins=2, associations_per_driver=2, purchases=20000,
+                 notifications=10000, audit_events=20000, catalog_size=5000, days=365, skew=1.1,
+                 seed=1, password="Password123!", end_date=None, batch_size=10000):
+        self.drivers = drivers
+        self.sponsors = max(1, sponsors)
+        self.admins = admins
+        self.associations_per_driver = associations_per_driver # Mean; every driver has at least one
+        self.purchases = purchases         # Purchase rows (line items), grouped into 1-3 item orders
+        self.notifications = notifications
+        self.audit_events = audit_events
+        self.catalog_size = catalog_size   # Distinct store items
+        self.days = max(1, days)           # History length, ending at end_date
+        self.skew = skew                   # Zipf exponent: 0 = uniform, ~1 = typical web traffic
+        self.seed = seed
+        self.password = password           # Shared by every generated account (hashed once)
+        self.end_date = end_date or datetime.utcnow().replace(hour=0, minute=0, second=0, microsecond=0)
+        self.batch_size = batch_size
+
+    @classmethod
+    def from_preset(cls, name, **overrides):
+        return cls(**{**PRESETS[name], **{k: v for k, v in overrides.items() if v is not None}})
+
+
+class Zipf:
+    """Draws from population with P(rank k) proportional to 1 / k**skew (rank 1 = first element)."""
+
+    def __init__(self, rng, population, skew):
+        self.rng = rng
+        self.population = population
+        self.cum_weights = list(itertools.accumulate(1.0 / (rank ** skew) for rank in range(1, len(population) + 1)))
+        self.total = self.cum_weights[-1]
+
+    def draw(self):
+        return self.population[bisect.bisect(self.cum_weights, self.rng.random() * self.total)]
+
+    def draw_distinct(self, count):
+        """count distinct draws (fewer if the population is smaller)."""
+        count = min(count, len(self.population))
+        chosen = []
+        while len(chosen) < count:
+            value = self.draw()
+            if value not in chosen:
+                chosen.append(value)
+        return chosen
+
+
+class _BatchInserter:
+    """Buffers rows for one table and writes them with executemany, committing per batch."""
+
+    def __init__(self, table, batch_size, writer=None):
+        self.table = table
+        self.batch_size = batch_size
+        self.writer = writer
+        self.rows = []
+        self.count = 0
+
+    def add(self, row):
+        self.rows.append(row)
+        if len(self.rows) >= self.batch_size:
+            self.flush()
+
+    def flush(self):
+        if not self.rows:
+            return
+        connection = db.session.connection()
+        if self.writer:
+            self.writer(connection, self.rows)
+        else:
+            connection.execute(self.table.insert(), self.rows)
+        db.session.commit()
+        self.count += len(self.rows)
+        self.rows = []
+
+
+def synthetic_username(role, user_code):
+    """USERNAME given to generated accounts, e.g. 'dri1042' for a driver."""
+    return f"{role[:3]}{user_code}"
+
+def _ip(user_code):
+    return f"10.{(user_code >> 16) & 255}.{(user_code >> 8) & 255}.{user_code & 255}"
+
+def _item(index):
+    """Deterministic catalog entry: (item id, title, price in dollars)."""
+    return f"v1|{100000000 + index}|0", f"Catalog item {index}", 5 + (index * 37) % 300 + (index % 100) / 100
+
+def _day_counts(total, days, rng):
+    """Splits total across days with some day-to-day variation, summing exactly to total."""
+    weights = [0.5 + rng.random() for _ in range(days)]
+    scale = total / sum(weights)
+    counts = [int(w * scale) for w in weights]
+    for i in range(total - sum(counts)):
+        counts[i % days] += 1
+    return counts
+
+
+def seed_synthetic_data(plan, progress=print):
+    """Generates and inserts the dataset described by plan (inside an app context). Returns row counts by table."""
+    rng = random.Random(plan.seed)
+    password_hash = bcrypt.generate_password_hash(plan.password).decode("utf-8")
+    first_day = plan.end_date - timedelta(days=plan.days)
+    first_code = reserve_user_codes(plan.admins + plan.sponsors + plan.drivers)
+    counts = {}
+
+    codes = itertools.count(first_code)
+    admin_codes = [next(codes) for _ in range(plan.admins)]
+    sponsor_codes = [next(codes) for _ in range(plan.sponsors)]
+    driver_codes = [next(codes) for _ in range(plan.drivers)]
+
+    # --- Users and profiles ---
+    users = _BatchInserter(User.__table__, plan.batch_size, writer=insert_user_rows)
+    for role, role_codes in ((Role.ADMINISTRATOR, admin_codes), (Role.SPONSOR, sponsor_codes), (Role.DRIVER, driver_codes)):
+        for code in role_codes:
+            users.add({
+                "USER_CODE": code, "USERNAME": synthetic_username(role, code), "PASS": password_hash, "USER_TYPE": role,
+                "FNAME": role.capitalize(), "LNAME": str(code), "EMAIL": f"{role[:3]}{code}@example.com",
+                "CREATED_AT": first_day - timedelta(days=rng.randint(0, 365), seconds=rng.randrange(86400)),
+                "PHONE": f"555{code % 10000000:07d}",
+                "wants_point_notifications": rng.random() < 0.9, "wants_order_notifications": rng.random() < 0.9,
+                "TOTP_ENABLED": False, "IS_ACTIVE": 0 if rng.random() < 0.02 else 1,
+                "FAILED_ATTEMPTS": 0, "IS_LOCKED_OUT": 0,
+            })
+    users.flush()
+    counts["USERS"] = users.count
+
+    profiles = (
+        (Admin.__table__, [{"ADMIN_ID": code, "ROLE_TITLE": "Administrator"} for code in admin_codes]),
+        (Sponsor.__table__, [{"SPONSOR_ID": code, "ORG_NAME": f"Sponsor Org {code}", "STATUS": "Approved"}
+                             for code in sponsor_codes]),
+        (StoreSettings.__table__, [{"sponsor_id": code, "ebay_category_id": rng.choice(CATEGORIES),
+                                    "point_ratio": rng.choice(POINT_RATIOS)} for code in sponsor_codes]),
+    )
+    for table, rows in profiles:
+        inserter = _BatchInserter(table, plan.batch_size)
+        for row in rows:
+            inserter.add(row)
+        inserter.flush()
+        counts[table.name] = inserter.count
+    drivers = _BatchInserter(Driver.__table__, plan.batch_size)
+    for code in driver_codes:
+        drivers.add({"DRIVER_ID": code, "LICENSE_NUMBER": f"D{code:09d}"})
+    drivers.flush()
+    counts["DRIVERS"] = drivers.count
+    progress(f"  users: {counts['USERS']} ({plan.admins} admins, {plan.sponsors} sponsors, {plan.drivers} drivers)")
+
+    # --- Associations: popular sponsors attract more drivers, balances are heavy tailed ---
+    point_ratio = {row["sponsor_id"]: row["point_ratio"] for row in profiles[2][1]}
+    sponsor_zipf = Zipf(rng, sponsor_codes, plan.skew)
+    memberships = {}
+    associations = _BatchInserter(DriverSponsorAssociation.__table__, plan.batch_size)
+    extra_mean = max(0.0, plan.associations_per_driver - 1)
+    for code in driver_codes:
+        extra = min(10, int(rng.expovariate(1 / extra_mean))) if extra_mean else 0
+        memberships[code] = sponsor_zipf.draw_distinct(1 + extra)
+        for sponsor_id in memberships[code]:
+            associations.add({"driver_id": code, "sponsor_id": sponsor_id,
+                              "points": min(1_000_000, int(rng.paretovariate(1.16) * 100) - 100)})
+    associations.flush()
+    counts["DRIVER_SPONSOR_ASSOCIATIONS"] = associations.count
+    progress(f"  associations: {associations.count}")
+
+    # --- Purchases: orders of 1-3 lines, written day by day so ids follow purchase_date ---
+    driver_zipf = Zipf(rng, driver_codes, plan.skew) if driver_codes else None
+    item_zipf = Zipf(rng, range(plan.catalog_size), plan.skew)
+    purchases = _BatchInserter(Purchase.__table__, plan.batch_size)
+    for day_index, day_total in enumerate(_day_counts(plan.purchases, plan.days, rng) if driver_zipf else ()):
+        orders = []
+        remaining = day_total
+        while remaining > 0:
+            lines = min(remaining, rng.randint(1, 3))
+            driver = driver_zipf.draw()
+            orders.append((driver, rng.choice(memberships[driver]), lines))
+            remaining -= lines
+        day = first_day + timedelta(days=day_index)
+        for seconds, (driver, sponsor_id, lines) in zip(sorted(rng.randrange(86400) for _ in orders), orders):
+            when = day + timedelta(seconds=seconds)
+            for _ in range(lines):
+                item_id, title, price = _item(item_zipf.draw())
+                purchases.add({"user_id": driver, "sponsor_id": sponsor_id, "item_id": item_id, "title": title,
+                               "points": int(price * point_ratio[sponsor_id]), "quantity": 1 if rng.random() < 0.85 else 2,
+                               "purchase_date": when})
+    purchases.flush()
+    counts["PURCHASES"] = purchases.count
+    progress(f"  purchases: {purchases.count}")
+
+    # --- Notifications: active drivers get more; older ones are mostly read ---
+    notifications = _BatchInserter(Notification.__table__, plan.batch_size)
+    for _ in range(plan.notifications if driver_zipf else 0):
+        driver = driver_zipf.draw()
+        sponsor_id = rng.choice(memberships[driver])
+        age = rng.random()
+        amount = rng.choice((10, 25, 50, 100, 250, 500))
+        notifications.add({
+            "SENDER_CODE": sponsor_id, "RECIPIENT_CODE": driver,
+            "TIMESTAMP": plan.end_date - timedelta(seconds=int(age * plan.days * 86400)),
+            "MESSAGE": f"🎉 Sponsor Org {sponsor_id} awarded you {amount} points!" if rng.random() < 0.7
+                       else f"✅ Your order with Sponsor Org {sponsor_id} has been placed successfully!",
+            "READ_STATUS": rng.random() < 0.2 + 0.75 * age,
+        })
+    notifications.flush()
+    counts["NOTIFICATIONS"] = notifications.count
+    progress(f"  notifications: {notifications.count}")
+
+    # --- Audit history: logins and point changes, oldest first like the live log ---
+    audit = _BatchInserter(None, plan.batch_size, writer=insert_audit_rows) # Keeps the search index in step
+    for day_index, day_total in enumerate(_day_counts(plan.audit_events, plan.days, rng) if driver_zipf else ()):
+        day = first_day + timedelta(days=day_index)
+        for seconds in sorted(rng.randrange(86400) for _ in range(day_total)):
+            driver = driver_zipf.draw()
+            username = synthetic_username(Role.DRIVER, driver)
+            if rng.random() < 0.65:
+                ok = rng.random() < 0.93
+                row = build_audit_row(
+                    LOGIN_EVENT, f"{'SUCCESS' if ok else 'FAIL'} user={username} ip={_ip(driver)}",
+                    actor_id=driver if ok else None, subject_id=driver, ip=_ip(driver),
+                    payload={"status": "SUCCESS" if ok else "FAIL"})
+            else:
+                sponsor_id = rng.choice(memberships[driver])
+                points = rng.choice((10, 25, 50, 100, 250, 500))
+                row = build_audit_row(
+                    DRIVER_POINTS, f"Sponsor {synthetic_username(Role.SPONSOR, sponsor_id)} awarded {points} points to driver {username} "
+                                   f"(ID: {driver}). Reason: Synthetic history. Sponsor ID: {sponsor_id}.",
+                    actor_id=sponsor_id, subject_id=driver, sponsor_id=sponsor_id, ip=_ip(sponsor_id),
+                    payload={"action": "award", "points": points, "reason": "Synthetic history"})
+            row["CREATED_AT"] = day + timedelta(seconds=seconds)
+            audit.add(row)
+    audit.flush()
+    counts["AUDIT_LOG"] = audit.count
+    progress(f"  audit events: {audit.count}")
+    return counts
@@ -0,0 +1,122 @@
+# common/template_cache.py
+"""
+Template compilation and fragment caching.
+
+Compiled templates are kept in a Jinja FileSystemBytecodeCache under
+TEMPLATE_BYTECODE_CACHE_DIR (<instance>/jinja_cache by default), so a new worker loads
+bytecode instead of re-parsing every template. precompile_templates.py (run by build.sh)
+fills it ahead of time. Entries carry a checksum of the template source, so an edited
+template is simply recompiled.
+
+Layout partials that depend only on who is looking (the navbar and sidebar) are
+rendered through cached_fragment('partials/navbar.html'). The HTML is rendered once per
+(template, role, impersonation state, locale) and kept in a small LRU. The few
+per-request values are markers in the cached HTML, filled on every use:
+
+    {{ slot('username') }}          current_user.USERNAME (escaped)
+    {{ slot('csrf_token') }}        a CSRF token for this session
+    {{ active_for('a.view', ...) }} 'active' when request.endpoint is one of them
+
+A fragment is rendered with current_user narrowed to is_authenticated and USER_TYPE,
+and with request and session hidden, so per-user data can't end up in the shared copy.
+Caching is off while templates auto-reload (debug), so template edits show immediately.
+"""
+import os
+import re
+import threading
+from collections import OrderedDict
+from flask import current_app, render_template, request, session, g
+from flask_login import current_user
+from flask_wtf.csrf import generate_csrf
+from jinja2 import FileSystemBytecodeCache
+from markupsafe import Markup, escape
+
+_MARKER = re.compile("\x00([^\x00]*)\x00")
+SLOTS = {
+    "username": lambda: current_user.USERNAME,
+    "csrf_token": generate_csrf,
+}
+
+
+def slot(name):
+    """Marker for a per-request value (see SLOTS), for use inside cached fragments only."""
+    return Markup(f"\x00{name}\x00")
+
+def active_for(*endpoints):
+    """Marker that becomes 'active' when the request's endpoint is one of endpoints (names or lists of names)."""
+    names = []
+    for endpoint in endpoints:
+        names.extend([endpoint] if isinstance(endpoint, str) else endpoint)
+    return Markup(f"\x00active:{','.join(names)}\x00")
+
+def _fill(match):
+    name = match.group(1)
+    if name.startswith("active:"):
+        return "active" if request.endpoint in name[len("active:"):].split(",") else ""
+    provider = SLOTS.get(name)
+    return str(escape(provider())) if provider else ""
+
+
+class _FragmentUser:
+    """The only parts of current_user a cached fragment may depend on."""
+
+    def __init__(self, role):
+        self.is_authenticated = role is not None
+        self.USER_TYPE = role
+
+
+class TemplateCache:
+    """Bytecode cache setup plus the per-process fragment LRU; see module docstring."""
+
+    def __init__(self, app=None):
+        self.enabled = True
+        self.max_entries = 256
+        self._entries = OrderedDict() # (template, role, impersonating, locale, script_root) -> str
+        self._lock = threading.Lock()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.enabled = app.config.get("FRAGMENT_CACHE_ENABLED", True)
+        self.max_entries = app.config.get("FRAGMENT_CACHE_SIZE", 256)
+        if app.config.get("TEMPLATE_BYTECODE_CACHE", True):
+            directory = bytecode_cache_dir(app)
+            os.makedirs(directory, exist_ok=True)
+            app.jinja_env.bytecode_cache = FileSystemBytecodeCache(directory) # Used from the next template load on
+        app.jinja_env.globals.update(cached_fragment=self.render, slot=slot, active_for=active_for)
+        app.extensions["template_cache"] = self
+
+    def render(self, template_name):
+        """The fragment for the current viewer, from the cache when possible, with its markers filled."""
+        role = current_user.USER_TYPE if current_user.is_authenticated else None
+        impersonating = bool(session.get("impersonating"))
+        locale = g.get("locale") or current_app.config.get("DEFAULT_LOCALE", "en")
+        key = (template_name, role, impersonating, locale, request.script_root)
+        use_cache = self.enabled and not current_app.jinja_env.auto_reload
+
+        html = None
+        if use_cache:
+            with self._lock:
+                html = self._entries.get(key)
+                if html is not None:
+                    self._entries.move_to_end(key)
+        if html is None:
+            html = render_template(template_name, current_user=_FragmentUser(role), request=None, session=None,
+                                   impersonating=impersonating)
+            if use_cache:
+                with self._lock:
+                    self._entries[key] = html
+                    while len(self._entries) > self.max_entries:
+                        self._entries.popitem(last=False)
+        return Markup(_MARKER.sub(_fill, html))
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+def bytecode_cache_dir(app):
+    return app.config.get("TEMPLATE_BYTECODE_CACHE_DIR") or os.path.join(app.instance_path, "jinja_cache")
+
+
+template_cache = TemplateCache()
@@ -0,0 +1,75 @@
+# common/totp.py
+"""
+otpauth:// URIs and the 2FA setup QR code.
+
+totp_uri() is the one place the provisioning URI is built (User.get_totp_uri and the
+setup page both use it). QR codes are rendered as a 1-bit PNG at TOTP_QR_BOX_SIZE pixels
+per module (well under 1 KB) or as SVG (one path, ~15 KB but resolution independent).
+Either way they go in a small LRU cache keyed on (user, secret, format), so reloading
+the setup page doesn't re-encode the image. The image is served by its own endpoint
+(auth.twofa_qr) rather than inlined as a data URL. The cache key hashes the secret, so
+entries for a replaced secret simply age out.
+"""
+import hashlib
+import threading
+from collections import OrderedDict
+from io import BytesIO
+import pyotp
+from flask import current_app, has_app_context
+
+DEFAULT_ISSUER = "TripleTsRewards"
+QR_FORMATS = {"svg": "image/svg+xml", "png": "image/png"}
+
+
+def totp_uri(username, secret, issuer=None):
+    """otpauth://totp/ provisioning URI for an authenticator app."""
+    if issuer is None:
+        issuer = current_app.config.get("TOTP_ISSUER", DEFAULT_ISSUER) if has_app_context() else DEFAULT_ISSUER
+    return pyotp.TOTP(secret).provisioning_uri(name=username, issuer_name=issuer)
+
+def secret_fingerprint(secret):
+    """Short, non-reversible tag for a secret (cache key, ETag and image URL version)."""
+    return hashlib.sha256(secret.encode("utf-8")).hexdigest()[:16]
+
+def render_qr(uri, fmt="png", box_size=6, border=2):
+    """QR code for uri as SVG or PNG bytes."""
+    import qrcode # Only needed when a QR code is actually drawn
+    qr = qrcode.QRCode(error_correction=qrcode.constants.ERROR_CORRECT_L, box_size=box_size, border=border)
+    qr.add_data(uri)
+    qr.make(fit=True)
+    buf = BytesIO()
+    if fmt == "svg":
+        from qrcode.image.svg import SvgPathImage
+        qr.make_image(image_factory=SvgPathImage).save(buf)
+    else:
+        # 1-bit image: the smallest PNG a two-colour code can be
+        qr.make_image(fill_color="black", back_color="white").get_image().convert("1").save(buf, format="PNG", optimize=True)
+    return buf.getvalue()
+
+
+class QrCache:
+    """Bounded LRU of rendered setup QR codes, per process."""
+
+    def __init__(self, max_entries=256):
+        self.max_entries = max_entries
+        self._entries = OrderedDict() # (user_code, fingerprint, fmt) -> bytes
+        self._lock = threading.Lock()
+
+    def get(self, user_code, username, secret, fmt="png"):
+        """The QR image bytes for this user's current secret, rendering it on a miss."""
+        key = (user_code, secret_fingerprint(secret), fmt)
+        with self._lock:
+            image = self._entries.get(key)
+            if image is not None:
+                self._entries.move_to_end(key)
+                return image
+        config = current_app.config
+        image = render_qr(totp_uri(username, secret), fmt, box_size=config.get("TOTP_QR_BOX_SIZE", 6))
+        with self._lock:
+            self._entries[key] = image
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return image
+
+
+qr_cache = QrCache()
@@ -10,4 +10,73 @@ class Config:
     SQLALCHEMY_ENGINE_OPTIONS = {
         "pool_pre_ping": True,  # Checks connection validity before use
         "pool_recycle": 3600    # Recycles connections after 1 hour (3600 seconds)
-    }
\ No newline at end of file
+    }
+    # Background jobs (app.start_scheduler): run by the one process per host that takes <instance>/scheduler.lock
+    SCHEDULER_ENABLED = os.getenv('SCHEDULER_ENABLED', '1') not in ('0', 'false', 'False')
+    # Write-behind audit logging (common/audit_writer.py)
+    AUDIT_WRITE_MODE = os.getenv('AUDIT_WRITE_MODE', 'async')          # 'async' or 'sync'
+    AUDIT_FLUSH_INTERVAL = float(os.getenv('AUDIT_FLUSH_INTERVAL', 1.0)) # Seconds between flushes
+    AUDIT_BATCH_SIZE = int(os.getenv('AUDIT_BATCH_SIZE', 200))          # Rows per multi-row INSERT
+    AUDIT_QUEUE_MAX = int(os.getenv('AUDIT_QUEUE_MAX', 10000))          # Beyond this, events are written synchronously
+    AUDIT_RETRY_MAX_DELAY = float(os.getenv('AUDIT_RETRY_MAX_DELAY', 30.0)) # Longest backoff between retries of a failed batch
+    # Audit log retention (common/audit_archive.py)
+    AUDIT_RETENTION_DAYS = int(os.getenv('AUDIT_RETENTION_DAYS', 365))           # Older rows move to the archive
+    AUDIT_ARCHIVE_DIR = os.getenv('AUDIT_ARCHIVE_DIR')                           # Defaults to <instance>/audit_archive
+    AUDIT_ARCHIVE_BATCH_SIZE = int(os.getenv('AUDIT_ARCHIVE_BATCH_SIZE', 5000)) # Rows moved per transaction
+    # Audit log search (common/audit_search.py): 'auto', 'fulltext' (MySQL) or 'tokens'
+    AUDIT_SEARCH_BACKEND = os.getenv('AUDIT_SEARCH_BACKEND', 'auto')
+    # Monthly sponsor invoices (common/invoices.py)
+    INVOICE_DIR = os.getenv('INVOICE_DIR')                        # Defaults to <instance>/invoices
+    INVOICE_FORMAT = os.getenv('INVOICE_FORMAT', 'pdf')          # 'pdf' (Pillow) or 'html'
+    INVOICE_WORKERS = int(os.getenv('INVOICE_WORKERS', 0)) or None # Render processes; defaults to the CPU count
+    # Analytics exports (common/analytics_export.py)
+    ANALYTICS_EXPORT_DIR = os.getenv('ANALYTICS_EXPORT_DIR')                  # Defaults to <instance>/analytics
+    ANALYTICS_EXPORT_FORMAT = os.getenv('ANALYTICS_EXPORT_FORMAT', 'parquet') # 'parquet', 'arrow' or 'csv' (csv.gz without pyarrow)
+    ANALYTICS_EXPORT_ID_MARGIN = int(os.getenv('ANALYTICS_EXPORT_ID_MARGIN', 5000)) # Ids below the watermark re-read each run, for rows that committed late
+    # Per-request SQL instrumentation (common/sql_metrics.py)
+    SQL_METRICS_ENABLED = os.getenv('SQL_METRICS_ENABLED', '1') not in ('0', 'false', 'False')
+    SQL_N_PLUS_ONE_THRESHOLD = int(os.getenv('SQL_N_PLUS_ONE_THRESHOLD', 10)) # Warn when one statement repeats more often
+    SQL_METRICS_SAMPLES = int(os.getenv('SQL_METRICS_SAMPLES', 500))          # Recent requests kept per endpoint
+    # Identity cache for load_user / impersonation (common/identity_cache.py)
+    IDENTITY_CACHE_TTL = float(os.getenv('IDENTITY_CACHE_TTL', 10))     # Seconds a snapshot is kept (changes are seen at once via USERS.IDENTITY_VERSION). 0 disables
+    IDENTITY_CACHE_SIZE = int(os.getenv('IDENTITY_CACHE_SIZE', 10000))  # Users kept per worker process
+    # Password hashing (common/password_hashing.py); pick the cost with calibrate_bcrypt.py
+    BCRYPT_LOG_ROUNDS = int(os.getenv('BCRYPT_LOG_ROUNDS', 12))                          # Older hashes are upgraded on login
+    PASSWORD_HASH_WORKERS = int(os.getenv('PASSWORD_HASH_WORKERS', 0)) or None            # Concurrent hashes; defaults to the CPU count
+    PASSWORD_HASH_QUEUE_MAX = int(os.getenv('PASSWORD_HASH_QUEUE_MAX', 32))               # Waiting hashes before rejecting with 503
+    PASSWORD_HASH_QUEUE_TIMEOUT = float(os.getenv('PASSWORD_HASH_QUEUE_TIMEOUT', 5.0))    # Seconds to wait for a queue slot
+    PASSWORD_HASH_HOST_SLOTS = int(os.getenv('PASSWORD_HASH_HOST_SLOTS', 0)) or None      # Concurrent hashes across all workers on the host; defaults to half the CPUs
+    PASSWORD_HASH_HOST_QUEUE = int(os.getenv('PASSWORD_HASH_HOST_QUEUE', 0)) or None      # Requests waiting for a host slot before 503; defaults to HOST_SLOTS
+    # USER_CODE allocation (common/id_allocator.py)
+    USER_CODE_BLOCK_SIZE = int(os.getenv('USER_CODE_BLOCK_SIZE', 20))  # Codes each process reserves at a time
+    # Reverse proxies/load balancers in front of the app; their X-Forwarded-For/-Proto are trusted (ProxyFix)
+    TRUSTED_PROXY_COUNT = int(os.getenv('TRUSTED_PROXY_COUNT', 0))  # 0: use the socket address (gunicorn serving clients directly)
+    # Sign-in rate limits and failure audit aggregation (common/login_throttle.py)
+    LOGIN_RATE_LIMIT_ENABLED = os.getenv('LOGIN_RATE_LIMIT_ENABLED', '1') not in ('0', 'false', 'False')
+    LOGIN_RATE_WINDOW = int(os.getenv('LOGIN_RATE_WINDOW', 300))                  # Sliding window, seconds
+    LOGIN_RATE_LIMIT_PER_IP = int(os.getenv('LOGIN_RATE_LIMIT_PER_IP', 30))       # Failed attempts per window from one IP
+    LOGIN_RATE_LIMIT_PER_USER = int(os.getenv('LOGIN_RATE_LIMIT_PER_USER', 10))   # Failed attempts per window for one username from one IP
+    LOGIN_RATE_LIMIT_BACKEND_URL = os.getenv('LOGIN_RATE_LIMIT_BACKEND_URL')      # redis://... to share counters; per process otherwise
+    LOGIN_FAILURE_AUDIT_INTERVAL = int(os.getenv('LOGIN_FAILURE_AUDIT_INTERVAL', 60)) # Seconds repeated failures are collapsed into one row
+    # 2FA setup (common/totp.py)
+    TOTP_ISSUER = os.getenv('TOTP_ISSUER', 'TripleTsRewards')       # Account label shown in authenticator apps
+    TOTP_QR_FORMAT = os.getenv('TOTP_QR_FORMAT', 'png')            # 'png' (1-bit, smallest) or 'svg'
+    TOTP_QR_BOX_SIZE = int(os.getenv('TOTP_QR_BOX_SIZE', 6))       # PNG pixels per QR module (6 fills the 220px setup image)
+    # Jinja bytecode cache and navbar/sidebar fragment cache (common/template_cache.py)
+    TEMPLATE_BYTECODE_CACHE = os.getenv('TEMPLATE_BYTECODE_CACHE', '1') not in ('0', 'false', 'False')
+    TEMPLATE_BYTECODE_CACHE_DIR = os.getenv('TEMPLATE_BYTECODE_CACHE_DIR')   # Defaults to <instance>/jinja_cache; filled by precompile_templates.py
+    FRAGMENT_CACHE_ENABLED = os.getenv('FRAGMENT_CACHE_ENABLED', '1') not in ('0', 'false', 'False') # Always off while templates auto-reload
+    FRAGMENT_CACHE_SIZE = int(os.getenv('FRAGMENT_CACHE_SIZE', 256))         # Rendered fragments kept per worker process
+    DEFAULT_LOCALE = os.getenv('DEFAULT_LOCALE', 'en')                       # Fragment cache key when g.locale isn't set
+    # Hashed, minified, precompressed static files built by build_assets.py (common/static_assets.py)
+    STATIC_ASSETS_ENABLED = os.getenv('STATIC_ASSETS_ENABLED', '1') not in ('0', 'false', 'False') # Always off in debug mode
+    STATIC_MANIFEST = os.getenv('STATIC_MANIFEST')                           # Defaults to static/dist/manifest.json
+    STATIC_IMMUTABLE_MAX_AGE = int(os.getenv('STATIC_IMMUTABLE_MAX_AGE', 31536000)) # Seconds, for content-hashed files
+    STATIC_PALETTE_MAX_ERROR = float(os.getenv('STATIC_PALETTE_MAX_ERROR', 8.0)) # RMS error allowed for 256-colour PNGs; 0 = lossless only
+    # Expired failed-attempt lockouts (common/lockouts.py)
+    LOCKOUT_CLEANUP_MINUTES = int(os.getenv('LOCKOUT_CLEANUP_MINUTES', 5))        # How often the cleanup job runs
+    LOCKOUT_CLEANUP_BATCH_SIZE = int(os.getenv('LOCKOUT_CLEANUP_BATCH_SIZE', 500)) # Accounts cleared per transaction
+    # Bulk driver import (common/bulk_import.py)
+    BULK_IMPORT_MAX_ROWS = int(os.getenv('BULK_IMPORT_MAX_ROWS', 20000))              # Rows per uploaded file
+    BULK_IMPORT_BATCH_SIZE = int(os.getenv('BULK_IMPORT_BATCH_SIZE', 1000))           # Rows per executemany
+    BULK_IMPORT_WORKERS = int(os.getenv('BULK_IMPORT_WORKERS', 0)) or None            # Hashing processes; defaults to the CPU count
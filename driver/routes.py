@@ -3,9 +3,9 @@
 from flask import Blueprint, render_template, request, redirect, url_for, flash, session
 from flask_login import login_user, logout_user, login_required, current_user
 from common.decorators import role_required
-from common.logging import DRIVER_POINTS
+from common.logging import DRIVER_POINTS, request_ip
+from common.login_throttle import login_throttle
 from models import Role, AuditLog, User, db, Sponsor, DriverApplication, Address, StoreSettings, Driver, DriverSponsorAssociation, CartItem, Purchase
-from extensions import bcrypt
 
 # Blueprint for driver-related routes
 driver_bp = Blueprint('driver_bp', __name__, template_folder="../templates")
@@ -18,15 +18,21 @@ def login():
     if request.method == 'POST':
         username = request.form['username']
         password = request.form['password']
+        ip = request_ip()
+        login_throttle.check(username, ip)
         user = User.query.filter_by(USERNAME=username).first()
 
         if user and user.check_password(password):
+            db.session.commit() # Keeps a re-hashed password
+            login_throttle.succeeded(username, ip)
             login_user(user)
             flash("Login successful!", "success")
             # Redirect to the multi-sponsor dashboard
             return redirect(url_for('driver_bp.dashboard'))
         else:
             flash("Invalid username or password", "danger")
+            login_throttle.failed(username, ip, "bad_password" if user else "unknown_user",
+                                  subject_id=user.USER_CODE if user else None)
 
     # Use the driver-specific login template if it exists, otherwise a common one
     return render_template('driver/login.html') # Assuming driver/login.html exists
@@ -36,13 +42,17 @@ def login():
 @role_required(Role.DRIVER)
 def dashboard():
     # Fetch associations for the multi-sponsor view
-    associations = DriverSponsorAssociation.query.filter_by(driver_id=current_user.USER_CODE).all()
-    # Add sponsor names to associations for display
-    for assoc in associations:
-        sponsor_user = User.query.get(assoc.sponsor_id)
-        assoc.sponsor_name = f"{sponsor_user.FNAME} {sponsor_user.LNAME}" if sponsor_user else "Unknown Sponsor"
-        sponsor_profile = Sponsor.query.get(assoc.sponsor_id) # Fetch Sponsor profile too
-        assoc.org_name = sponsor_profile.ORG_NAME if sponsor_profile else "N/A" # Use Sponsor profile for ORG_NAME
+    # Sponsor names and ORG_NAME come back in the same query (no lookups per association)
+    rows = (db.session.query(DriverSponsorAssociation, User.FNAME, User.LNAME, Sponsor.ORG_NAME)
+            .outerjoin(User, User.USER_CODE == DriverSponsorAssociation.sponsor_id)
+            .outerjoin(Sponsor, Sponsor.SPONSOR_ID == DriverSponsorAssociation.sponsor_id)
+            .filter(DriverSponsorAssociation.driver_id == current_user.USER_CODE)
+            .all())
+    associations = []
+    for assoc, fname, lname, org_name in rows:
+        assoc.sponsor_name = f"{fname} {lname}" if fname is not None else "Unknown Sponsor"
+        assoc.org_name = org_name or "N/A"
+        associations.append(assoc)
 
     return render_template('driver/dashboard.html', user=current_user, associations=associations)
 
@@ -69,10 +79,10 @@ def select_store(sponsor_id):
 @driver_bp.route('/point_history')
 @role_required(Role.DRIVER)
 def point_history():
-    # This query remains the same, but contextually might need sponsor filtering later
+    # Served by the (SUBJECT_USER_ID, CREATED_AT) index instead of a LIKE scan over DETAILS
     events = AuditLog.query.filter(
-        AuditLog.EVENT_TYPE == DRIVER_POINTS,
-        AuditLog.DETAILS.like(f"%driver {current_user.USERNAME}%") # Make search slightly more specific
+        AuditLog.SUBJECT_USER_ID == current_user.USER_CODE,
+        AuditLog.EVENT_TYPE == DRIVER_POINTS
     ).order_by(AuditLog.CREATED_AT.desc()).all()
     return render_template("driver/point_history.html", events=events)
 
@@ -155,7 +165,7 @@ def change_password():
         confirm_password = request.form.get('confirm_password')
 
         # Verify current password
-        if not current_user.PASS or not bcrypt.check_password_hash(current_user.PASS, current_password):
+        if not current_user.check_password(current_password):
             flash('Current password is incorrect.', 'danger')
             return redirect(url_for('driver_bp.change_password'))
 
@@ -189,11 +199,15 @@ def change_password():
 @role_required(Role.DRIVER)
 def apply_driver():
     # Fetch approved sponsors
-    sponsors = Sponsor.query.filter_by(STATUS="Approved").all()
+    rows = (db.session.query(Sponsor, User.FNAME, User.LNAME)
+            .outerjoin(User, User.USER_CODE == Sponsor.SPONSOR_ID)
+            .filter(Sponsor.STATUS == "Approved")
+            .all())
     # Add user info to sponsors for display
-    for sponsor in sponsors:
-        sponsor_user = User.query.get(sponsor.SPONSOR_ID)
-        sponsor.display_name = f"{sponsor_user.FNAME} {sponsor_user.LNAME} ({sponsor.ORG_NAME})" if sponsor_user else sponsor.ORG_NAME
+    sponsors = []
+    for sponsor, fname, lname in rows:
+        sponsor.display_name = f"{fname} {lname} ({sponsor.ORG_NAME})" if fname is not None else sponsor.ORG_NAME
+        sponsors.append(sponsor)
 
 
     if request.method == "POST":
@@ -0,0 +1,28 @@
+import argparse
+from app import create_app
+from common.analytics_export import DATASETS, run_analytics_export, export_dir, resolve_format
+
+def main():
+    parser = argparse.ArgumentParser(description="Export purchases, point ledger, logins, balances and users as partitioned columnar files.")
+    parser.add_argument("datasets", nargs="*", help=f"Any of {', '.join(DATASETS)}. Defaults to every dataset.")
+    parser.add_argument("--format", choices=["parquet", "arrow", "csv"], default=None, help="Defaults to ANALYTICS_EXPORT_FORMAT.")
+    parser.add_argument("--full", action="store_true", help="Ignore the saved watermarks and export everything again.")
+    args = parser.parse_args()
+    unknown = [name for name in args.datasets if name not in DATASETS]
+    if unknown:
+        parser.error(f"Unknown dataset(s): {', '.join(unknown)}")
+
+    app = create_app()
+    with app.app_context():
+        fmt = resolve_format(args.format)
+        print(f"--- Starting Analytics Export ({fmt}) ---")
+        results = run_analytics_export(args.datasets or None, fmt=fmt, full=args.full)
+        if results is None:
+            raise SystemExit("❌ Another analytics export is running; try again when it has finished.")
+        for name, (rows, files) in results.items():
+            print(f"  - {name}: {rows} rows in {files} files")
+        print(f"✅ Export written to {export_dir()}.")
+        print("\n--- Analytics Export Complete ---")
+
+if __name__ == '__main__':
+    main()
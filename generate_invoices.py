@@ -0,0 +1,30 @@
+import argparse
+import time
+from app import create_app
+from common.invoices import generate_invoices, previous_period, period_bounds, invoice_dir
+
+def main():
+    parser = argparse.ArgumentParser(description="Generate monthly sponsor invoices from PURCHASES.")
+    parser.add_argument("--period", default=None, help="YYYY-MM. Defaults to the previous month.")
+    parser.add_argument("--workers", type=int, default=None, help="Render processes. Defaults to INVOICE_WORKERS / CPU count.")
+    parser.add_argument("--format", choices=["pdf", "html"], default=None, help="Defaults to INVOICE_FORMAT.")
+    parser.add_argument("--force", action="store_true", help="Re-render invoices that were already generated.")
+    args = parser.parse_args()
+
+    period = args.period or previous_period()
+    try:
+        period_bounds(period)
+    except ValueError:
+        parser.error(f"Invalid period '{period}', expected YYYY-MM.")
+
+    app = create_app()
+    with app.app_context():
+        print(f"--- Starting Invoice Generation for {period} ---")
+        started = time.perf_counter()
+        rendered, skipped = generate_invoices(period, workers=args.workers, fmt=args.format, force=args.force)
+        elapsed = time.perf_counter() - started
+        print(f"✅ Rendered {rendered} invoices in {elapsed:.1f}s ({skipped} already generated) into {invoice_dir()}.")
+        print("\n--- Invoice Generation Complete ---")
+
+if __name__ == '__main__':
+    main()
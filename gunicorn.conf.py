@@ -0,0 +1,24 @@
+# gunicorn.conf.py
+# Picked up automatically when gunicorn is started from the repository root, e.g.
+#   gunicorn --workers 3 --bind 0.0.0.0:8000 "app:create_app()"
+import os
+
+
+def on_starting(server):
+    # Workers are sync (one request each), so bcrypt is capped across the whole host rather than
+    # per worker (common/password_hashing.py). Unless set explicitly, a third of the workers may
+    # hash at once and as many more may wait for them; later sign-ins get a 503 straight away, so
+    # a login storm can never occupy more than two thirds of the workers. Runs in the master before
+    # any worker imports config.py; keep PASSWORD_HASH_HOST_SLOTS + PASSWORD_HASH_HOST_QUEUE below
+    # --workers when setting them by hand.
+    slots = max(1, server.cfg.workers // 3)
+    os.environ.setdefault("PASSWORD_HASH_HOST_SLOTS", str(slots))
+    os.environ.setdefault("PASSWORD_HASH_HOST_QUEUE", str(slots))
+
+
+def post_worker_init(worker):
+    # Background jobs run in exactly one worker per host: the first to take the scheduler lock.
+    # If that worker exits, the lock is released and the worker gunicorn starts in its place takes over.
+    from app import start_scheduler
+    if start_scheduler(worker.wsgi):
+        worker.log.info("Background job scheduler running in worker %s", worker.pid)
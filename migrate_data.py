@@ -1,134 +1,114 @@
+import argparse
 import sys
+from sqlalchemy import select, insert, update, exists, literal, inspect, func, table, column
 from app import create_app
-from models import db, User, Sponsor, Driver, StoreSettings, CartItem, DriverSponsorAssociation, Role
-from sqlalchemy.exc import IntegrityError
+from models import db, Sponsor, Driver, StoreSettings, CartItem, DriverSponsorAssociation, Role
+from common.data_migrations import KeysetStep, run_steps
 
 # --- CONFIGURATION ---
-DEFAULT_SPONSOR_ID = 6 
+DEFAULT_SPONSOR_ID = 6
+DEFAULT_BATCH_SIZE = 5000
 # --- END CONFIGURATION ---
 
-app = create_app()
 
-def migrate_driver_data(default_sponsor_id):
+def driver_association_step(default_sponsor_id):
     """
-    Finds all valid drivers, reads their old point totals, and creates a new
-    DriverSponsorAssociation record to link them to the default sponsor.
+    Links every driver to the default sponsor, carrying over the old USERS.POINTS total
+    (when that legacy column still exists) as the association balance.
     """
-    print("Migrating driver points and associations...")
-    
-    # --- Start of Fix ---
-    # This query now joins User and Driver to ensure we only get valid drivers
-    # who have a profile in both tables.
-    drivers_to_migrate = db.session.query(
-        User.USER_CODE, User.POINTS
-    ).join(
-        Driver, User.USER_CODE == Driver.DRIVER_ID
-    ).filter(
-        User.USER_TYPE == Role.DRIVER
-    ).all()
-    # --- End of Fix ---
-    
-    migrated_count = 0
-    for driver_code, old_points in drivers_to_migrate:
-        existing_assoc = DriverSponsorAssociation.query.get((driver_code, default_sponsor_id))
-        if existing_assoc:
-            print(f"  - Association for driver {driver_code} already exists. Skipping.")
-            continue
-
-        new_association = DriverSponsorAssociation(
-            driver_id=driver_code,
-            sponsor_id=default_sponsor_id,
-            points=old_points or 0
+    # Lightweight table: POINTS is no longer on the User model
+    has_points = "POINTS" in {c["name"] for c in inspect(db.engine).get_columns("USERS")}
+    users = table("USERS", column("USER_CODE"), column("USER_TYPE"), *([column("POINTS")] if has_points else []))
+    points = func.coalesce(users.c.POINTS, 0) if has_points else literal(0)
+
+    def not_linked():
+        return ~exists().where(DriverSponsorAssociation.driver_id == Driver.DRIVER_ID,
+                               DriverSponsorAssociation.sponsor_id == default_sponsor_id)
+
+    def pending():
+        return [exists().where(users.c.USER_CODE == Driver.DRIVER_ID, users.c.USER_TYPE == Role.DRIVER), not_linked()]
+
+    def apply(lo, hi):
+        return insert(DriverSponsorAssociation).from_select(
+            ["driver_id", "sponsor_id", "points"],
+            select(Driver.DRIVER_ID, literal(default_sponsor_id), points)
+            .join(users, users.c.USER_CODE == Driver.DRIVER_ID)
+            .where(Driver.DRIVER_ID.between(lo, hi), users.c.USER_TYPE == Role.DRIVER, not_linked()),
         )
-        db.session.add(new_association)
-        migrated_count += 1
-        print(f"  - Migrating Driver {driver_code} with {old_points} points.")
 
-    if migrated_count > 0:
-        try:
-            db.session.commit()
-            print(f"✅ Successfully migrated {migrated_count} valid drivers.")
-        except Exception as e:
-            db.session.rollback()
-            print(f"❌ Error migrating drivers: {e}")
-    else:
-        print("No new valid drivers needed migration.")
+    return KeysetStep(f"driver_associations:sponsor={default_sponsor_id}",
+                      "Migrating driver points and associations", Driver.DRIVER_ID, pending, apply)
 
+def sponsor_settings_step():
+    """Creates default store settings for every sponsor that has none."""
+    def pending():
+        return [~exists().where(StoreSettings.sponsor_id == Sponsor.SPONSOR_ID)]
 
-def migrate_sponsor_settings():
-    """
-    Creates default store settings for all existing sponsors who don't have one.
-    """
-    print("\nCreating default store settings for sponsors...")
-    
-    sponsors = Sponsor.query.all()
-    created_count = 0
-    for sponsor in sponsors:
-        existing_settings = StoreSettings.query.filter_by(sponsor_id=sponsor.SPONSOR_ID).first()
-        if existing_settings:
-            print(f"  - Settings for sponsor {sponsor.SPONSOR_ID} already exist. Skipping.")
-            continue
-            
-        new_settings = StoreSettings(
-            sponsor_id=sponsor.SPONSOR_ID,
-            ebay_category_id='2984',
-            point_ratio=10
+    def apply(lo, hi):
+        return insert(StoreSettings).from_select(
+            ["sponsor_id", "ebay_category_id", "point_ratio"],
+            select(Sponsor.SPONSOR_ID, literal("2984"), literal(10))
+            .where(Sponsor.SPONSOR_ID.between(lo, hi), *pending()),
         )
-        db.session.add(new_settings)
-        created_count += 1
-        print(f"  - Creating settings for Sponsor {sponsor.SPONSOR_ID}.")
 
-    if created_count > 0:
-        try:
-            db.session.commit()
-            print(f"✅ Successfully created settings for {created_count} sponsors.")
-        except Exception as e:
-            db.session.rollback()
-            print(f"❌ Error creating sponsor settings: {e}")
-    else:
-        print("No new sponsor settings needed.")
+    return KeysetStep("sponsor_settings", "Creating default store settings for sponsors",
+                      Sponsor.SPONSOR_ID, pending, apply)
 
+def cart_items_step(default_sponsor_id):
+    """Assigns cart items from before per-sponsor stores to the default sponsor."""
+    def pending():
+        return [CartItem.sponsor_id.is_(None)]
 
-def migrate_cart_items(default_sponsor_id):
-    """
-    Updates all existing cart items to be associated with the default sponsor.
-    """
-    print("\nUpdating existing cart items...")
-    
-    items_to_update = CartItem.query.filter(CartItem.sponsor_id.is_(None)).all()
-    
-    if not items_to_update:
-        print("No cart items needed updating.")
-        return
-
-    for item in items_to_update:
-        item.sponsor_id = default_sponsor_id
-        print(f"  - Updating cart item {item.id} for user {item.user_id}.")
-    
-    try:
-        db.session.commit()
-        print(f"✅ Successfully updated {len(items_to_update)} cart items.")
-    except Exception as e:
-        db.session.rollback()
-        print(f"❌ Error updating cart items: {e}")
+    def apply(lo, hi):
+        return (update(CartItem)
+                .where(CartItem.id.between(lo, hi), *pending())
+                .values(sponsor_id=default_sponsor_id))
+
+    return KeysetStep(f"cart_items:sponsor={default_sponsor_id}", "Updating existing cart items",
+                      CartItem.id, pending, apply)
 
 
 def main():
+    parser = argparse.ArgumentParser(description="Migrate drivers, sponsor settings and cart items to per-sponsor stores.")
+    parser.add_argument("--sponsor-id", type=int, default=DEFAULT_SPONSOR_ID, help="Default sponsor for existing drivers and carts.")
+    parser.add_argument("--batch-size", type=int, default=DEFAULT_BATCH_SIZE, help="Keys per batch (one commit each).")
+    parser.add_argument("--dry-run", action="store_true", help="Only count the rows each step would migrate.")
+    parser.add_argument("--restart", action="store_true", help="Ignore an interrupted run's checkpoints and scan from the first key.")
+    args = parser.parse_args()
+
+    app = create_app()
     with app.app_context():
-        default_sponsor = db.session.get(Sponsor, DEFAULT_SPONSOR_ID)
+        default_sponsor = db.session.get(Sponsor, args.sponsor_id)
         if not default_sponsor:
-            print(f"FATAL ERROR: The default sponsor with USER_CODE {DEFAULT_SPONSOR_ID} could not be found.")
+            print(f"FATAL ERROR: The default sponsor with USER_CODE {args.sponsor_id} could not be found.")
             print("Please check the ID and try again.")
             sys.exit(1)
-        
-        print("--- Starting Data Migration ---")
-        print(f"Using default sponsor: {default_sponsor.ORG_NAME} (ID: {DEFAULT_SPONSOR_ID})")
-        
-        migrate_driver_data(DEFAULT_SPONSOR_ID)
-        migrate_sponsor_settings()
-        migrate_cart_items(DEFAULT_SPONSOR_ID)
-        
+
+        print(f"--- Starting Data Migration{' (dry run)' if args.dry_run else ''} ---")
+        print(f"Using default sponsor: {default_sponsor.ORG_NAME} (ID: {args.sponsor_id})")
+
+        steps = [
+            driver_association_step(args.sponsor_id),
+            sponsor_settings_step(),
+            cart_items_step(args.sponsor_id),
+        ]
+        try:
+            reports = run_steps(steps, batch_size=args.batch_size, dry_run=args.dry_run, restart=args.restart)
+        except Exception as e:
+            db.session.rollback()
+            print(f"❌ Migration stopped: {e}")
+            print("Committed batches are kept; run again to resume from the last checkpoint.")
+            sys.exit(1)
+
+        print()
+        for report in reports:
+            if report.status == "dry-run":
+                print(f"  {report.name}: {report.rows} rows to migrate")
+            else:
+                print(f"✅ {report.name}: {report.rows} rows in {report.batches} batches, "
+                      f"{report.elapsed:.1f}s ({report.rows_per_second:,.0f} rows/s)")
+
         print("\n--- Data Migration Complete ---")
 
 if __name__ == '__main__':
-    main()
\ No newline at end of file
+    main()
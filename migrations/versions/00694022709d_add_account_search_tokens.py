@@ -0,0 +1,40 @@
+"""Add USER_SEARCH_TOKENS for account search and an (IS_ACTIVE, USER_CODE) index on USERS
+
+Revision ID: 00694022709d
+Revises: 994c722f3945
+Create Date: 2025-11-04 15:02:11.408236
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '00694022709d'
+down_revision = '994c722f3945'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('USER_SEARCH_TOKENS',
+    sa.Column('TOKEN', sa.String(length=64), nullable=False),
+    sa.Column('USER_CODE', sa.Integer(), nullable=False),
+    sa.PrimaryKeyConstraint('TOKEN', 'USER_CODE')
+    )
+    with op.batch_alter_table('USER_SEARCH_TOKENS', schema=None) as batch_op:
+        batch_op.create_index(batch_op.f('ix_USER_SEARCH_TOKENS_USER_CODE'), ['USER_CODE'], unique=False)
+
+    with op.batch_alter_table('USERS', schema=None) as batch_op:
+        batch_op.create_index('ix_users_active_code', ['IS_ACTIVE', 'USER_CODE'], unique=False)
+    # Existing accounts are indexed by rebuild_account_index.py
+
+
+def downgrade():
+    with op.batch_alter_table('USERS', schema=None) as batch_op:
+        batch_op.drop_index('ix_users_active_code')
+
+    with op.batch_alter_table('USER_SEARCH_TOKENS', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_USER_SEARCH_TOKENS_USER_CODE'))
+
+    op.drop_table('USER_SEARCH_TOKENS')
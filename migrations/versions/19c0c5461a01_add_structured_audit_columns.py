@@ -0,0 +1,42 @@
+"""Add structured columns and composite indexes to AUDIT_LOG
+
+Revision ID: 19c0c5461a01
+Revises: 28fb3fc03c31
+Create Date: 2025-10-28 14:02:11.408213
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '19c0c5461a01'
+down_revision = '28fb3fc03c31'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('AUDIT_LOG', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('ACTOR_USER_ID', sa.Integer(), nullable=True))
+        batch_op.add_column(sa.Column('SUBJECT_USER_ID', sa.Integer(), nullable=True))
+        batch_op.add_column(sa.Column('SPONSOR_ID', sa.Integer(), nullable=True))
+        batch_op.add_column(sa.Column('IP', sa.String(length=45), nullable=True))
+        batch_op.add_column(sa.Column('PAYLOAD', sa.JSON(), nullable=True))
+        batch_op.create_index('ix_audit_type_created', ['EVENT_TYPE', 'CREATED_AT'], unique=False)
+        batch_op.create_index('ix_audit_sponsor_created', ['SPONSOR_ID', 'CREATED_AT'], unique=False)
+        batch_op.create_index('ix_audit_subject_created', ['SUBJECT_USER_ID', 'CREATED_AT'], unique=False)
+
+    # Existing rows are filled in afterwards by backfill_audit_log.py
+
+
+def downgrade():
+    with op.batch_alter_table('AUDIT_LOG', schema=None) as batch_op:
+        batch_op.drop_index('ix_audit_subject_created')
+        batch_op.drop_index('ix_audit_sponsor_created')
+        batch_op.drop_index('ix_audit_type_created')
+        batch_op.drop_column('PAYLOAD')
+        batch_op.drop_column('IP')
+        batch_op.drop_column('SPONSOR_ID')
+        batch_op.drop_column('SUBJECT_USER_ID')
+        batch_op.drop_column('ACTOR_USER_ID')
@@ -0,0 +1,32 @@
+"""Add DATA_MIGRATION_CHECKPOINTS for resumable batched data migrations
+
+Revision ID: 2caee05387de
+Revises: aa1bca3bbdc5
+Create Date: 2025-11-03 10:12:44.517302
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '2caee05387de'
+down_revision = 'aa1bca3bbdc5'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('DATA_MIGRATION_CHECKPOINTS',
+    sa.Column('name', sa.String(length=100), nullable=False),
+    sa.Column('last_key', sa.Integer(), nullable=True),
+    sa.Column('rows_done', sa.BigInteger(), nullable=False),
+    sa.Column('status', sa.String(length=20), nullable=False),
+    sa.Column('started_at', sa.DateTime(), nullable=False),
+    sa.Column('updated_at', sa.DateTime(), nullable=True),
+    sa.PrimaryKeyConstraint('name')
+    )
+
+
+def downgrade():
+    op.drop_table('DATA_MIGRATION_CHECKPOINTS')
@@ -0,0 +1,34 @@
+"""Add PURCHASES.rolled_up so checkout can roll up its own order without the global lock
+
+Revision ID: 314e0509d8c5
+Revises: 878fe556d97d
+Create Date: 2025-11-10 09:18:52.604117
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '314e0509d8c5'
+down_revision = '878fe556d97d'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('PURCHASES', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('rolled_up', sa.Boolean(), server_default=sa.false(), nullable=False))
+        batch_op.create_index('ix_purchases_rolled_up', ['rolled_up', 'id'], unique=False)
+
+    # Everything up to the old high-water mark is already in the rollups
+    purchases = sa.table('PURCHASES', sa.column('id', sa.Integer), sa.column('rolled_up', sa.Boolean))
+    state = sa.table('SALES_ROLLUP_STATE', sa.column('name', sa.String), sa.column('last_purchase_id', sa.Integer))
+    mark = sa.select(state.c.last_purchase_id).where(state.c.name == 'purchases').scalar_subquery()
+    op.execute(purchases.update().where(purchases.c.id <= mark).values(rolled_up=True))
+
+
+def downgrade():
+    with op.batch_alter_table('PURCHASES', schema=None) as batch_op:
+        batch_op.drop_index('ix_purchases_rolled_up')
+        batch_op.drop_column('rolled_up')
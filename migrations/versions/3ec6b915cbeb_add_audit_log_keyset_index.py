@@ -0,0 +1,26 @@
+"""Add (CREATED_AT, EVENT_ID) index for audit log keyset pagination
+
+Revision ID: 3ec6b915cbeb
+Revises: 19c0c5461a01
+Create Date: 2025-10-29 09:41:27.153840
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '3ec6b915cbeb'
+down_revision = '19c0c5461a01'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('AUDIT_LOG', schema=None) as batch_op:
+        batch_op.create_index('ix_audit_created_id', ['CREATED_AT', 'EVENT_ID'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('AUDIT_LOG', schema=None) as batch_op:
+        batch_op.drop_index('ix_audit_created_id')
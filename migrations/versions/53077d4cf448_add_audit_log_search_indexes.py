@@ -0,0 +1,39 @@
+"""Add audit log search: FULLTEXT on DETAILS (MySQL), token index table and IP index
+
+Revision ID: 53077d4cf448
+Revises: 3ec6b915cbeb
+Create Date: 2025-10-30 16:20:53.771904
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '53077d4cf448'
+down_revision = '3ec6b915cbeb'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('AUDIT_SEARCH_TOKENS',
+    sa.Column('TOKEN', sa.String(length=64), nullable=False),
+    sa.Column('EVENT_ID', sa.Integer(), nullable=False),
+    sa.PrimaryKeyConstraint('TOKEN', 'EVENT_ID')
+    )
+    with op.batch_alter_table('AUDIT_LOG', schema=None) as batch_op:
+        batch_op.create_index('ix_audit_ip_created', ['IP', 'CREATED_AT'], unique=False)
+
+    if op.get_bind().dialect.name == 'mysql':
+        op.create_index('ix_audit_details_ft', 'AUDIT_LOG', ['DETAILS'], unique=False, mysql_prefix='FULLTEXT')
+
+
+def downgrade():
+    if op.get_bind().dialect.name == 'mysql':
+        op.drop_index('ix_audit_details_ft', table_name='AUDIT_LOG')
+
+    with op.batch_alter_table('AUDIT_LOG', schema=None) as batch_op:
+        batch_op.drop_index('ix_audit_ip_created')
+
+    op.drop_table('AUDIT_SEARCH_TOKENS')
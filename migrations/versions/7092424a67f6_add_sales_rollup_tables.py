@@ -0,0 +1,64 @@
+"""Add daily sales rollup tables and their high-water mark
+
+Revision ID: 7092424a67f6
+Revises: 53077d4cf448
+Create Date: 2025-10-31 10:12:44.501327
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '7092424a67f6'
+down_revision = '53077d4cf448'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('SALES_SPONSOR_DAILY',
+    sa.Column('sponsor_id', sa.Integer(), nullable=False),
+    sa.Column('day', sa.Date(), nullable=False),
+    sa.Column('points', sa.BigInteger(), nullable=False),
+    sa.Column('items', sa.Integer(), nullable=False),
+    sa.Column('orders', sa.Integer(), nullable=False),
+    sa.PrimaryKeyConstraint('sponsor_id', 'day')
+    )
+    with op.batch_alter_table('SALES_SPONSOR_DAILY', schema=None) as batch_op:
+        batch_op.create_index('ix_sales_sponsor_day', ['day'], unique=False)
+
+    op.create_table('SALES_DRIVER_DAILY',
+    sa.Column('driver_id', sa.Integer(), nullable=False),
+    sa.Column('sponsor_id', sa.Integer(), nullable=False),
+    sa.Column('day', sa.Date(), nullable=False),
+    sa.Column('points', sa.BigInteger(), nullable=False),
+    sa.Column('items', sa.Integer(), nullable=False),
+    sa.Column('orders', sa.Integer(), nullable=False),
+    sa.PrimaryKeyConstraint('driver_id', 'sponsor_id', 'day')
+    )
+    with op.batch_alter_table('SALES_DRIVER_DAILY', schema=None) as batch_op:
+        batch_op.create_index('ix_sales_driver_sponsor_day', ['sponsor_id', 'day'], unique=False)
+        batch_op.create_index('ix_sales_driver_day', ['day'], unique=False)
+
+    state = op.create_table('SALES_ROLLUP_STATE',
+    sa.Column('name', sa.String(length=50), nullable=False),
+    sa.Column('last_purchase_id', sa.Integer(), nullable=False),
+    sa.Column('updated_at', sa.DateTime(), nullable=True),
+    sa.PrimaryKeyConstraint('name')
+    )
+    # Start at 0: run rollup_sales.py (or wait for the catch-up job) to roll up existing purchases
+    op.bulk_insert(state, [{'name': 'purchases', 'last_purchase_id': 0, 'updated_at': None}])
+
+
+def downgrade():
+    op.drop_table('SALES_ROLLUP_STATE')
+    with op.batch_alter_table('SALES_DRIVER_DAILY', schema=None) as batch_op:
+        batch_op.drop_index('ix_sales_driver_day')
+        batch_op.drop_index('ix_sales_driver_sponsor_day')
+
+    op.drop_table('SALES_DRIVER_DAILY')
+    with op.batch_alter_table('SALES_SPONSOR_DAILY', schema=None) as batch_op:
+        batch_op.drop_index('ix_sales_sponsor_day')
+
+    op.drop_table('SALES_SPONSOR_DAILY')
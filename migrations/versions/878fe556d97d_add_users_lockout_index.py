@@ -0,0 +1,26 @@
+"""Add an (IS_LOCKED_OUT, LOCKED_REASON, LOCKOUT_TIME) index on USERS
+
+Revision ID: 878fe556d97d
+Revises: 00694022709d
+Create Date: 2025-11-06 10:41:37.512904
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '878fe556d97d'
+down_revision = '00694022709d'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('USERS', schema=None) as batch_op:
+        batch_op.create_index('ix_users_lockout', ['IS_LOCKED_OUT', 'LOCKED_REASON', 'LOCKOUT_TIME'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('USERS', schema=None) as batch_op:
+        batch_op.drop_index('ix_users_lockout')
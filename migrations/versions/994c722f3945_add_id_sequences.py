@@ -0,0 +1,30 @@
+"""Add ID_SEQUENCES for block-allocated USER_CODEs
+
+Revision ID: 994c722f3945
+Revises: 2caee05387de
+Create Date: 2025-11-04 09:21:37.160844
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '994c722f3945'
+down_revision = '2caee05387de'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('ID_SEQUENCES',
+    sa.Column('name', sa.String(length=50), nullable=False),
+    sa.Column('next_value', sa.BigInteger(), nullable=False),
+    sa.PrimaryKeyConstraint('name')
+    )
+    # Start after the existing accounts
+    op.execute("INSERT INTO ID_SEQUENCES (name, next_value) SELECT 'USERS', COALESCE(MAX(USER_CODE), 0) + 1 FROM USERS")
+
+
+def downgrade():
+    op.drop_table('ID_SEQUENCES')
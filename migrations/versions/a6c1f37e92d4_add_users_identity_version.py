@@ -0,0 +1,26 @@
+"""Add USERS.IDENTITY_VERSION so every worker's identity cache sees user changes at once
+
+Revision ID: a6c1f37e92d4
+Revises: 314e0509d8c5
+Create Date: 2025-11-17 14:02:37.518240
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'a6c1f37e92d4'
+down_revision = '314e0509d8c5'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('USERS', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('IDENTITY_VERSION', sa.Integer(), server_default='0', nullable=False))
+
+
+def downgrade():
+    with op.batch_alter_table('USERS', schema=None) as batch_op:
+        batch_op.drop_column('IDENTITY_VERSION')
@@ -0,0 +1,49 @@
+"""Add INVOICES table and a purchase date index for monthly invoicing
+
+Revision ID: aa1bca3bbdc5
+Revises: 7092424a67f6
+Create Date: 2025-11-01 14:05:19.228410
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'aa1bca3bbdc5'
+down_revision = '7092424a67f6'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('INVOICES',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('sponsor_id', sa.Integer(), nullable=False),
+    sa.Column('period', sa.String(length=7), nullable=False),
+    sa.Column('points', sa.BigInteger(), nullable=False),
+    sa.Column('items', sa.Integer(), nullable=False),
+    sa.Column('point_ratio', sa.Integer(), nullable=False),
+    sa.Column('amount_cents', sa.BigInteger(), nullable=False),
+    sa.Column('status', sa.String(length=20), nullable=False),
+    sa.Column('file_path', sa.String(length=255), nullable=True),
+    sa.Column('created_at', sa.DateTime(), nullable=False),
+    sa.Column('rendered_at', sa.DateTime(), nullable=True),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('sponsor_id', 'period', name='uq_invoice_sponsor_period')
+    )
+    with op.batch_alter_table('INVOICES', schema=None) as batch_op:
+        batch_op.create_index('ix_invoice_period_status', ['period', 'status'], unique=False)
+
+    with op.batch_alter_table('PURCHASES', schema=None) as batch_op:
+        batch_op.create_index('ix_purchases_date_sponsor', ['purchase_date', 'sponsor_id'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('PURCHASES', schema=None) as batch_op:
+        batch_op.drop_index('ix_purchases_date_sponsor')
+
+    with op.batch_alter_table('INVOICES', schema=None) as batch_op:
+        batch_op.drop_index('ix_invoice_period_status')
+
+    op.drop_table('INVOICES')
@@ -1,11 +1,12 @@
 # models.py
 from datetime import datetime, timedelta
 from extensions import db, login_manager # Keep combined
-from extensions import bcrypt # Keep combined
+from common.password_hashing import password_hasher
+from common.totp import totp_uri
 import secrets
-from english_words import english_words_set
 import random
 import string
+from functools import lru_cache
 from flask_login import UserMixin
 # --- Merged Imports ---
 from sqlalchemy.orm import relationship # Keep relationship for associations
@@ -15,7 +16,23 @@ from itsdangerous import URLSafeTimedSerializer
 
 # Constants
 LOCKOUT_ATTEMPTS = 3
-WORDS = list(english_words_set)
+
+@lru_cache(maxsize=1)
+def temporary_password_words() -> list:
+    """The english_words list, loaded on first use rather than at import (it takes ~100 ms)."""
+    from english_words import english_words_set
+    return list(english_words_set)
+
+def new_temporary_password() -> str:
+    """Random temporary password: a word followed by six digits."""
+    words = temporary_password_words()
+    if not words: # Basic check in case english_words fails
+        word = ''.join(random.choice(string.ascii_lowercase) for _ in range(6))
+    else:
+        word = random.choice(words)
+    num_digits = 6
+    numbers = ''.join(secrets.choice(string.digits) for _ in range(num_digits))
+    return word + numbers
 
 # --- Model Definitions ---
 
@@ -25,6 +42,37 @@ class AuditLog(db.Model):
     EVENT_TYPE = db.Column(db.String(50), nullable=False)
     DETAILS = db.Column(db.Text, nullable=True)
     CREATED_AT = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+    # Structured columns so reports don't have to grep DETAILS.
+    # No foreign keys on purpose: audit rows must outlive the users they mention.
+    ACTOR_USER_ID = db.Column(db.Integer, nullable=True)   # Who performed the action
+    SUBJECT_USER_ID = db.Column(db.Integer, nullable=True) # Who the action was performed on
+    SPONSOR_ID = db.Column(db.Integer, nullable=True)      # Sponsor context (points, purchases)
+    IP = db.Column(db.String(45), nullable=True)           # Long enough for IPv6
+    PAYLOAD = db.Column(db.JSON, nullable=True)            # Extra event-specific fields
+
+    __table_args__ = (
+        db.Index('ix_audit_created_id', 'CREATED_AT', 'EVENT_ID'), # Keyset paging of the unfiltered viewer
+        db.Index('ix_audit_type_created', 'EVENT_TYPE', 'CREATED_AT'),
+        db.Index('ix_audit_sponsor_created', 'SPONSOR_ID', 'CREATED_AT'),
+        db.Index('ix_audit_subject_created', 'SUBJECT_USER_ID', 'CREATED_AT'),
+        db.Index('ix_audit_ip_created', 'IP', 'CREATED_AT'),
+        # Full-text search on MySQL; other databases use AuditSearchToken instead
+        db.Index('ix_audit_details_ft', 'DETAILS', mysql_prefix='FULLTEXT').ddl_if(dialect='mysql'),
+    )
+
+class AuditSearchToken(db.Model):
+    """Inverted index for audit log search where MySQL FULLTEXT isn't available (see common/audit_search.py)."""
+    __tablename__ = 'AUDIT_SEARCH_TOKENS'
+    TOKEN = db.Column(db.String(64), primary_key=True)
+    # No foreign key: postings are removed explicitly when rows are archived
+    EVENT_ID = db.Column(db.Integer, primary_key=True)
+
+class AccountSearchToken(db.Model):
+    """Inverted index for the admin account search (see common/account_search.py)."""
+    __tablename__ = 'USER_SEARCH_TOKENS'
+    TOKEN = db.Column(db.String(64), primary_key=True)
+    # No foreign key: postings are removed explicitly when a user changes or is deleted
+    USER_CODE = db.Column(db.Integer, primary_key=True, index=True)
 
 class Role:
     DRIVER = 'driver'
@@ -75,6 +123,13 @@ class User(db.Model, UserMixin):
     # Password reset fields (consistent)
     RESET_TOKEN = db.Column(db.String(255), nullable=True, index=True)
     RESET_TOKEN_CREATED_AT = db.Column(db.DateTime, nullable=True)
+    # Incremented by every change to the row (common/identity_cache.py checks it on each cache hit)
+    IDENTITY_VERSION = db.Column(db.Integer, default=0, server_default='0', nullable=False)
+
+    __table_args__ = (
+        db.Index('ix_users_active_code', 'IS_ACTIVE', 'USER_CODE'), # Keyset paging of active/disabled accounts
+        db.Index('ix_users_lockout', 'IS_LOCKED_OUT', 'LOCKED_REASON', 'LOCKOUT_TIME'), # Locked-users page and expired lockout cleanup
+    )
 
     # --- Relationships (combined) ---
     addresses = db.relationship('Address', backref='user', lazy=True, cascade="all, delete-orphan")
@@ -87,10 +142,11 @@ class User(db.Model, UserMixin):
 
 
     # --- Methods (combined) ---
-    def log_event(self, event_type: str, details: str = None):
-        """Logs an audit event related to this user."""
-        # Include USER_CODE/USERNAME in details automatically?
-        log_entry = AuditLog(EVENT_TYPE=event_type, DETAILS=details)
+    def log_event(self, event_type: str, details: str = None, **fields):
+        """Logs an audit event related to this user (recorded as the subject)."""
+        # fields may carry ACTOR_USER_ID, SPONSOR_ID, IP or PAYLOAD
+        log_entry = AuditLog(EVENT_TYPE=event_type, DETAILS=details,
+                             SUBJECT_USER_ID=self.USER_CODE, **fields)
         db.session.add(log_entry)
         # Consider committing audit logs separately or let the caller handle commits
         # db.session.commit()
@@ -99,27 +155,26 @@ class User(db.Model, UserMixin):
         """Hashes and sets the user's password."""
         if not password:
              raise ValueError("Password cannot be empty")
-        self.PASS = bcrypt.generate_password_hash(password).decode("utf-8")
+        self.PASS = password_hasher.hash(password)
 
     def admin_set_new_pass(self) -> str:
         """Generates a random password (word + numbers), hashes it, sets it, and returns the plain password."""
-        if not WORDS: # Basic check in case english_words fails
-            word = ''.join(random.choice(string.ascii_lowercase) for _ in range(6))
-        else:
-            word = random.choice(WORDS)
-        num_digits = 6
-        numbers = ''.join(secrets.choice(string.digits) for _ in range(num_digits))
-        password = word + numbers
-
-        # Use the correct bcrypt method from HEAD's fix
-        self.PASS = bcrypt.generate_password_hash(password).decode('utf-8')
+        password = new_temporary_password()
+        self.PASS = password_hasher.hash(password)
         return password
 
     def check_password(self, password : str) -> bool:
-        """Checks if the provided password matches the stored hash."""
+        """
+        Checks if the provided password matches the stored hash.
+        On a match, a hash made with an outdated cost factor is replaced (the caller commits).
+        """
         if not self.PASS or not password:
             return False
-        return bcrypt.check_password_hash(self.PASS, password)
+        if not password_hasher.check(self.PASS, password):
+            return False
+        if password_hasher.needs_rehash(self.PASS):
+            self.PASS = password_hasher.hash(password)
+        return True
 
     def is_account_locked(self) -> bool:
         """Checks if the account is currently locked out by time."""
@@ -141,7 +196,7 @@ class User(db.Model, UserMixin):
         if not self.TOTP_SECRET:
              self.TOTP_SECRET = pyotp.random_base32()
              # Note: Need to commit this change in the route calling this if it's generated here.
-        return f'otpauth://totp/TripleTRewards:{self.USERNAME}?secret={self.TOTP_SECRET}&issuer=TripleTRewards'
+        return totp_uri(self.USERNAME, self.TOTP_SECRET)
 
     def get_totp(self):
         """Returns a pyotp.TOTP object for verification."""
@@ -345,11 +400,88 @@ class Purchase(db.Model):
     points = db.Column(db.Integer, nullable=False) # Points spent at time of purchase
     quantity = db.Column(db.Integer, nullable=False, default=1)
     purchase_date = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+    rolled_up = db.Column(db.Boolean, nullable=False, default=False, server_default=db.false()) # Counted in the sales rollups
 
     # Relationships - backref defined on User model
     # user = db.relationship('User', backref=db.backref('purchases', lazy=True))
     sponsor = db.relationship('Sponsor') # Optional relationship to Sponsor
 
+    __table_args__ = (
+        db.Index('ix_purchases_date_sponsor', 'purchase_date', 'sponsor_id'), # Monthly invoice range scans
+        db.Index('ix_purchases_rolled_up', 'rolled_up', 'id'), # Sales rollup catch-up
+    )
+
+
+# Sales rollups (maintained by common/sales_rollup.py, never written directly)
+class SponsorSalesDaily(db.Model):
+    __tablename__ = 'SALES_SPONSOR_DAILY'
+    sponsor_id = db.Column(db.Integer, primary_key=True) # No FK: reports outlive deleted sponsors
+    day = db.Column(db.Date, primary_key=True)
+    points = db.Column(db.BigInteger, nullable=False, default=0) # points * quantity
+    items = db.Column(db.Integer, nullable=False, default=0)     # sum of quantity
+    orders = db.Column(db.Integer, nullable=False, default=0)    # checkouts
+
+    __table_args__ = (
+        db.Index('ix_sales_sponsor_day', 'day'), # Date-range reports across all sponsors
+    )
+
+class DriverSalesDaily(db.Model):
+    __tablename__ = 'SALES_DRIVER_DAILY'
+    driver_id = db.Column(db.Integer, primary_key=True)
+    sponsor_id = db.Column(db.Integer, primary_key=True)
+    day = db.Column(db.Date, primary_key=True)
+    points = db.Column(db.BigInteger, nullable=False, default=0)
+    items = db.Column(db.Integer, nullable=False, default=0)
+    orders = db.Column(db.Integer, nullable=False, default=0)
+
+    __table_args__ = (
+        db.Index('ix_sales_driver_sponsor_day', 'sponsor_id', 'day'), # One sponsor's drivers over a range
+        db.Index('ix_sales_driver_day', 'day'),
+    )
+
+class SalesRollupState(db.Model):
+    __tablename__ = 'SALES_ROLLUP_STATE'
+    name = db.Column(db.String(50), primary_key=True)
+    last_purchase_id = db.Column(db.Integer, nullable=False, default=0) # Highest PURCHASES.id the last catch-up covered
+    updated_at = db.Column(db.DateTime, nullable=True)
+
+# Resume points for batched data migrations (common/data_migrations.py)
+class DataMigrationCheckpoint(db.Model):
+    __tablename__ = 'DATA_MIGRATION_CHECKPOINTS'
+    name = db.Column(db.String(100), primary_key=True)  # Step name plus its parameters
+    last_key = db.Column(db.Integer, nullable=True)      # Highest key processed; NULL before the first batch
+    rows_done = db.Column(db.BigInteger, nullable=False, default=0)
+    status = db.Column(db.String(20), nullable=False, default='running') # 'running' -> 'done'
+    started_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+    updated_at = db.Column(db.DateTime, nullable=True)
+
+# Block-allocated ID counters (common/id_allocator.py)
+class IdSequence(db.Model):
+    __tablename__ = 'ID_SEQUENCES'
+    name = db.Column(db.String(50), primary_key=True)       # Table the IDs are for, e.g. 'USERS'
+    next_value = db.Column(db.BigInteger, nullable=False)   # First ID not handed out yet
+
+
+# Monthly sponsor invoices (generated by common/invoices.py)
+class Invoice(db.Model):
+    __tablename__ = 'INVOICES'
+    id = db.Column(db.Integer, primary_key=True)
+    sponsor_id = db.Column(db.Integer, nullable=False) # No FK: invoices are kept after a sponsor is deleted
+    period = db.Column(db.String(7), nullable=False)   # 'YYYY-MM'
+    points = db.Column(db.BigInteger, nullable=False, default=0)
+    items = db.Column(db.Integer, nullable=False, default=0)
+    point_ratio = db.Column(db.Integer, nullable=False) # Ratio in effect when the invoice was generated
+    amount_cents = db.Column(db.BigInteger, nullable=False, default=0)
+    status = db.Column(db.String(20), nullable=False, default='pending') # 'pending' -> 'rendered'
+    file_path = db.Column(db.String(255), nullable=True) # Relative to INVOICE_DIR
+    created_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+    rendered_at = db.Column(db.DateTime, nullable=True)
+
+    __table_args__ = (
+        db.UniqueConstraint('sponsor_id', 'period', name='uq_invoice_sponsor_period'), # One invoice per sponsor and month
+        db.Index('ix_invoice_period_status', 'period', 'status'),
+    )
+
 
 # Address (Consistent)
 class Address(db.Model):
@@ -0,0 +1,23 @@
+import argparse
+import time
+from app import create_app
+from common.template_cache import bytecode_cache_dir
+
+def main():
+    parser = argparse.ArgumentParser(description="Compile every template into the Jinja bytecode cache (fails on template syntax errors).")
+    parser.parse_args()
+
+    app = create_app()
+    if not app.config.get("TEMPLATE_BYTECODE_CACHE", True):
+        raise SystemExit("❌ TEMPLATE_BYTECODE_CACHE is disabled; nothing to precompile.")
+
+    print("--- Starting Template Precompile ---")
+    started = time.perf_counter()
+    names = [name for name in app.jinja_env.list_templates() if name.endswith(".html")]
+    for name in names:
+        app.jinja_env.get_template(name) # Compiles and stores the bytecode
+    print(f"✅ Compiled {len(names)} templates into {bytecode_cache_dir(app)} in {time.perf_counter() - started:.1f}s.")
+    print("\n--- Template Precompile Complete ---")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,110 @@
+import argparse
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+from datetime import datetime
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_BUDGET_MS = 1000
+
+# Runs in a fresh interpreter per sample: times `import app` and create_app() separately
+PROBE = """
+import json, time
+started = time.perf_counter()
+import app
+imported = time.perf_counter()
+app.create_app()
+created = time.perf_counter()
+print(json.dumps({"import_ms": (imported - started) * 1000, "create_app_ms": (created - imported) * 1000}))
+"""
+
+
+def parse_importtime(stderr):
+    """(module, self_us, cumulative_us, depth) for every line of -X importtime output."""
+    modules = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|", 2)
+        depth = (len(name) - len(name.lstrip())) // 2
+        modules.append((name.strip(), int(self_us), int(cumulative_us), depth))
+    return modules
+
+def sample(env):
+    """One cold start: probe timings plus the import-time table."""
+    proc = subprocess.run([sys.executable, "-X", "importtime", "-c", PROBE], cwd=ROOT, env=env,
+                          capture_output=True, text=True)
+    if proc.returncode != 0:
+        raise SystemExit(f"❌ Startup failed:\n{proc.stderr[-2000:]}")
+    timings = json.loads(proc.stdout.strip().splitlines()[-1])
+    return timings, parse_importtime(proc.stderr)
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure cold-start time (import app + create_app()) and report the slowest imports.")
+    parser.add_argument("--runs", type=int, default=5, help="Fresh interpreters to sample; the median is reported.")
+    parser.add_argument("--top", type=int, default=15, help="Slowest imports to list.")
+    parser.add_argument("--budget-ms", type=float, default=float(os.getenv("STARTUP_BUDGET_MS", DEFAULT_BUDGET_MS)),
+                        help="Exit non-zero when the median startup exceeds this (env STARTUP_BUDGET_MS).")
+    parser.add_argument("--output", default="startup-profile.json", help="Where to write the JSON report.")
+    args = parser.parse_args()
+
+    # Startup must not need the database; point at a throwaway SQLite file unless one is configured
+    env = dict(os.environ)
+    env.setdefault("SQLALCHEMY_DATABASE_URI", "sqlite://")
+
+    print("--- Starting Startup Profile ---")
+    samples = [sample(env) for _ in range(args.runs)]
+    import_ms = statistics.median(t["import_ms"] for t, _ in samples)
+    create_ms = statistics.median(t["create_app_ms"] for t, _ in samples)
+    total_ms = import_ms + create_ms
+
+    # Import table from the median run (by total time)
+    ordered = sorted(samples, key=lambda s: s[0]["import_ms"] + s[0]["create_app_ms"])
+    modules = ordered[len(ordered) // 2][1]
+    # Own time summed per top-level package (the app's own modules count as theirs), and the slowest single modules
+    packages = {}
+    for name, self_us, _, _ in modules:
+        root = name.split(".")[0]
+        packages[root] = packages.get(root, 0) + self_us
+    by_package = sorted(packages.items(), key=lambda item: item[1], reverse=True)[:args.top]
+    by_self = sorted(modules, key=lambda m: m[1], reverse=True)[:args.top]
+
+    print(f"\nimport app: {import_ms:.0f}ms   create_app(): {create_ms:.0f}ms   total: {total_ms:.0f}ms "
+          f"(median of {args.runs}, budget {args.budget_ms:.0f}ms)")
+    print("\nSlowest packages (own time of all their modules):")
+    for name, package_us in by_package:
+        print(f"  {package_us / 1000:>8.1f}ms  {name}")
+    print("\nSlowest modules (own time):")
+    for name, self_us, _, _ in by_self:
+        print(f"  {self_us / 1000:>8.1f}ms  {name}")
+
+    report = {
+        "meta": {
+            "created_at": datetime.utcnow().isoformat(timespec="seconds") + "Z",
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "runs": args.runs,
+        },
+        "import_ms": round(import_ms, 1),
+        "create_app_ms": round(create_ms, 1),
+        "total_ms": round(total_ms, 1),
+        "budget_ms": args.budget_ms,
+        "top_packages_ms": {name: round(us / 1000, 1) for name, us in by_package},
+        "top_modules_self_ms": {name: round(self_us / 1000, 1) for name, self_us, _, _ in by_self},
+    }
+    with open(args.output, "w") as fh:
+        json.dump(report, fh, indent=2)
+    print(f"\n✅ Report written to {args.output}")
+
+    over = total_ms > args.budget_ms
+    if over:
+        print(f"❌ Startup took {total_ms:.0f}ms, over the {args.budget_ms:.0f}ms budget.")
+    print("\n--- Startup Profile Complete ---")
+    if over:
+        raise SystemExit(1)
+
+if __name__ == '__main__':
+    main()
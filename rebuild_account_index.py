@@ -0,0 +1,20 @@
+import argparse
+from app import create_app
+from common.account_search import rebuild_account_index
+
+DEFAULT_BATCH_SIZE = 1000
+
+def main():
+    parser = argparse.ArgumentParser(description="Rebuild the USER_SEARCH_TOKENS index used by the admin account search.")
+    parser.add_argument("--batch-size", type=int, default=DEFAULT_BATCH_SIZE, help="Accounts indexed per transaction.")
+    args = parser.parse_args()
+
+    app = create_app()
+    with app.app_context():
+        print("--- Starting Account Search Index Rebuild ---")
+        indexed = rebuild_account_index(args.batch_size)
+        print(f"✅ Indexed {indexed} accounts for search.")
+        print("\n--- Account Search Index Rebuild Complete ---")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,23 @@
+import argparse
+from app import create_app
+from common.sales_rollup import catch_up_sales_rollups, rebuild_sales_rollups, rollups_current_through, DEFAULT_BATCH_SIZE
+
+def main():
+    parser = argparse.ArgumentParser(description="Bring the daily sales rollup tables up to date with PURCHASES.")
+    parser.add_argument("--batch-size", type=int, default=DEFAULT_BATCH_SIZE)
+    parser.add_argument("--rebuild", action="store_true", help="Clear the rollups and recompute them from every purchase.")
+    args = parser.parse_args()
+
+    app = create_app()
+    with app.app_context():
+        print("--- Starting Sales Rollup ---")
+        if args.rebuild:
+            count = rebuild_sales_rollups(args.batch_size)
+        else:
+            count = catch_up_sales_rollups(args.batch_size)
+        last_id, _ = rollups_current_through()
+        print(f"✅ Rolled up {count} purchases. Rollups now cover PURCHASES.id <= {last_id}.")
+        print("\n--- Sales Rollup Complete ---")
+
+if __name__ == '__main__':
+    main()
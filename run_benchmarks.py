@@ -0,0 +1,241 @@
+import argparse
+import json
+import logging
+import os
+import platform
+import random
+import subprocess
+import tempfile
+import threading
+import time
+from datetime import datetime
+
+DEFAULT_BASELINE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "benchmarks", "baseline.json")
+
+
+def prepare_database(uri):
+    """Creates the schema on an empty scratch database (create_app() expects the tables to exist)."""
+    from flask import Flask
+    from sqlalchemy import text
+    from extensions import db
+    from models import User
+
+    bootstrap = Flask("benchmark_bootstrap")
+    bootstrap.config["SQLALCHEMY_DATABASE_URI"] = uri
+    db.init_app(bootstrap)
+    with bootstrap.app_context():
+        db.create_all()
+        if db.session.query(User.USER_CODE).first() is not None:
+            raise SystemExit("❌ The benchmark database already has users. Point --database-url at an empty scratch database.")
+        if db.engine.dialect.name == "sqlite":
+            db.session.execute(text("PRAGMA journal_mode=WAL")) # Readers don't block the checkout writers
+        db.session.commit()
+
+
+def run_scenario(name, setup, step, base_url, data, clients, duration, warmup, seed):
+    from benchmarks.scenarios import Client, Recorder
+
+    recorder = Recorder()
+    warmup_recorder = Recorder()
+    workers = []
+    for index in range(clients):
+        client = Client(base_url, warmup_recorder)
+        workers.append((client, setup(client, data, index), random.Random(f"{seed}:{name}:{index}")))
+
+    ops = [0] * clients
+    failures = [0] * clients
+    deadline = [0.0]
+    # The clock starts once every client has warmed up (the action runs before anyone is released)
+    start_barrier = threading.Barrier(clients + 1, action=lambda: deadline.__setitem__(0, time.perf_counter() + duration))
+
+    def work(index, client, state, rng):
+        for _ in range(warmup):
+            step(client, state, rng)
+        client.recorder = recorder
+        start_barrier.wait()
+        while time.perf_counter() < deadline[0]:
+            try:
+                step(client, state, rng)
+                ops[index] += 1
+            except Exception: # Connection errors, failed logins: count and keep going
+                failures[index] += 1
+
+    threads = [threading.Thread(target=work, args=(i, *worker), daemon=True) for i, worker in enumerate(workers)]
+    for thread in threads:
+        thread.start()
+    start_barrier.wait()
+    started = deadline[0] - duration
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+    return recorder, {"ops": sum(ops), "failed_ops": sum(failures), "elapsed_s": round(elapsed, 3),
+                      "ops_per_s": round(sum(ops) / elapsed, 2) if elapsed else 0.0}
+
+
+def summarise(recorder, elapsed):
+    from common.sql_metrics import percentile
+
+    endpoints = {}
+    for label, samples in recorder.samples.items():
+        if label == "setup":
+            continue
+        latencies = sorted(s[0] for s in samples)
+        db_times = sorted(s[1] for s in samples if s[1] is not None)
+        endpoints[label] = {
+            "requests": len(samples),
+            "errors": sum(1 for s in samples if not s[2]),
+            "rps": round(len(samples) / elapsed, 2) if elapsed else 0.0,
+            "mean_ms": round(sum(latencies) / len(latencies), 2),
+            "p50_ms": round(percentile(latencies, 50), 2),
+            "p95_ms": round(percentile(latencies, 95), 2),
+            "p99_ms": round(percentile(latencies, 99), 2),
+            "db_p50_ms": round(percentile(db_times, 50), 2) if db_times else None,
+        }
+    return endpoints
+
+
+def compare(results, baseline, tolerance, min_delta_ms):
+    """Lists regressions against the baseline: endpoint p95 latency up or scenario throughput down by more than tolerance."""
+    regressions = []
+    for name, scenario in results["scenarios"].items():
+        before = baseline.get("scenarios", {}).get(name)
+        if before and before["ops_per_s"] and scenario["ops_per_s"] < before["ops_per_s"] * (1 - tolerance):
+            regressions.append(f"{name}: throughput {before['ops_per_s']} -> {scenario['ops_per_s']} ops/s")
+        for label, endpoint in scenario["endpoints"].items():
+            old = (before or {}).get("endpoints", {}).get(label)
+            if not old:
+                continue
+            if (endpoint["p95_ms"] > old["p95_ms"] * (1 + tolerance)
+                    and endpoint["p95_ms"] - old["p95_ms"] > min_delta_ms):
+                regressions.append(f"{name} {label}: p95 {old['p95_ms']} -> {endpoint['p95_ms']} ms")
+            if endpoint["errors"] > old["errors"]:
+                regressions.append(f"{name} {label}: errors {old['errors']} -> {endpoint['errors']}")
+    return regressions
+
+
+def git_revision():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip() or None
+    except OSError:
+        return None
+
+
+def main():
+    from benchmarks.scenarios import SCENARIOS
+
+    parser = argparse.ArgumentParser(description="Benchmark the main HTTP workflows against a seeded scratch database.")
+    parser.add_argument("--database-url", default=None,
+                        help="Empty scratch database (e.g. a local MySQL). Defaults to a new SQLite file.")
+    parser.add_argument("--scenarios", nargs="*", default=None, help=f"Subset of: {', '.join(SCENARIOS)}.")
+    parser.add_argument("--clients", type=int, default=8, help="Concurrent clients per scenario.")
+    parser.add_argument("--duration", type=float, default=10.0, help="Measured seconds per scenario.")
+    parser.add_argument("--warmup", type=int, default=2, help="Unmeasured operations per client before timing.")
+    parser.add_argument("--sponsors", type=int, default=20)
+    parser.add_argument("--drivers", type=int, default=500)
+    parser.add_argument("--purchases-per-driver", type=int, default=20)
+    parser.add_argument("--seed", type=int, default=1, help="Seed for the dataset and the clients' choices.")
+    parser.add_argument("--ebay-latency-ms", type=float, default=0.0, help="Simulated eBay API latency.")
+    parser.add_argument("--output", default="benchmark-results.json", help="Where to write the results JSON.")
+    parser.add_argument("--baseline", default=DEFAULT_BASELINE, help="Baseline results to compare against.")
+    parser.add_argument("--save-baseline", action="store_true", help="Store these results as the new baseline.")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="Allowed relative slowdown before flagging.")
+    parser.add_argument("--min-delta-ms", type=float, default=2.0, help="Ignore p95 changes smaller than this.")
+    args = parser.parse_args()
+
+    names = args.scenarios or list(SCENARIOS)
+    unknown = [name for name in names if name not in SCENARIOS]
+    if unknown:
+        parser.error(f"Unknown scenario(s): {', '.join(unknown)}")
+
+    # Config reads the database URL at import time, so set it before the app is imported
+    scratch_dir = None
+    uri = args.database_url
+    if not uri:
+        scratch_dir = tempfile.mkdtemp(prefix="triple_t_bench_")
+        uri = f"sqlite:///{os.path.join(scratch_dir, 'bench.db')}"
+    os.environ["SQLALCHEMY_DATABASE_URI"] = uri
+    os.environ["LOGIN_RATE_LIMIT_ENABLED"] = "0" # Every client signs in from 127.0.0.1
+
+    print("--- Starting Benchmarks ---")
+    prepare_database(uri)
+
+    from werkzeug.serving import make_server
+    from app import create_app
+    from extensions import db
+    from benchmarks import ebay_stub
+    from benchmarks.seed import seed_benchmark_data
+    from common.sales_rollup import catch_up_sales_rollups
+
+    app = create_app()
+    app.config["WTF_CSRF_ENABLED"] = False # Clients post forms directly
+    ebay_stub.install(args.ebay_latency_ms)
+
+    with app.app_context():
+        started = time.perf_counter()
+        data = seed_benchmark_data(args.sponsors, args.drivers, args.purchases_per_driver, args.seed)
+        catch_up_sales_rollups()
+        print(f"✅ Seeded {args.sponsors} sponsors, {args.drivers} drivers and "
+              f"{args.drivers * args.purchases_per_driver} purchases in {time.perf_counter() - started:.1f}s ({db.engine.dialect.name}).")
+
+    # Per-request log lines would cost more than some of the requests being measured
+    logging.getLogger("werkzeug").setLevel(logging.WARNING)
+    logging.getLogger("common.sql_metrics").setLevel(logging.WARNING)
+    server = make_server("127.0.0.1", 0, app, threaded=True)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    base_url = f"http://127.0.0.1:{server.server_port}"
+
+    results = {
+        "meta": {
+            "created_at": datetime.utcnow().isoformat(timespec="seconds") + "Z",
+            "revision": git_revision(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "database": uri.split(":", 1)[0],
+            "clients": args.clients,
+            "duration_s": args.duration,
+            "scale": {"sponsors": args.sponsors, "drivers": args.drivers,
+                      "purchases_per_driver": args.purchases_per_driver, "seed": args.seed},
+            "ebay_latency_ms": args.ebay_latency_ms,
+        },
+        "scenarios": {},
+    }
+    try:
+        for name in names:
+            setup, step = SCENARIOS[name]
+            recorder, totals = run_scenario(name, setup, step, base_url, data, args.clients,
+                                            args.duration, args.warmup, args.seed)
+            totals["endpoints"] = summarise(recorder, totals["elapsed_s"])
+            results["scenarios"][name] = totals
+            print(f"\n{name}: {totals['ops']} ops, {totals['ops_per_s']} ops/s, {totals['failed_ops']} failed")
+            for label, endpoint in sorted(totals["endpoints"].items()):
+                print(f"  {label:<32} n={endpoint['requests']:<6} p50={endpoint['p50_ms']:>8.1f}ms "
+                      f"p95={endpoint['p95_ms']:>8.1f}ms p99={endpoint['p99_ms']:>8.1f}ms errors={endpoint['errors']}")
+    finally:
+        server.shutdown()
+
+    with open(args.output, "w") as fh:
+        json.dump(results, fh, indent=2, sort_keys=True)
+    print(f"\n✅ Results written to {args.output}")
+
+    regressions = []
+    if os.path.exists(args.baseline) and not args.save_baseline:
+        with open(args.baseline) as fh:
+            regressions = compare(results, json.load(fh), args.tolerance, args.min_delta_ms)
+        if regressions:
+            print(f"❌ {len(regressions)} regression(s) against {args.baseline}:")
+            for line in regressions:
+                print(f"  - {line}")
+        else:
+            print(f"✅ No regressions against {args.baseline} (tolerance {args.tolerance:.0%}).")
+    if args.save_baseline:
+        with open(args.baseline, "w") as fh:
+            json.dump(results, fh, indent=2, sort_keys=True)
+        print(f"✅ Baseline saved to {args.baseline}")
+
+    print("\n--- Benchmarks Complete ---")
+    if regressions:
+        raise SystemExit(1)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,64 @@
+import argparse
+import time
+from datetime import datetime
+from app import create_app
+from extensions import db
+from common.synthetic_data import PRESETS, SeedPlan, seed_synthetic_data
+from common.sales_rollup import catch_up_sales_rollups
+
+def main():
+    parser = argparse.ArgumentParser(description="Seed synthetic users, associations, purchases, notifications and audit history.")
+    parser.add_argument("--preset", choices=list(PRESETS), default="small", help="Base sizes; the options below override them.")
+    parser.add_argument("--drivers", type=int, default=None)
+    parser.add_argument("--sponsors", type=int, default=None)
+    parser.add_argument("--admins", type=int, default=None)
+    parser.add_argument("--associations-per-driver", type=float, default=None, help="Mean sponsors per driver (at least 1).")
+    parser.add_argument("--purchases", type=int, default=None, help="Purchase line items.")
+    parser.add_argument("--notifications", type=int, default=None)
+    parser.add_argument("--audit-events", type=int, default=None)
+    parser.add_argument("--catalog-size", type=int, default=None, help="Distinct store items.")
+    parser.add_argument("--days", type=int, default=None, help="Days of history ending at --end-date.")
+    parser.add_argument("--skew", type=float, default=None, help="Zipf exponent for activity (0 = uniform).")
+    parser.add_argument("--seed", type=int, default=None, help="Random seed; same seed and database give the same rows.")
+    parser.add_argument("--password", default=None, help="Password shared by every generated account.")
+    parser.add_argument("--end-date", default=None, help="YYYY-MM-DD the history ends on. Defaults to today.")
+    parser.add_argument("--batch-size", type=int, default=None, help="Rows per INSERT batch / commit.")
+    parser.add_argument("--skip-rollups", action="store_true", help="Leave the sales rollups to the scheduled catch-up job.")
+    parser.add_argument("--yes", action="store_true", help="Required when the target database is not SQLite.")
+    args = parser.parse_args()
+
+    end_date = None
+    if args.end_date:
+        try:
+            end_date = datetime.strptime(args.end_date, "%Y-%m-%d")
+        except ValueError:
+            parser.error(f"Invalid --end-date '{args.end_date}', expected YYYY-MM-DD.")
+
+    plan = SeedPlan.from_preset(
+        args.preset, drivers=args.drivers, sponsors=args.sponsors, admins=args.admins,
+        associations_per_driver=args.associations_per_driver, purchases=args.purchases,
+        notifications=args.notifications, audit_events=args.audit_events, catalog_size=args.catalog_size,
+        days=args.days, skew=args.skew, seed=args.seed, password=args.password, end_date=end_date,
+        batch_size=args.batch_size,
+    )
+
+    app = create_app()
+    with app.app_context():
+        engine_url = db.engine.url
+        if engine_url.get_backend_name() != "sqlite" and not args.yes:
+            parser.error(f"Refusing to seed {engine_url.render_as_string(hide_password=True)} without --yes.")
+
+        print(f"--- Starting Synthetic Data Seed ({args.preset}, seed {plan.seed}) ---")
+        started = time.perf_counter()
+        counts = seed_synthetic_data(plan)
+        total = sum(counts.values())
+        if not args.skip_rollups:
+            catch_up_sales_rollups()
+            print("  sales rollups caught up")
+        elapsed = time.perf_counter() - started
+        print(f"✅ Inserted {total} rows in {elapsed:.1f}s ({total / elapsed:,.0f} rows/s). "
+              f"Every account's password is '{plan.password}'.")
+        print("\n--- Synthetic Data Seed Complete ---")
+
+if __name__ == '__main__':
+    main()
@@ -1,12 +1,15 @@
 # triple-ts-rewards/.../sponsor/routes.py
-from flask import Blueprint, render_template, request, redirect, url_for, flash
+from flask import Blueprint, render_template, request, redirect, url_for, flash, current_app
 from flask_login import login_required, current_user
 from common.decorators import role_required
-from common.logging import log_audit_event, DRIVER_POINTS
+from common.logging import log_audit_event, request_ip, DRIVER_POINTS
 from datetime import datetime
 from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import joinedload
 from models import User, Role, StoreSettings, db, DriverApplication, Sponsor, Notification, Driver, DriverSponsorAssociation, Purchase, AuditLog
 from extensions import db
+from common.bulk_import import handle_import_upload
+from common.id_allocator import next_user_code
 import secrets
 import string
 
@@ -15,11 +18,6 @@ sponsor_bp = Blueprint('sponsor_bp', __name__, template_folder="../templates")
 
 # --- Helper Functions ---
 
-def next_user_code():
-    """Generates the next available USER_CODE."""
-    last_user = User.query.order_by(User.USER_CODE.desc()).first()
-    return (last_user.USER_CODE + 1) if last_user else 1
-
 # Keep generate_temp_password
 def generate_temp_password(length: int = 10) -> str:
     """Generates a random temporary password."""
@@ -72,7 +70,10 @@ def update_settings():
 def manage_points_page():
     sort_by = request.args.get('sort_by') # Check for the sort parameter
     
-    query = DriverSponsorAssociation.query.filter_by(sponsor_id=current_user.USER_CODE)
+    # One joined query: each association comes back with its driver's User row
+    query = (db.session.query(DriverSponsorAssociation, User)
+             .outerjoin(User, User.USER_CODE == DriverSponsorAssociation.driver_id)
+             .filter(DriverSponsorAssociation.sponsor_id == current_user.USER_CODE))
     
     # Apply sorting based on the parameter
     if sort_by == 'points_desc':
@@ -83,12 +84,10 @@ def manage_points_page():
         # Default sort (e.g., by ID to be stable)
         query = query.order_by(DriverSponsorAssociation.driver_id.asc())
 
-    associations = query.all()
-
-    # Manual user attachment logic (retaining previous fix)
-    from models import User
-    for assoc in associations:
-        assoc.user = User.query.get(assoc.driver_id) 
+    associations = []
+    for assoc, user in query.all():
+        assoc.user = user # Template reads assoc.user
+        associations.append(assoc)
 
     return render_template('sponsor/points.html', 
                            drivers=associations, # Note: Template expects 'drivers' variable name
@@ -102,7 +101,10 @@ def purchase_history():
     from models import Purchase # Ensure Purchase model is imported here if not at the top
     
     # Filter by the sponsor's ID and order by most recent purchase
-    purchases = Purchase.query.filter_by(
+    # joinedload: the template shows purchase.user.USERNAME, so fetch the drivers in the same query
+    purchases = Purchase.query.options(
+        joinedload(Purchase.user).load_only(User.USERNAME)
+    ).filter_by(
         sponsor_id=current_user.USER_CODE
     ).order_by(Purchase.purchase_date.desc()).all()
     
@@ -161,7 +163,12 @@ def manage_points(driver_id):
     log_entry = AuditLog(
         EVENT_TYPE=DRIVER_POINTS,
         DETAILS=log_message,
-        CREATED_AT=datetime.utcnow()
+        CREATED_AT=datetime.utcnow(),
+        ACTOR_USER_ID=current_user.USER_CODE,
+        SUBJECT_USER_ID=driver_id,
+        SPONSOR_ID=current_user.USER_CODE,
+        IP=request_ip(),
+        PAYLOAD={"action": action, "points": points, "reason": reason, "balance": new_balance}
     )
     db.session.add(log_entry)
 
@@ -237,17 +244,32 @@ def add_user():
 
     return render_template('sponsor/add_user.html')
 
+# Bulk driver import (CSV/JSON upload -> credentials report download)
+@sponsor_bp.route('/import_drivers', methods=['GET', 'POST'])
+@role_required(Role.SPONSOR, allow_admin=True)
+def import_drivers():
+    def render(errors=(), total=0):
+        return render_template('common/import_drivers.html', back_url=url_for('sponsor_bp.manage_points_page'),
+                               sponsors=None, errors=errors, total=total,
+                               max_rows=current_app.config.get("BULK_IMPORT_MAX_ROWS", 20000))
+    if request.method == 'POST':
+        return handle_import_upload(current_user.USER_CODE, render)
+    return render()
+
 # Driver application review (Keep 'main' logic)
 @sponsor_bp.route("/applications")
 @login_required
 @role_required(Role.SPONSOR)
 def review_driver_applications():
-    apps = DriverApplication.query.filter_by(
-        SPONSOR_ID=current_user.USER_CODE, STATUS="Pending"
-    ).all()
-    for app in apps:
-        driver_user = User.query.get(app.DRIVER_ID)
-        app.driver_name = driver_user.USERNAME if driver_user else f"ID: {app.DRIVER_ID}"
+    rows = (db.session.query(DriverApplication, User.USERNAME)
+            .outerjoin(User, User.USER_CODE == DriverApplication.DRIVER_ID)
+            .filter(DriverApplication.SPONSOR_ID == current_user.USER_CODE,
+                    DriverApplication.STATUS == "Pending")
+            .all())
+    apps = []
+    for app, username in rows:
+        app.driver_name = username or f"ID: {app.DRIVER_ID}"
+        apps.append(app)
     return render_template("sponsor/review_driver_applications.html", applications=apps)
 
 # Process driver application decision (Keep 'main' logic)
@@ -342,12 +364,10 @@ def create_sponsor_user():
 def driver_point_history():
     """Retrieves all DRIVER_POINTS audit log entries relevant to the current sponsor."""
     
-    # Use a LIKE query to find log entries where the details mention the sponsor's ID
-    # or alternatively, pull all DRIVER_POINTS and filter in the template, 
-    # but the LIKE query is a reasonable proxy for relevance.
+    # Served by the (SPONSOR_ID, CREATED_AT) index instead of a LIKE scan over DETAILS
     events = AuditLog.query.filter(
-        AuditLog.EVENT_TYPE == DRIVER_POINTS,
-        AuditLog.DETAILS.like(f"%Sponsor ID: {current_user.USER_CODE}%")
+        AuditLog.SPONSOR_ID == current_user.USER_CODE,
+        AuditLog.EVENT_TYPE == DRIVER_POINTS
     ).order_by(AuditLog.CREATED_AT.desc()).all()
     
     # Assumes you can reuse the administrator/audit_list.html template or similar
@@ -0,0 +1,100 @@
+# tests/conftest.py
+"""
+Shared fixtures: one app per test session on a scratch SQLite file, with background
+work (scheduler, write-behind audit, rate limits, caches on disk) switched off.
+Every table is emptied after each test.
+"""
+import os
+import shutil
+import sys
+import tempfile
+from contextlib import contextmanager
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SCRATCH_DIR = tempfile.mkdtemp(prefix="tripletts-tests-")
+
+# Config reads the environment when it is imported, so this has to come first
+os.environ.update({
+    "SQLALCHEMY_DATABASE_URI": f"sqlite:///{os.path.join(SCRATCH_DIR, 'test.db')}",
+    "AUDIT_WRITE_MODE": "sync",
+    "SCHEDULER_ENABLED": "0",
+    "LOGIN_RATE_LIMIT_ENABLED": "0",
+    "TEMPLATE_BYTECODE_CACHE": "0",
+    "STATIC_ASSETS_ENABLED": "0",
+    "BCRYPT_LOG_ROUNDS": "4",
+})
+sys.path.insert(0, ROOT)
+
+from sqlalchemy import event
+from app import create_app
+from extensions import db
+from models import User, Driver, Sponsor, Admin, Role
+
+PASSWORD = "password1"
+
+
+@pytest.fixture(scope="session")
+def app():
+    app = create_app()
+    app.config.update(TESTING=True, WTF_CSRF_ENABLED=False)
+    with app.app_context():
+        db.create_all()
+    yield app
+    with app.app_context():
+        db.engine.dispose()
+    shutil.rmtree(SCRATCH_DIR, ignore_errors=True)
+
+@pytest.fixture(autouse=True)
+def _empty_tables(app):
+    yield
+    with app.app_context():
+        db.session.rollback()
+        for table in reversed(db.metadata.sorted_tables):
+            db.session.execute(table.delete())
+        db.session.commit()
+        app.extensions["identity_cache"].bump_all()
+
+@pytest.fixture
+def make_user(app):
+    """make_user(code, username, role) adds a user plus its Driver/Sponsor/Admin row (not committed)."""
+    def make(code, username, role, **fields):
+        user = User(USER_CODE=code, USERNAME=username, USER_TYPE=role, FNAME=username, LNAME="Test",
+                    EMAIL=f"{username}@example.com", **fields)
+        user.set_password(PASSWORD)
+        db.session.add(user)
+        if role == Role.DRIVER:
+            db.session.add(Driver(DRIVER_ID=code))
+        elif role == Role.SPONSOR:
+            db.session.add(Sponsor(SPONSOR_ID=code, ORG_NAME=f"{username} org", STATUS="Approved"))
+        elif role == Role.ADMINISTRATOR:
+            db.session.add(Admin(ADMIN_ID=code))
+        return user
+    return make
+
+@pytest.fixture
+def login(app):
+    """login(username) returns a test client signed in as that user."""
+    def sign_in(username):
+        client = app.test_client()
+        response = client.post("/auth/login", data={"username": username, "password": PASSWORD})
+        assert response.status_code == 302, f"login as {username} failed ({response.status_code})"
+        return client
+    return sign_in
+
+@pytest.fixture
+def count_queries(app):
+    """`with count_queries() as queries:` ... then len(queries) is the number of SQL statements run."""
+    @contextmanager
+    def counting():
+        statements = []
+        def record(conn, cursor, statement, *args):
+            statements.append(statement)
+        with app.app_context():
+            engine = db.engine
+        event.listen(engine, "before_cursor_execute", record)
+        try:
+            yield statements
+        finally:
+            event.remove(engine, "before_cursor_execute", record)
+    return counting
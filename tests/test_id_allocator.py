@@ -0,0 +1,65 @@
+# tests/test_id_allocator.py
+"""USER_CODE allocation under concurrency: many threads creating users must never collide."""
+import threading
+from sqlalchemy.exc import IntegrityError
+from extensions import db
+from models import User, Role
+from common.id_allocator import next_user_code, reserve_user_codes
+
+THREADS = 16
+USERS_PER_THREAD = 25
+BULK_THREADS = 4
+BULK_RESERVATIONS = 10
+BULK_SIZE = 7
+
+
+def run_threads(app, targets):
+    errors = []
+    def wrap(target):
+        def run():
+            with app.app_context():
+                try:
+                    target()
+                except Exception as e: # Reported by the test below
+                    errors.append(e)
+                finally:
+                    db.session.remove()
+        return run
+    threads = [threading.Thread(target=wrap(target)) for target in targets]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return errors
+
+def test_concurrent_user_creation_never_collides(app, make_user):
+    with app.app_context():
+        make_user(50, "existing", Role.DRIVER) # Codes must start above rows that already exist
+        db.session.commit()
+
+    created = []
+    reserved = []
+    def create_users():
+        for _ in range(USERS_PER_THREAD):
+            code = next_user_code()
+            user = User(USER_CODE=code, USERNAME=f"user{code}", USER_TYPE=Role.DRIVER, FNAME="Load",
+                        LNAME="Test", EMAIL=f"user{code}@example.com", PASS="x")
+            db.session.add(user)
+            db.session.commit() # An IntegrityError here would be a collision
+            created.append(code)
+    def reserve_blocks():
+        for _ in range(BULK_RESERVATIONS):
+            first = reserve_user_codes(BULK_SIZE)
+            reserved.extend(range(first, first + BULK_SIZE))
+
+    errors = run_threads(app, [create_users] * THREADS + [reserve_blocks] * BULK_THREADS)
+
+    assert not [e for e in errors if isinstance(e, IntegrityError)], errors
+    assert not errors, errors
+    assert len(created) == THREADS * USERS_PER_THREAD
+    assert len(reserved) == BULK_THREADS * BULK_RESERVATIONS * BULK_SIZE
+    codes = created + reserved
+    assert len(set(codes)) == len(codes), "the same USER_CODE was handed out twice"
+    assert min(codes) > 50
+    with app.app_context():
+        assert db.session.query(User).count() == THREADS * USERS_PER_THREAD + 1
@@ -0,0 +1,61 @@
+# tests/test_query_counts.py
+"""
+The sponsor and driver list pages must run a fixed number of queries however many rows
+they show (no per-row lookups). Each page is loaded with a few rows and with many; the
+statement counts have to match and stay within the page's budget.
+"""
+from datetime import datetime
+import pytest
+from extensions import db
+from models import Role, DriverSponsorAssociation, DriverApplication, Purchase
+
+SPONSOR, APPLY_SPONSOR, FIRST_DRIVER = 2, 3, 100
+
+# (signed in as, URL, most statements allowed: the user load, the page query and a little slack)
+PAGES = [
+    ("sponsor", "/sponsor/points", 3),
+    ("sponsor", "/sponsor/points?sort_by=points_desc", 3),
+    ("sponsor", "/sponsor/purchase_history", 3),
+    ("applysponsor", "/sponsor/applications", 3),
+    ("d0", "/driver/dashboard", 3),
+    ("d0", "/driver/driver_app", 3),
+]
+
+
+def add_drivers(make_user, start, count):
+    """count drivers, each with points and a purchase at SPONSOR, an application to APPLY_SPONSOR
+    and, so the driver pages grow too, a sponsorship with another sponsor for d0."""
+    for i in range(start, start + count):
+        code = FIRST_DRIVER + i
+        make_user(code, f"d{i}", Role.DRIVER)
+        db.session.flush()
+        db.session.add(DriverSponsorAssociation(driver_id=code, sponsor_id=SPONSOR, points=i))
+        db.session.add(DriverApplication(DRIVER_ID=code, SPONSOR_ID=APPLY_SPONSOR, STATUS="Pending"))
+        db.session.add(Purchase(user_id=code, sponsor_id=SPONSOR, item_id=f"item{i}", title=f"Item {i}",
+                                points=10, quantity=1, purchase_date=datetime(2025, 1, 1)))
+        sponsor_code = 1000 + i # Extra approved sponsors: rows on d0's dashboard and apply page
+        make_user(sponsor_code, f"extra{i}", Role.SPONSOR)
+        db.session.flush()
+        db.session.add(DriverSponsorAssociation(driver_id=FIRST_DRIVER, sponsor_id=sponsor_code, points=1))
+    db.session.commit()
+
+@pytest.mark.parametrize("username,url,budget", PAGES)
+def test_page_query_count_is_constant(app, make_user, login, count_queries, username, url, budget):
+    with app.app_context():
+        make_user(SPONSOR, "sponsor", Role.SPONSOR)
+        make_user(APPLY_SPONSOR, "applysponsor", Role.SPONSOR)
+        db.session.commit()
+        add_drivers(make_user, 0, 3)
+
+    client = login(username)
+    client.get(url) # Warm up: first-request work isn't part of the page
+    with count_queries() as few:
+        assert client.get(url).status_code == 200
+
+    with app.app_context():
+        add_drivers(make_user, 3, 27)
+    with count_queries() as many:
+        assert client.get(url).status_code == 200
+
+    assert len(many) == len(few), f"{url} ran {len(few)} statements for 3 rows but {len(many)} for 30"
+    assert len(many) <= budget, f"{url} ran {len(many)} statements:\n" + "\n".join(many)
@@ -0,0 +1,28 @@
+# tests/test_sql_metrics.py
+"""Percentiles on the admin SQL metrics page and the per-request statement count."""
+import pytest
+from flask import g
+from sqlalchemy import text
+from app import create_app
+from extensions import db
+from common.sql_metrics import percentile, sql_metrics
+
+
+@pytest.mark.parametrize("pct,expected", [(0, 1), (10, 1), (50, 5), (90, 9), (95, 10), (99, 10), (100, 10)])
+def test_percentile_is_nearest_rank(pct, expected):
+    assert percentile(list(range(1, 11)), pct) == expected
+
+def test_percentile_of_nothing_is_zero():
+    assert percentile([], 95) == 0.0
+
+def test_init_app_again_does_not_count_queries_twice(app):
+    other = create_app() # Same settings and database as the session app
+    sql_metrics.init_app(other)
+    try:
+        with other.test_request_context("/"):
+            sql_metrics._start_request()
+            db.session.execute(text("SELECT 1"))
+            assert g.sql_stats["queries"] == 1
+    finally:
+        with other.app_context():
+            db.engine.dispose()
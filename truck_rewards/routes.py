@@ -13,7 +13,8 @@ import requests
 import os
 import base64
 # Import logging constant
-from common.logging import DRIVER_POINTS
+from common.logging import DRIVER_POINTS, request_ip
+from common.sales_rollup import record_order
 
 
 # --- Configuration Switch ---
@@ -443,12 +444,18 @@ def checkout():
         # 2. Log the point deduction event (HEAD logic)
         log_entry = AuditLog(
             EVENT_TYPE=DRIVER_POINTS,
-            DETAILS=f"Points deducted for purchase by driver {current_user.USERNAME} (ID: {current_user.USER_CODE}). Amount: -{total_points} from Sponsor ID: {sponsor_id}."
+            DETAILS=f"Points deducted for purchase by driver {current_user.USERNAME} (ID: {current_user.USER_CODE}). Amount: -{total_points} from Sponsor ID: {sponsor_id}.",
+            ACTOR_USER_ID=current_user.USER_CODE,
+            SUBJECT_USER_ID=current_user.USER_CODE,
+            SPONSOR_ID=sponsor_id,
+            IP=request_ip(),
+            PAYLOAD={"action": "purchase", "points": -total_points, "balance": association.points}
         )
         db.session.add(log_entry)
 
         # 3. Create Purchase records (HEAD logic)
         purchases_to_add = []
+        purchased_at = db.session.execute(db.select(db.func.now())).scalar() # One database timestamp for the whole order
         for item in cart_items:
             purchase = Purchase(
                 user_id=current_user.USER_CODE,
@@ -457,14 +464,19 @@ def checkout():
                 title=item.title,
                 points=item.points,
                 quantity=item.quantity,
-                purchase_date=db.func.now() # Use database function for timestamp
+                purchase_date=purchased_at,
+                rolled_up=True # Counted in the sales rollups below
             )
             purchases_to_add.append(purchase)
             db.session.delete(item) # Delete item from cart
 
         db.session.add_all(purchases_to_add)
+        db.session.flush()
 
-        # 4. Commit transaction
+        # 4. Add this order to its sponsor's and driver's daily sales rollups (same transaction as the purchases)
+        record_order(purchases_to_add)
+
+        # 5. Commit transaction
         db.session.commit()
 
         # --- Notifications (After successful commit) ---